@@ -0,0 +1,16 @@
+"""ASGI entry point for serving the Flask app from an event-loop server.
+
+    uvicorn asgi:asgi_app --host 0.0.0.0 --port 8000 --workers 2
+
+Each uvicorn worker accepts connections on its event loop and runs the (synchronous)
+Flask views on a thread pool of ASGI_THREADS, while the views' upstream HTTP calls
+share schedule.upstream's single pooled httpx.AsyncClient. A blocked view costs a
+thread, not a worker, so one worker can hold many in-flight requests.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from schedule import app
+
+asgi_app = WSGIMiddleware(app, workers=int(os.getenv("ASGI_THREADS", 32)))
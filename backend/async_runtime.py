@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+
+import httpx
+
+# =====================================================
+# Shared event loop + pooled async HTTP client
+# =====================================================
+
+class AsyncRuntime:
+    """A background event loop owning one shared httpx.AsyncClient.
+
+    Flask views stay synchronous; they hand coroutines to this loop so independent
+    upstream calls (Supabase, Azure) run concurrently over one connection pool:
+
+        resp1, resp2 = runtime.gather(runtime.client.get(url1), runtime.client.get(url2))
+
+    The loop starts lazily and restarts after a fork, so it is safe to create at import
+    time in an app that is preloaded by a pre-forking server.
+    """
+
+    def __init__(self, timeout=10.0, max_connections=100, max_keepalive_connections=20):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._client = None
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            # The client must be created on the loop that will drive it
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="async-runtime", daemon=True).start()
+        ready.wait()
+        self._loop = loop
+        self._pid = os.getpid()
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    @property
+    def client(self):
+        self._ensure_started()
+        return self._client
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the shared loop and block the calling thread for its result."""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+
+    def gather(self, *coros, return_exceptions=False):
+        """Run coroutines concurrently on the shared loop; results come back in order."""
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+        return self.run(_gather())
+
+    def close(self):
+        if self._pid != os.getpid() or self._loop is None:
+            return
+        try:
+            self.run(self._client.aclose(), timeout=5)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._pid = None
@@ -0,0 +1,144 @@
+"""Benchmark catalog startup: JSON load + index build vs. the lazy snapshot, with and without preload.
+
+Usage: python benchmark_catalog_startup.py [--snapshot data/catalog_snapshot] [--workers 2]
+Each mode runs in a fresh interpreter and reports time-to-ready and RSS. Then each
+mode forks `--workers` children that touch every semester, the way pre-forked
+workers would, and reports how much memory is private to each worker (Linux only).
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+from catalog_index import SEMESTER_COLUMNS
+from catalog_snapshot import DEFAULT_CATALOG_PATH, DEFAULT_COORDS_PATH, DEFAULT_SNAPSHOT_DIR
+
+MODES = ("json", "snapshot", "snapshot-preload")
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def private_mb(pid):
+    """Private (unshared) memory of a process, from smaps_rollup."""
+    total = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total / 1024
+
+
+def load(mode, args):
+    """(catalog, schedule_index) the way schedule.py builds them in `mode`."""
+    if mode == "json":
+        from catalog_index import CatalogIndex
+        from course_store import CoordStore, CourseStore, StringTable, release_free_heap
+        from schedule_index import build_schedule_index
+
+        with open(args.catalog) as f:
+            amherst_data = json.load(f)
+        with open(args.coords) as f:
+            coords_data = json.load(f)
+        strings = StringTable()
+        amherst_data = CourseStore(amherst_data, strings)
+        coords_data = CoordStore(coords_data, strings)
+        loaded = CatalogIndex(amherst_data, SEMESTER_COLUMNS), build_schedule_index(amherst_data, coords_data)
+        release_free_heap()
+        return loaded
+
+    from catalog_snapshot import load_snapshot, preload
+
+    loaded = load_snapshot(args.snapshot, args.catalog, args.coords, SEMESTER_COLUMNS)
+    if loaded is None:
+        raise SystemExit(f"No current snapshot in {args.snapshot}; run `python catalog_snapshot.py build` first")
+    if mode == "snapshot-preload":
+        preload(*loaded)
+    return loaded
+
+
+def touch_everything(catalog, schedule_index):
+    for semester in catalog.semesters:
+        for course in catalog.courses_in(semester):
+            course.get("course_codes")
+        schedule = schedule_index.get(semester)
+        if schedule is not None:
+            len(schedule.entries)
+
+
+def child(mode, args):
+    baseline = rss_mb()
+    start = time.perf_counter()
+    catalog, schedule_index = load(mode, args)
+    ready_ms = (time.perf_counter() - start) * 1000
+    ready_rss = rss_mb() - baseline
+
+    # First request for the latest semester (what a lazy snapshot pays on demand)
+    start = time.perf_counter()
+    latest = catalog.latest_semesters(1)[0]
+    catalog.courses_in(latest)
+    schedule_index.get(latest)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    # Workers forked from this "master" (frozen as gunicorn.conf.py does). Without a
+    # snapshot each worker imports schedule.py itself, so json workers load their own copy.
+    gc.collect()
+    gc.freeze()
+    pids = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            if mode == "json":
+                touch_everything(*load(mode, args))
+            else:
+                touch_everything(catalog, schedule_index)
+            gc.collect()
+            time.sleep(2)  # stay alive until the parent has measured us
+            os._exit(0)
+        pids.append(pid)
+    time.sleep(1.5)
+    worker_private = [private_mb(pid) for pid in pids]
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    print(json.dumps({
+        "mode": mode, "ready_ms": ready_ms, "ready_rss_mb": ready_rss, "first_request_ms": first_ms,
+        "worker_private_mb": sum(worker_private) / max(len(worker_private), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--coords", default=DEFAULT_COORDS_PATH)
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    print(f"{'mode':<18} {'ready':>9} {'RSS':>9} {'first request':>14} {'private/worker':>15}")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--catalog", args.catalog, "--coords", args.coords,
+             "--snapshot", args.snapshot, "--workers", str(args.workers)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<18} {result['ready_ms']:7.1f}ms {result['ready_rss_mb']:7.1f}MB "
+              f"{result['first_request_ms']:12.1f}ms {result['worker_private_mb']:13.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
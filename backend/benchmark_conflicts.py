@@ -0,0 +1,130 @@
+"""Benchmark /conflicted_courses: legacy per-request scan vs. the precomputed schedule index.
+
+Usage: python benchmark_conflicts.py [--semester 2425S] [--requests 200] [--taken 4]
+Reads the same catalog files as schedule.py and prints p50/p99 latency for both paths.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+
+from schedule_index import build_schedule_index
+
+CATALOG_PATH = "./data/amherst_courses_all.json"
+COORDS_PATH = "./data/precomputed_tsne_coords_all_5707402.json"
+
+
+# --- Legacy implementation (as it ran per request before the index) ---
+def parse_time_range(time_str):
+    try:
+        start_str, end_str = time_str.split(" - ")
+        fmt = "%I:%M %p"
+        return (datetime.strptime(start_str, fmt).time(), datetime.strptime(end_str, fmt).time())
+    except Exception:
+        return None
+
+
+def legacy_conflicts(amherst_data, coords_data, taken_course_codes, current_semester):
+    semester_courses = [c for c in amherst_data if c.get("semester") == current_semester]
+    taken = {code for c in semester_courses for code in c.get("course_codes", []) if code in taken_course_codes}
+    if not taken:
+        return []
+
+    taken_schedule = []
+    for course in semester_courses:
+        for code in course.get("course_codes", []):
+            if code in taken:
+                for section in course.get("times_and_locations", {}).values():
+                    for meetings in section.values():
+                        for meeting in meetings:
+                            parsed = parse_time_range(meeting["time"])
+                            if parsed:
+                                taken_schedule.append((meeting["day"], *parsed))
+
+    conflicted = []
+    for entry in coords_data:
+        if entry.get("semester") != current_semester:
+            continue
+        codes = entry.get("codes", [])
+        if any(code in taken for code in codes):
+            continue
+        course_times = []
+        for course in semester_courses:
+            if any(code in course.get("course_codes", []) for code in codes):
+                tl = course.get("times_and_locations", {})
+                if not isinstance(tl, dict):
+                    continue
+                for section in tl.values():
+                    if not isinstance(section, dict):
+                        continue
+                    for meetings in section.values():
+                        if not isinstance(meetings, list):
+                            continue
+                        for meeting in meetings:
+                            if isinstance(meeting, dict) and "time" in meeting:
+                                parsed = parse_time_range(meeting["time"])
+                                if parsed:
+                                    course_times.append((meeting.get("day", ""), *parsed))
+        if any(day == t_day and not (end <= t_start or start >= t_end)
+               for day, start, end in course_times
+               for t_day, t_start, t_end in taken_schedule):
+            conflicted.extend(codes)
+    return conflicted
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, samples):
+    print(f"{label:<8} p50={percentile(samples, 50) * 1000:8.3f} ms  "
+          f"p99={percentile(samples, 99) * 1000:8.3f} ms  mean={statistics.mean(samples) * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semester", help="Semester to benchmark (default: the largest one)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--taken", type=int, default=4, help="Taken courses per simulated request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(CATALOG_PATH) as f:
+        amherst_data = json.load(f)
+    with open(COORDS_PATH) as f:
+        coords_data = json.load(f)
+
+    start = time.perf_counter()
+    index = build_schedule_index(amherst_data, coords_data)
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(index)} semesters")
+
+    semester = args.semester or max(index, key=lambda s: index[s].course_count)
+    semester_schedule = index[semester]
+    codes = sorted(semester_schedule.codes)
+    print(f"Semester {semester}: {semester_schedule.course_count} courses, {len(semester_schedule.entries)} map entries")
+
+    rng = random.Random(args.seed)
+    workloads = [rng.sample(codes, min(args.taken, len(codes))) for _ in range(args.requests)]
+
+    legacy, indexed = [], []
+    for taken in workloads:
+        t0 = time.perf_counter()
+        expected = legacy_conflicts(amherst_data, coords_data, taken, semester)
+        t1 = time.perf_counter()
+        got = semester_schedule.conflicted_codes([c for c in set(taken) if c in semester_schedule.codes])
+        t2 = time.perf_counter()
+        if got != expected:
+            raise SystemExit(f"Mismatch for {taken}: legacy={expected} indexed={got}")
+        legacy.append(t1 - t0)
+        indexed.append(t2 - t1)
+
+    report("legacy", legacy)
+    report("indexed", indexed)
+    print(f"speedup (p50): {percentile(legacy, 50) / percentile(indexed, 50):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
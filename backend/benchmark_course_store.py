@@ -0,0 +1,155 @@
+"""Benchmark catalog memory: parsed JSON dicts vs. the compact CourseStore / CoordStore.
+
+Usage: python benchmark_course_store.py [--catalog PATH] [--coords PATH] [--workers 2] [--lookups 20000]
+Each layout is built in a fresh interpreter (the same CatalogIndex and schedule index
+schedule.py builds on top). Reports build time, RSS, retained Python heap and
+GC-tracked objects, lookup latency for the transcript-import and conflict handlers,
+and how much memory is private to each of `--workers` forked workers after they run
+that workload (Linux only).
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmark_catalog_startup import private_mb, rss_mb
+from catalog_index import SEMESTER_COLUMNS, CatalogIndex
+from catalog_snapshot import DEFAULT_CATALOG_PATH, DEFAULT_COORDS_PATH
+from course_store import CoordStore, CourseStore, StringTable, release_free_heap
+from schedule_index import build_schedule_index
+from transcript_import import course_record
+
+LAYOUTS = ("dicts", "compact")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def load(layout, args):
+    with open(args.catalog) as f:
+        amherst_data = json.load(f)
+    with open(args.coords) as f:
+        coords_data = json.load(f)
+    if layout == "compact":
+        strings = StringTable()
+        amherst_data = CourseStore(amherst_data, strings)
+        coords_data = CoordStore(coords_data, strings)
+    catalog = CatalogIndex(amherst_data, SEMESTER_COLUMNS)
+    schedule_index = build_schedule_index(amherst_data, coords_data)
+    if layout == "compact":
+        release_free_heap()
+    return amherst_data, coords_data, catalog, schedule_index
+
+
+def workload(catalog, schedule_index, lookups, seed):
+    """Per-call latencies (s) for course lookups and conflict checks across every semester."""
+    rng = random.Random(seed)
+    lookup_samples, conflict_samples = [], []
+    codes_by_semester = {s: sorted(schedule_index[s].codes) for s in catalog.semesters if s in schedule_index}
+    semesters = [s for s in catalog.semesters if codes_by_semester.get(s)]
+    for i in range(lookups):
+        semester = semesters[i % len(semesters)]
+        code = rng.choice(codes_by_semester[semester])
+        start = time.perf_counter()
+        course = catalog.get(semester, code)
+        course_record(code, semester, course)
+        catalog.semesters_for(code)
+        lookup_samples.append(time.perf_counter() - start)
+        if i % 10 == 0:
+            taken = rng.sample(codes_by_semester[semester], min(4, len(codes_by_semester[semester])))
+            start = time.perf_counter()
+            schedule_index[semester].conflicted_codes(taken)
+            conflict_samples.append(time.perf_counter() - start)
+    # Every field of every course, as a handler that returns full records would
+    for semester in catalog.semesters:
+        for course in catalog.courses_in(semester):
+            course.get("description")
+            course.get("times_and_locations")
+    return lookup_samples, conflict_samples
+
+
+def child(layout, args):
+    gc.collect()
+    baseline = rss_mb()
+    objects_before = len(gc.get_objects())
+    start = time.perf_counter()
+    amherst_data, coords_data, catalog, schedule_index = load(layout, args)
+    build_ms = (time.perf_counter() - start) * 1000
+    gc.collect()
+    ready_rss = rss_mb() - baseline
+    objects = len(gc.get_objects()) - objects_before
+
+    lookup_samples, conflict_samples = workload(catalog, schedule_index, args.lookups, args.seed)
+
+    # Workers forked from a preloaded master, as under gunicorn.conf.py
+    gc.freeze()
+    pids = []
+    for i in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            workload(catalog, schedule_index, args.lookups, args.seed + i + 1)
+            gc.collect()
+            time.sleep(2)  # stay alive until the parent has measured us
+            os._exit(0)
+        pids.append(pid)
+    time.sleep(1.5)
+    worker_private = [private_mb(pid) for pid in pids]
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    # Heap the structures retain, traced on a second build (tracing slows the first)
+    del amherst_data, coords_data, catalog, schedule_index
+    gc.unfreeze()
+    gc.collect()
+    tracemalloc.start()
+    loaded = load(layout, args)
+    gc.collect()
+    heap_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del loaded
+
+    print(json.dumps({
+        "layout": layout, "build_ms": build_ms, "rss_mb": ready_rss, "heap_mb": heap_mb, "objects": objects,
+        "lookup_p50_us": percentile(lookup_samples, 50) * 1e6, "lookup_p99_us": percentile(lookup_samples, 99) * 1e6,
+        "conflict_p50_us": percentile(conflict_samples, 50) * 1e6,
+        "worker_private_mb": sum(worker_private) / max(len(worker_private), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--coords", default=DEFAULT_COORDS_PATH)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", choices=LAYOUTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    print(f"{'layout':<8} {'build':>9} {'RSS':>9} {'heap':>9} {'objects':>10} {'lookup p50/p99':>17} "
+          f"{'conflicts p50':>14} {'private/worker':>15}")
+    for layout in LAYOUTS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", layout, "--catalog", args.catalog, "--coords", args.coords,
+             "--workers", str(args.workers), "--lookups", str(args.lookups), "--seed", str(args.seed)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{layout:<8} {r['build_ms']:7.0f}ms {r['rss_mb']:7.1f}MB {r['heap_mb']:7.1f}MB {r['objects']:>10,} "
+              f"{r['lookup_p50_us']:6.1f}/{r['lookup_p99_us']:6.1f} us {r['conflict_p50_us']:11.1f} us "
+              f"{r['worker_private_mb']:13.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark the per-IP rate limiter: legacy timestamp lists vs. sliding-window counter stores.
+
+Usage: python benchmark_rate_limit.py [--threads 16] [--calls 20000] [--clients 50000] [--redis-url URL]
+Runs check_rate_limit from many threads over hot and one-off client IPs and prints
+throughput and p50/p99 per call, then crawls `--clients` distinct IPs once to show
+how much limiter state each implementation keeps.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from query_validation import QueryValidator, RateLimiter, create_rate_limit_store
+
+
+# --- Legacy implementation (per-IP timestamp lists, never evicted) ---
+class LegacyValidator:
+    def __init__(self):
+        self.request_counts = {}
+        self.MAX_REQUESTS_PER_MINUTE = 10
+
+    def check_rate_limit(self, client_ip):
+        current_time = time.time()
+        if client_ip not in self.request_counts:
+            self.request_counts[client_ip] = []
+        self.request_counts[client_ip] = [
+            req_time for req_time in self.request_counts[client_ip]
+            if current_time - req_time < 60
+        ]
+        if len(self.request_counts[client_ip]) >= self.MAX_REQUESTS_PER_MINUTE:
+            return False, "Rate limit exceeded"
+        self.request_counts[client_ip].append(current_time)
+        return True, "Within rate limits"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def tail_ip(n):
+    return f"172.{16 + n // 65536}.{n // 256 % 256}.{n % 256}"
+
+
+def run(check, threads, calls, clients, seed):
+    """Call `check` from `threads` threads; a few hot IPs plus a long tail of one-off crawler IPs."""
+    per_thread = calls // threads
+    latencies = [[] for _ in range(threads)]
+    denied = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        ips = [f"10.0.0.{rng.randrange(32)}" if rng.random() < 0.3 else tail_ip(rng.randrange(clients))
+               for _ in range(per_thread)]
+        samples = latencies[i]
+        barrier.wait()
+        for ip in ips:
+            start = time.perf_counter()
+            allowed, _ = check(ip)
+            samples.append(time.perf_counter() - start)
+            denied[i] += not allowed
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    samples = [s for thread_samples in latencies for s in thread_samples]
+    return elapsed, samples, sum(denied)
+
+
+def retained_kib(check, clients):
+    """Python heap left allocated after one request from each of `clients` distinct IPs."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(clients):
+        check(tail_ip(n))
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained / 1024
+
+
+def report(label, elapsed, samples, denied):
+    print(f"{label:<8} {len(samples) / elapsed:>10,.0f} calls/s  p50={percentile(samples, 50) * 1e6:7.1f} us  "
+          f"p99={percentile(samples, 99) * 1e6:8.1f} us  mean={statistics.mean(samples) * 1e6:7.1f} us  denied={denied}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=50000, help="Distinct crawler IPs in the tail")
+    parser.add_argument("--max-keys", type=int, default=10000)
+    parser.add_argument("--redis-url", help="Also benchmark a Redis-protocol server")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+
+    def implementations():
+        yield "legacy", LegacyValidator()
+        yield "memory", QueryValidator(RateLimiter(10, store=create_rate_limit_store("memory", max_keys=args.max_keys)))
+        path = os.path.join(tmpdir, f"rate_limits_{time.time_ns()}.sqlite3")
+        yield "sqlite", QueryValidator(RateLimiter(10, store=create_rate_limit_store(
+            "sqlite", max_keys=args.max_keys, sqlite_path=path)))
+        if args.redis_url:
+            yield "redis", QueryValidator(RateLimiter(10, store=create_rate_limit_store("redis", redis_url=args.redis_url)))
+
+    print(f"{args.threads} threads, {args.calls} calls")
+    for label, validator in implementations():
+        report(label, *run(validator.check_rate_limit, args.threads, args.calls, args.clients, args.seed))
+
+    print(f"State after a crawl of {args.clients} distinct IPs (max_keys={args.max_keys})")
+    for label, validator in implementations():
+        kib = retained_kib(validator.check_rate_limit, args.clients)
+        keys = len(validator.request_counts) if label == "legacy" else validator.rate_limiter.stats().get("keys", "?")
+        print(f"{label:<8} {keys} keys, {kib:,.0f} KiB in this process")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark surprise candidate selection: vector fetch + Python filter vs. department centroids.
+
+Usage: python benchmark_surprise.py [--semester 2425S] [--requests 200] [--taken 12] [--qdrant]
+Simulated students take random courses from earlier semesters; their profile vector is
+the mean of those courses plus noise. Uses the embedding store if built, otherwise the
+JSON exports. --qdrant also times the 150-point remote fetch (needs QDRANT_URL / QDRANT_API_KEY).
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from catalog_index import SEMESTER_COLUMNS
+from embedding_store import DEFAULT_SOURCE_GLOB, DEFAULT_STORE_DIR
+from search_backends import create_search_backend, course_departments
+from surprise_index import DepartmentCentroids
+
+load_dotenv()
+
+SHORTLIST_SIZE = 30
+LEGACY_FETCH = 150
+
+
+def legacy_shortlist(hits, skip_codes, user_departments):
+    shortlist = []
+    for point in hits:
+        norm_codes = [str(c).strip().upper() for c in point.payload.get("course_codes", [])]
+        if any(c in skip_codes for c in norm_codes):
+            continue
+        if {c.split("-")[0] for c in norm_codes if "-" in c} & user_departments:
+            continue
+        shortlist.append(point.payload)
+        if len(shortlist) >= SHORTLIST_SIZE:
+            break
+    return shortlist
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, samples):
+    print(f"{label:<10} p50={percentile(samples, 50) * 1000:8.3f} ms  "
+          f"p99={percentile(samples, 99) * 1000:8.3f} ms  mean={statistics.mean(samples) * 1000:8.3f} ms")
+
+
+def build_workloads(local, semester, count, taken, seed):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    start, _ = local.semester_ranges[semester]
+    history = range(0, start) if start else range(len(local))
+    workloads = []
+    for _ in range(count):
+        rows = rng.sample(history, min(taken, len(history)))
+        codes = {str(c).strip().upper() for r in rows for c in local.payloads[r].get("course_codes", [])}
+        departments = {d for r in rows for d in course_departments(local.payloads[r])}
+        profile = np.asarray(local.matrix[rows], dtype=np.float32).mean(axis=0)
+        profile += np_rng.normal(scale=0.01, size=profile.shape).astype(np.float32)
+        workloads.append((profile, codes, frozenset(departments)))
+    return workloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semester", help="Candidate semester (default: the latest one)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--taken", type=int, default=12, help="Courses in each simulated history")
+    parser.add_argument("--novelty-weight", type=float, default=0.5)
+    parser.add_argument("--qdrant", action="store_true", help="Also time the remote 150-point fetch")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    local = create_search_backend("local", embeddings_glob=DEFAULT_SOURCE_GLOB,
+                                  semester_order=SEMESTER_COLUMNS, store_path=DEFAULT_STORE_DIR)
+    semester = args.semester or list(local.semester_ranges)[-1]
+
+    start = time.perf_counter()
+    centroids = DepartmentCentroids.from_backend(local)
+    print(f"Centroid build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(centroids.departments)} departments")
+
+    remote = None
+    if args.qdrant:
+        from qdrant_client import QdrantClient
+
+        remote = create_search_backend(
+            "qdrant",
+            qdrant_client=QdrantClient(url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+                                       api_key=os.getenv("QDRANT_API_KEY")),
+        )
+
+    timings = {"local-150": [], "centroid": []}
+    if remote:
+        timings["qdrant-150"] = []
+    sizes = {name: [] for name in timings}
+    familiarity = {name: [] for name in timings}
+
+    for profile, codes, departments in build_workloads(local, semester, args.requests, args.taken, args.seed):
+        familiar = centroids.department_familiarity(semester, departments)
+        column_of = {int(d): c for c, d in enumerate(centroids.semesters[semester].departments)}
+
+        def mean_familiarity(shortlist):
+            values = [max((familiar[column_of[centroids.department_index[d]]] for d in course_departments(p)), default=0.0)
+                      for p in shortlist]
+            return float(np.mean(values)) if values else 0.0
+
+        runs = [("local-150", lambda: legacy_shortlist(local.search(profile, semester=semester, limit=LEGACY_FETCH),
+                                                        codes, departments)),
+                ("centroid", lambda: [h.payload for h in centroids.rank(profile, semester, departments, codes,
+                                                                         limit=SHORTLIST_SIZE,
+                                                                         novelty_weight=args.novelty_weight)])]
+        if remote:
+            runs.append(("qdrant-150", lambda: legacy_shortlist(remote.search(profile, semester=semester, limit=LEGACY_FETCH),
+                                                                 codes, departments)))
+        for name, run in runs:
+            t0 = time.perf_counter()
+            shortlist = run()
+            timings[name].append(time.perf_counter() - t0)
+            sizes[name].append(len(shortlist))
+            familiarity[name].append(mean_familiarity(shortlist))
+
+    print(f"Semester {semester}: {len(range(*local.semester_ranges[semester]))} courses, {args.requests} simulated students")
+    for name, samples in timings.items():
+        report(name, samples)
+    for name in timings:
+        full = sum(n >= SHORTLIST_SIZE for n in sizes[name])
+        print(f"{name:<10} full shortlists: {full}/{args.requests}  "
+              f"mean department familiarity: {statistics.mean(familiarity[name]):.3f}")
+
+
+if __name__ == "__main__":
+    main()
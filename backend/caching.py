@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_MISSING = object()
+
+# =====================================================
+# Small in-process caches shared by the API handlers
+# =====================================================
+
+class LRUTTLCache:
+    """Thread-safe, size-bounded LRU cache with optional per-entry expiry and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds, None = never expire
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Insert `value`; `expires_at` (epoch seconds) overrides the default TTL."""
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of live (key, expires_at, value) entries, least recently used first."""
+        now = time.time()
+        with self._lock:
+            return [(k, exp, v) for k, (exp, v) in self._data.items() if exp is None or exp > now]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class VersionedCache(LRUTTLCache):
+    """LRU cache that empties itself whenever the catalog version stamp changes."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.version = None
+        self.invalidations = 0
+
+    def check_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+                self.clear()
+            self.version = version
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"version": self.version, "invalidations": self.invalidations})
+        return stats
+
+
+def normalize_query(text):
+    """Collapse whitespace and case so trivially different queries share a cache entry."""
+    return " ".join(str(text).split()).lower()
+
+
+class EmbeddingCache(LRUTTLCache):
+    """LRU + TTL cache of float32 embedding vectors keyed by a hash of (deployment, normalized text).
+
+    Vectors are kept as read-only float32 arrays. If `path` is given, the cache is
+    loaded from an .npz file on startup and written back with `save()`. Only the
+    sha256 key is kept, in memory and on disk, never the text: queries and
+    profiles (which include users' notes) are not written out.
+    """
+
+    def __init__(self, maxsize=2048, ttl=7 * 24 * 3600, path=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                print(f"Failed to load embedding cache from {path}: {e}")
+
+    def key(self, deployment, text):
+        return hashlib.sha256(f"{deployment or ''}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get_vector(self, deployment, text):
+        return self.get(self.key(deployment, text))
+
+    def set_vector(self, deployment, text, vector, expires_at=None):
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        self.set(self.key(deployment, text), vector, expires_at=expires_at)
+        return vector
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        entries = [(k, exp, v) for k, exp, v in self.items() if v.size]
+        if not entries:
+            return
+        dims = {v.shape[0] for _, _, v in entries}
+        if len(dims) != 1:
+            # Mixed deployments with different widths: keep the most common width
+            width = max(dims, key=lambda d: sum(v.shape[0] == d for _, _, v in entries))
+            entries = [e for e in entries if e[2].shape[0] == width]
+
+        # Every worker saves at exit: a per-process temp name keeps them from clobbering each other
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            keys=np.array([k for k, _, _ in entries]),
+            expires_at=np.array([exp if exp is not None else np.inf for _, exp, _ in entries], dtype=np.float64),
+            vectors=np.stack([v for _, _, v in entries]).astype(np.float32, copy=False),
+        )
+        os.replace(tmp_path, path)
+        print(f"Saved {len(entries)} cached embeddings to {path}")
+
+    def load(self, path):
+        now = time.time()
+        with np.load(path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            if "keys" in data:
+                keys = [str(k) for k in data["keys"]]
+            else:
+                # Older files stored the raw text; hash it here and the next save drops it
+                keys = [self.key(str(d), str(t)) for d, t in zip(data["deployments"], data["texts"])]
+            loaded = 0
+            # Stored LRU-first, so replaying in order restores recency
+            for key, exp, vector in zip(keys, data["expires_at"], vectors):
+                if exp <= now:
+                    continue
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self.set(key, vector, expires_at=None if np.isinf(exp) else float(exp))
+                loaded += 1
+        print(f"Loaded {loaded} cached embeddings from {path}")
+
+
+class DiskBackedCache(LRUTTLCache):
+    """LRU + TTL cache of JSON-serializable values keyed by hex digests, optionally mirrored to disk.
+
+    With `directory` set, entries are also written there as `<key>.json` (atomic
+    replace) so other workers and restarts can reuse them; the directory is pruned
+    back to `disk_maxsize` files, oldest first. Only the value is stored.
+    """
+
+    def __init__(self, maxsize=256, ttl=None, directory=None, disk_maxsize=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.directory = directory
+        self.disk_maxsize = disk_maxsize or maxsize * 4
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self._writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, default=None):
+        value = super().get(key, _MISSING)
+        if value is not _MISSING or not self.directory:
+            return default if value is _MISSING else value
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError) as e:
+            self.disk_errors += 1
+            print(f"Failed to read cache entry {key}: {e}")
+            return default
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            self._remove_file(key)
+            return default
+        self.disk_hits += 1
+        super().set(key, entry["value"], expires_at=expires_at)
+        return entry["value"]
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        super().set(key, value, expires_at=expires_at)
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self.disk_errors += 1
+            print(f"Failed to write cache entry {key}: {e}")
+            return
+        self._writes += 1
+        # Pruning lists the directory, so only do it every few writes
+        if self._writes % 16 == 0:
+            self.prune_disk()
+
+    def pop(self, key, default=None):
+        value = super().pop(key, default)
+        if self.directory:
+            self._remove_file(key)
+        return value
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune_disk(self):
+        """Drop the oldest files beyond `disk_maxsize`."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        excess = len(entries) - self.disk_maxsize
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"directory": self.directory, "disk_hits": self.disk_hits, "disk_errors": self.disk_errors})
+        return stats
@@ -0,0 +1,79 @@
+# =====================================================
+# Semester-partitioned lookups over the course catalog
+# =====================================================
+
+# Every catalog semester, in chronological order, shared by the API's catalog, the
+# snapshot, the embedding store, and upload_to_qdrant.py. The user_courses columns the
+# API writes are a prefix of it (schedule.USER_COURSE_COLUMNS).
+SEMESTER_COLUMNS = [
+    "0910F", "0910S", "1011F", "1011S", "1112F", "1112S",
+    "1213F", "1213S", "1314F", "1314S", "1415F", "1415S",
+    "1516F", "1516S", "1617F", "1617S", "1718F", "1718S",
+    "1819F", "1819S", "1920F", "1920S", "2021F", "2021J",
+    "2021S", "2122F", "2122J", "2122S", "2223F", "2223S",
+    "2324F", "2324S", "2425F", "2425S", "2526F", "2526S"
+]
+
+
+class CatalogIndex:
+    """Lookups over the flat catalog list, built once at startup.
+
+    - semester -> courses
+    - (semester, code) -> course
+    - code -> semesters (chronological)
+    - ordered list of semesters present
+    """
+
+    def __init__(self, courses, semester_order):
+        self._by_semester = {}
+        self._by_key = {}
+        self._semesters_by_code = {}
+
+        for course in courses:
+            semester = course.get("semester")
+            if not semester:
+                continue
+            self._by_semester.setdefault(semester, []).append(course)
+            for code in course.get("course_codes", []):
+                # First listing wins, matching a linear scan over the catalog
+                self._by_key.setdefault((semester, code), course)
+                self._semesters_by_code.setdefault(code, set()).add(semester)
+
+        rank = {s: i for i, s in enumerate(semester_order)}
+        self.semesters = [s for s in semester_order if s in self._by_semester]
+        self._semesters_by_code = {
+            code: sorted(sems, key=lambda s: rank.get(s, len(rank)))
+            for code, sems in self._semesters_by_code.items()
+        }
+
+    def __len__(self):
+        return sum(len(courses) for courses in self._by_semester.values())
+
+    def __contains__(self, semester):
+        return semester in self._by_semester
+
+    def courses_in(self, semester):
+        """All catalog courses offered in a semester (empty list if unknown)."""
+        return self._by_semester.get(semester, [])
+
+    def get(self, semester, code):
+        """The course listed under `code` in `semester`, or None."""
+        return self._by_key.get((semester, code))
+
+    def courses_for_codes(self, semester, codes):
+        """Distinct courses in `semester` matching any of `codes`, in lookup order."""
+        seen = set()
+        courses = []
+        for code in codes:
+            course = self._by_key.get((semester, code))
+            if course is not None and id(course) not in seen:
+                seen.add(id(course))
+                courses.append(course)
+        return courses
+
+    def semesters_for(self, code):
+        """Semesters (chronological) in which `code` is offered."""
+        return self._semesters_by_code.get(code, [])
+
+    def latest_semesters(self, k=1):
+        return self.semesters[-k:] if self.semesters else []
@@ -0,0 +1,312 @@
+"""Precompiled, lazily parsed snapshot of the course catalog and map coordinates.
+
+Layout of a snapshot directory:
+    courses.bin       one orjson blob per semester (that semester's catalog courses), concatenated
+    coords.bin        one orjson blob per semester (its t-SNE map entries), concatenated
+    codes.npy         sorted course codes
+    code_semesters.npy  packed bit rows: which snapshot semesters list each code
+    manifest.json     semester -> byte ranges and counts, plus the source files' size/mtime
+
+Build it once from the JSON files (rebuild whenever they change):
+    python catalog_snapshot.py build [--out data/catalog_snapshot]
+
+At startup nothing is parsed: the .bin files and arrays are memory-mapped, and a
+semester's blob is decoded the first time a request touches that semester. Under a
+pre-forking server, `preload()` in the master decodes everything once so workers
+share those pages instead of each building its own copy.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+import orjson
+
+from catalog_index import SEMESTER_COLUMNS, CatalogIndex
+from course_store import CoordStore, CourseStore, StringTable
+from schedule_index import build_schedule_index
+
+DEFAULT_SNAPSHOT_DIR = "./data/catalog_snapshot"
+DEFAULT_CATALOG_PATH = "./data/amherst_courses_all.json"
+DEFAULT_COORDS_PATH = "./data/precomputed_tsne_coords_all_5707402.json"
+
+FILES = ("manifest.json", "courses.bin", "coords.bin", "codes.npy", "code_semesters.npy")
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_snapshot(out_dir=DEFAULT_SNAPSHOT_DIR, catalog_path=DEFAULT_CATALOG_PATH, coords_path=DEFAULT_COORDS_PATH,
+                   semester_order=SEMESTER_COLUMNS):
+    """Convert the catalog and coordinate JSON into a snapshot directory. Returns the manifest."""
+    # The stdlib parser, so the snapshot accepts exactly what schedule.py's json.load does
+    with open(catalog_path, encoding="utf-8") as f:
+        courses = json.load(f)
+    with open(coords_path, encoding="utf-8") as f:
+        coords = json.load(f)
+    if not isinstance(courses, list) or not isinstance(coords, list):
+        raise ValueError("catalog and coords files must both hold JSON lists")
+
+    # Same grouping CatalogIndex and build_schedule_index apply, in file order
+    courses_by_semester, coords_by_semester = {}, {}
+    for course in courses:
+        if isinstance(course, dict) and course.get("semester"):
+            courses_by_semester.setdefault(course["semester"], []).append(course)
+    for entry in coords:
+        if isinstance(entry, dict) and isinstance(entry.get("semester"), str):
+            coords_by_semester.setdefault(entry["semester"], []).append(entry)
+
+    rank = {s: i for i, s in enumerate(semester_order)}
+    semesters = sorted(set(courses_by_semester) | set(coords_by_semester), key=lambda s: (rank.get(s, len(rank)), s))
+
+    os.makedirs(out_dir, exist_ok=True)
+    table = {}
+    digest = hashlib.sha256()
+    with open(os.path.join(out_dir, "courses.bin.tmp"), "wb") as course_file, \
+            open(os.path.join(out_dir, "coords.bin.tmp"), "wb") as coords_file:
+        for semester in semesters:
+            course_blob = orjson.dumps(courses_by_semester.get(semester, []))
+            coords_blob = orjson.dumps(coords_by_semester.get(semester, []))
+            table[semester] = {
+                "courses": [course_file.tell(), len(course_blob)],
+                "coords": [coords_file.tell(), len(coords_blob)],
+                "course_count": len(courses_by_semester.get(semester, [])),
+            }
+            course_file.write(course_blob)
+            coords_file.write(coords_blob)
+            digest.update(course_blob)
+            digest.update(coords_blob)
+
+    # Columnar code -> semesters table, so semesters_for() never decodes a blob
+    code_sets = {}
+    for i, semester in enumerate(semesters):
+        for course in courses_by_semester.get(semester, []):
+            for code in course.get("course_codes", []):
+                code_sets.setdefault(code, set()).add(i)
+    codes = sorted(code_sets)
+    membership = np.zeros((len(codes), max(len(semesters), 1)), dtype=bool)
+    for row, code in enumerate(codes):
+        membership[row, list(code_sets[code])] = True
+    np.save(os.path.join(out_dir, "codes.tmp.npy"), np.array(codes, dtype=str) if codes else np.array([], dtype="U1"))
+    np.save(os.path.join(out_dir, "code_semesters.tmp.npy"), np.packbits(membership, axis=1))
+
+    manifest = {
+        "version": digest.hexdigest()[:16],
+        "semesters": semesters,
+        "table": table,
+        "course_count": sum(entry["course_count"] for entry in table.values()),
+        "coords_count": sum(len(v) for v in coords_by_semester.values()),
+        "sources": {
+            "catalog": source_fingerprint(catalog_path),
+            "coords": source_fingerprint(coords_path),
+        },
+    }
+    with open(os.path.join(out_dir, "manifest.tmp.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap everything in only once it's all written
+    for tmp_name, name in (("courses.bin.tmp", "courses.bin"), ("coords.bin.tmp", "coords.bin"),
+                           ("codes.tmp.npy", "codes.npy"), ("code_semesters.tmp.npy", "code_semesters.npy"),
+                           ("manifest.tmp.json", "manifest.json")):
+        os.replace(os.path.join(out_dir, tmp_name), os.path.join(out_dir, name))
+    print(f"Wrote {manifest['course_count']} courses and {manifest['coords_count']} map entries "
+          f"across {len(semesters)} semesters to {out_dir}")
+    return manifest
+
+
+class CatalogSnapshot:
+    """Read side of a snapshot directory: memory-mapped blobs, decoded per semester on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.table = self.manifest["table"]
+        self.semester_list = self.manifest["semesters"]
+        self._courses = self._map("courses.bin")
+        self._coords = self._map("coords.bin")
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.code_semesters = np.load(os.path.join(path, "code_semesters.npy"), mmap_mode="r")
+
+    def _map(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.exists(os.path.join(path, name)) for name in FILES)
+
+    @property
+    def version(self):
+        return self.manifest.get("version")
+
+    def is_current(self, catalog_path, coords_path):
+        """False if either source JSON changed (size or mtime) since the snapshot was built."""
+        try:
+            sources = self.manifest["sources"]
+            return (sources["catalog"] == source_fingerprint(catalog_path)
+                    and sources["coords"] == source_fingerprint(coords_path))
+        except (KeyError, OSError):
+            return False
+
+    def _decode(self, blob, semester, kind):
+        entry = self.table.get(semester)
+        if entry is None:
+            return []
+        offset, length = entry[kind]
+        return orjson.loads(blob[offset:offset + length])
+
+    def courses(self, semester):
+        return self._decode(self._courses, semester, "courses")
+
+    def coords(self, semester):
+        return self._decode(self._coords, semester, "coords")
+
+    def semesters_with_code(self, code):
+        """Snapshot semesters whose catalog lists `code` (binary search over the sorted code column)."""
+        row = int(np.searchsorted(self.codes, code))
+        if row >= len(self.codes) or self.codes[row] != code:
+            return []
+        bits = np.unpackbits(self.code_semesters[row])[:len(self.semester_list)]
+        return [self.semester_list[i] for i in np.flatnonzero(bits)]
+
+
+class LazyCatalog:
+    """CatalogIndex over a snapshot, building each semester's index the first time it's used."""
+
+    def __init__(self, snapshot, semester_order):
+        self.snapshot = snapshot
+        self._rank = {s: i for i, s in enumerate(semester_order)}
+        self._with_courses = {s for s, entry in snapshot.table.items() if entry["course_count"]}
+        self.semesters = [s for s in semester_order if s in self._with_courses]
+        self._indexes = {}
+        self._lock = threading.Lock()
+        # Codes, semesters and titles are shared across every semester's store
+        self.strings = StringTable()
+
+    def _index(self, semester):
+        index = self._indexes.get(semester)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(semester)
+                if index is None:
+                    index = CatalogIndex(CourseStore(self.snapshot.courses(semester), self.strings), [semester])
+                    self._indexes[semester] = index
+        return index
+
+    def __len__(self):
+        return self.snapshot.manifest["course_count"]
+
+    def __contains__(self, semester):
+        return semester in self._with_courses
+
+    def courses_in(self, semester):
+        """All catalog courses offered in a semester (empty list if unknown)."""
+        if semester not in self._with_courses:
+            return []
+        return self._index(semester).courses_in(semester)
+
+    def get(self, semester, code):
+        """The course listed under `code` in `semester`, or None."""
+        if semester not in self._with_courses:
+            return None
+        return self._index(semester).get(semester, code)
+
+    def courses_for_codes(self, semester, codes):
+        """Distinct courses in `semester` matching any of `codes`, in lookup order."""
+        if semester not in self._with_courses:
+            return []
+        return self._index(semester).courses_for_codes(semester, codes)
+
+    def semesters_for(self, code):
+        """Semesters (chronological) in which `code` is offered."""
+        return sorted(self.snapshot.semesters_with_code(code), key=lambda s: self._rank.get(s, len(self._rank)))
+
+    def latest_semesters(self, k=1):
+        return self.semesters[-k:] if self.semesters else []
+
+    def loaded_semesters(self):
+        return sorted(self._indexes, key=lambda s: self._rank.get(s, len(self._rank)))
+
+
+class LazyScheduleIndex:
+    """{semester: SemesterSchedule} built per semester on first `get`, like build_schedule_index."""
+
+    def __init__(self, snapshot, catalog):
+        self.snapshot = snapshot
+        self.catalog = catalog
+        self._schedules = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, semester):
+        return semester in self.snapshot.table
+
+    def __len__(self):
+        return len(self.snapshot.table)
+
+    def get(self, semester, default=None):
+        schedule = self._schedules.get(semester)
+        if schedule is not None:
+            return schedule
+        if semester not in self.snapshot.table:
+            return default
+        with self._lock:
+            schedule = self._schedules.get(semester)
+            if schedule is None:
+                coords = CoordStore(self.snapshot.coords(semester), self.catalog.strings)
+                built = build_schedule_index(self.catalog.courses_in(semester), coords)
+                schedule = built[semester]
+                self._schedules[semester] = schedule
+        return schedule
+
+    def __getitem__(self, semester):
+        schedule = self.get(semester)
+        if schedule is None:
+            raise KeyError(semester)
+        return schedule
+
+
+def load_snapshot(path, catalog_path, coords_path, semester_order):
+    """(LazyCatalog, LazyScheduleIndex) from a current snapshot, or None to fall back to the JSON files."""
+    if not path or not CatalogSnapshot.exists(path):
+        return None
+    snapshot = CatalogSnapshot(path)
+    if not snapshot.is_current(catalog_path, coords_path):
+        print(f"Catalog snapshot in {path} is older than the JSON files; rebuild it with "
+              f"`python catalog_snapshot.py build`. Loading JSON instead.")
+        return None
+    catalog = LazyCatalog(snapshot, semester_order)
+    print(f"Using catalog snapshot {snapshot.version} ({len(catalog)} courses, {len(snapshot.table)} semesters)")
+    return catalog, LazyScheduleIndex(snapshot, catalog)
+
+
+def preload(catalog, schedule_index):
+    """Decode every semester now (in a pre-fork master, so workers inherit the parsed pages)."""
+    for semester in catalog.snapshot.table:
+        catalog.courses_in(semester)
+        schedule_index.get(semester)
+    return len(catalog.loaded_semesters())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the catalog snapshot.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Convert the catalog and map coordinate JSON into a snapshot directory")
+    build.add_argument("--out", default=DEFAULT_SNAPSHOT_DIR)
+    build.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    build.add_argument("--coords", default=DEFAULT_COORDS_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_snapshot(args.out, args.catalog, args.coords)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Compact, columnar storage for catalog courses and t-SNE map entries.
+
+A list of parsed JSON dicts costs a few hundred bytes of object overhead per course
+(the dict itself, a list for its codes, boxed floats, nested meeting dicts). Here:
+
+    StringTable     interned strings (semesters, titles, departments, codes) by integer id,
+                    shared by every store built with it
+    RecordStore     one NumPy column per field holding string ids or floats, offsets
+                    into one flat list of interned codes, and larger fields as orjson
+                    bytes in one buffer per field, decoded only when asked for
+    StoredRecord    a two-slot read-only view of one row that answers `get`, `[]`,
+                    `in`, `keys()` like the original dict
+
+CourseStore and CoordStore are what schedule.py and catalog_snapshot.py hand to
+CatalogIndex and build_schedule_index in place of the dict lists. Records are
+created once per row, so `id(course)` stays stable the way handlers rely on.
+"""
+import ctypes
+import gc
+import sys
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import orjson
+
+_MISSING = object()
+
+
+def release_free_heap():
+    """Hand memory freed by dropping the parsed JSON back to the OS (glibc only; no-op elsewhere).
+
+    Freed dict and str chunks otherwise stay in the process heap, so RSS would still
+    show the JSON even though only the compact stores are alive.
+    """
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class StringTable:
+    """Append-only table of interned strings addressed by integer id."""
+
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def ids(self, values):
+        """Ids for `values` (adding any new strings), in order."""
+        out = []
+        with self._lock:
+            for value in values:
+                i = self._ids.get(value)
+                if i is None:
+                    i = len(self.strings)
+                    value = sys.intern(value)
+                    self.strings.append(value)
+                    self._ids[value] = i
+                out.append(i)
+        return out
+
+
+class StoredRecord(Mapping):
+    """Read-only dict view of one row of a RecordStore."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def get(self, key, default=None):
+        # RecordStore.field, inlined: this is every handler's hot path
+        store = self._store
+        reader = store._readers.get(key)
+        if reader is not None and store._present[self._row] & reader[0]:
+            return reader[1](self._row)
+        return store._extra(self._row).get(key, default)
+
+    def __getitem__(self, key):
+        value = self._store.field(self._row, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._store.keys(self._row))
+
+    def __len__(self):
+        return len(self._store.keys(self._row))
+
+    def to_dict(self):
+        return {key: self._store.field(self._row, key, None) for key in self._store.keys(self._row)}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class RecordStore:
+    """Flat JSON records split into columns; subclasses name which fields get one.
+
+    - string_fields: str values, stored as StringTable ids
+    - codes_field: a list of str, stored as a slice of one flat list of interned codes
+    - float_fields: float values, stored as float64
+    - blob_fields: any value, orjson-encoded into that field's own buffer
+    Anything else (other keys, or a value of an unexpected type) goes to a per-record
+    orjson blob, so every record reads back exactly as it was parsed. Non-dict
+    entries are dropped.
+    """
+
+    string_fields = ()
+    codes_field = None
+    float_fields = ()
+    blob_fields = ()
+
+    def __init__(self, records, strings=None):
+        # Building allocates a few objects per record; with the collector on, each
+        # generation-2 pass would re-walk every parsed dict still held by the caller
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._build(records, strings)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _build(self, records, strings):
+        self.strings = strings if strings is not None else StringTable()
+        columnar = (self.string_fields + ((self.codes_field,) if self.codes_field else ())
+                    + self.float_fields + self.blob_fields)
+        bits = {name: 1 << i for i, name in enumerate(columnar)}
+        kinds = {name: str for name in self.string_fields}
+        kinds.update({name: float for name in self.float_fields})
+        if self.codes_field:
+            kinds[self.codes_field] = list
+
+        records = [record for record in records if isinstance(record, dict)]
+        # Plain lists while building (one slot per row; absent fields keep the
+        # placeholder and a clear `present` bit), converted to arrays at the end
+        values = {name: [""] * len(records) for name in self.string_fields}
+        values.update({name: [0.0] * len(records) for name in self.float_fields})
+        present = [0] * len(records)
+        codes, code_offsets = [], [0]
+        # Growing buffers: keeping a bytes object per record until a final join
+        # fragments the heap far beyond the blobs' own size
+        blobs = {name: (bytearray(), [0]) for name in self.blob_fields + ("",)}
+        append_blob = {name: buffer.extend for name, (buffer, _) in blobs.items()}
+
+        for row, record in enumerate(records):
+            mask = 0
+            extra = {}
+            for key, value in record.items():
+                bit = bits.get(key)
+                if bit is None:
+                    extra[key] = value
+                elif key in append_blob:
+                    append_blob[key](orjson.dumps(value))
+                    mask |= bit
+                elif type(value) is not kinds[key]:
+                    extra[key] = value
+                elif key == self.codes_field:
+                    if all(type(code) is str for code in value):
+                        codes.extend(value)
+                        mask |= bit
+                    else:
+                        extra[key] = value
+                else:
+                    values[key][row] = value
+                    mask |= bit
+            if extra:
+                append_blob[""](orjson.dumps(extra))
+            for buffer, offsets in blobs.values():
+                offsets.append(len(buffer))
+            present[row] = mask
+            code_offsets.append(len(codes))
+
+        self.columns = {name: np.array(self.strings.ids(values[name]), dtype=np.int32) for name in self.string_fields}
+        self.columns.update({name: np.array(values[name], dtype=np.float64) for name in self.float_fields})
+        self.present = np.array(present, dtype=np.uint8 if len(columnar) <= 8 else np.uint32)
+        # Every record's codes, back to back, as references into the shared table
+        self.code_list = [self.strings.strings[i] for i in self.strings.ids(codes)]
+        self.code_offsets = np.array(code_offsets, dtype=np.int64)
+        self.blobs = {name: (bytes(buffer), np.array(offsets, dtype=np.int64)) for name, (buffer, offsets) in blobs.items()}
+
+        # Reads go through memoryviews: indexing one returns a plain int/float,
+        # several times faster than a NumPy scalar
+        self._present = memoryview(self.present)
+        self._code_offsets = memoryview(self.code_offsets)
+        self._readers = {}  # key -> (present bit, row -> value)
+        for name in self.string_fields:
+            self._readers[name] = (bits[name], self._string_reader(memoryview(self.columns[name])))
+        for name in self.float_fields:
+            self._readers[name] = (bits[name], memoryview(self.columns[name]).__getitem__)
+        if self.codes_field:
+            self._readers[self.codes_field] = (bits[self.codes_field], self.codes)
+        for name in self.blob_fields:
+            self._readers[name] = (bits[name], self._blob_reader(name))
+        self._extra = self._blob_reader("")
+        self.records = [StoredRecord(self, row) for row in range(len(records))]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, row):
+        return self.records[row]
+
+    def _string_reader(self, column):
+        strings = self.strings.strings
+        return lambda row: strings[column[row]]
+
+    def _blob_reader(self, name):
+        buffer, offsets = self.blobs[name]
+        buffer, offsets = memoryview(buffer), memoryview(offsets)
+
+        def read(row):
+            start, end = offsets[row], offsets[row + 1]
+            return orjson.loads(buffer[start:end]) if start != end else {}
+        return read
+
+    def codes(self, row):
+        start, end = self._code_offsets[row], self._code_offsets[row + 1]
+        return self.code_list[start:end]
+
+    def field(self, row, key, default=None):
+        reader = self._readers.get(key)
+        if reader is not None and self._present[row] & reader[0]:
+            return reader[1](row)
+        return self._extra(row).get(key, default)
+
+    def keys(self, row):
+        mask = self._present[row]
+        return [name for name, (bit, _) in self._readers.items() if mask & bit] + list(self._extra(row))
+
+    def nbytes(self):
+        """Bytes held in arrays and blob buffers (not counting the shared StringTable)."""
+        arrays = [*self.columns.values(), self.present, self.code_offsets]
+        arrays += [offsets for _, offsets in self.blobs.values()]
+        return (sum(array.nbytes for array in arrays) + sum(len(buffer) for buffer, _ in self.blobs.values())
+                + 8 * len(self.code_list))
+
+
+class CourseStore(RecordStore):
+    """Catalog courses (amherst_courses_all.json entries)."""
+
+    string_fields = ("semester", "course_title", "department")
+    codes_field = "course_codes"
+    # Each decoded on its own, so building the schedule index never touches descriptions
+    blob_fields = ("description", "faculty", "times_and_locations")
+
+
+class CoordStore(RecordStore):
+    """t-SNE map entries: {"codes": [...], "semester": ..., "x": ..., "y": ...}."""
+
+    string_fields = ("semester",)
+    codes_field = "codes"
+    float_fields = ("x", "y")
@@ -0,0 +1,143 @@
+"""Binary, memory-mappable store for the per-semester course embeddings.
+
+Layout of a store directory:
+    vectors.npy      (n, d) float32/float16 matrix, rows L2-normalized, grouped by semester
+    payloads.jsonl   one {"id": ..., "payload": {...}} line per row (no embedding)
+    manifest.json    dtype, dim, count and the semester -> [start, stop) row table
+
+Build it once from the JSON exports:
+    python embedding_store.py build --out data/embedding_store [--dtype float16]
+
+Loaders open vectors.npy with mmap_mode="r", so every worker process maps the same
+page-cache copy instead of parsing its own.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from catalog_index import SEMESTER_COLUMNS
+from search_backends import EMBEDDING_FILE_PATTERN, course_point_id
+
+DEFAULT_STORE_DIR = "./data/embedding_store"
+DEFAULT_SOURCE_GLOB = "./data/gpt_off_the_shelf/output_embeddings_*.json"
+
+
+def source_files(pattern=DEFAULT_SOURCE_GLOB, semester_order=SEMESTER_COLUMNS):
+    """[(semester, path)] for output_embeddings_<semester>.json files, in semester order."""
+    files = {}
+    for path in glob.glob(pattern):
+        match = EMBEDDING_FILE_PATTERN.search(os.path.basename(path))
+        if match:
+            files[match.group(1)] = path
+    order = [s for s in semester_order if s in files]
+    order += sorted(s for s in files if s not in order)
+    return [(s, files[s]) for s in order]
+
+
+class EmbeddingStore:
+    """Read side of a store directory: memory-mapped matrix plus payloads and row ranges."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.semester_ranges = {s: tuple(r) for s, r in self.manifest["semesters"].items()}
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+
+        self.ids = []
+        self.payloads = []
+        with open(os.path.join(path, "payloads.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.payloads.append(record["payload"])
+
+        if len(self.payloads) != self.vectors.shape[0]:
+            raise ValueError(f"Store {path} is inconsistent: {len(self.payloads)} payloads, {self.vectors.shape[0]} vectors")
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.exists(os.path.join(path, name)) for name in ("manifest.json", "vectors.npy", "payloads.jsonl"))
+
+    @property
+    def version(self):
+        return self.manifest.get("version")
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def iter_semester(self, semester):
+        """Yield (point_id, payload, vector) for one semester's rows."""
+        start, stop = self.semester_ranges.get(semester, (0, 0))
+        for row in range(start, stop):
+            yield self.ids[row], dict(self.payloads[row]), self.vectors[row]
+
+
+def build_store(out_dir=DEFAULT_STORE_DIR, pattern=DEFAULT_SOURCE_GLOB, dtype="float32"):
+    """Convert the JSON embedding exports into a store directory. Returns the manifest."""
+    dtype = np.dtype(dtype)
+    os.makedirs(out_dir, exist_ok=True)
+
+    vectors, semesters = [], {}
+    payload_path = os.path.join(out_dir, "payloads.jsonl")
+    with open(payload_path + ".tmp", "w", encoding="utf-8") as payload_file:
+        for sem, path in source_files(pattern):
+            with open(path, "r", encoding="utf-8") as f:
+                file_data = json.load(f)
+
+            start = len(vectors)
+            for course in file_data:
+                embedding = course.pop("embedding", None)
+                if embedding is None:
+                    continue
+                course["semester"] = sem
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors.append(vector / norm if norm else vector)
+                payload_file.write(json.dumps({"id": course_point_id(course, sem), "payload": course}, ensure_ascii=False))
+                payload_file.write("\n")
+            if len(vectors) > start:
+                semesters[sem] = [start, len(vectors)]
+            print(f"{sem}: {len(vectors) - start} vectors")
+
+    matrix = np.vstack(vectors).astype(dtype) if vectors else np.zeros((0, 0), dtype=dtype)
+    np.save(os.path.join(out_dir, "vectors.tmp.npy"), matrix)
+
+    manifest = {
+        "version": hashlib.sha256(matrix.tobytes()).hexdigest()[:16],
+        "dtype": dtype.name,
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "count": len(vectors),
+        "normalized": True,
+        "semesters": semesters,
+    }
+    with open(os.path.join(out_dir, "manifest.tmp.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap all three files in only once everything is written
+    os.replace(os.path.join(out_dir, "vectors.tmp.npy"), os.path.join(out_dir, "vectors.npy"))
+    os.replace(payload_path + ".tmp", payload_path)
+    os.replace(os.path.join(out_dir, "manifest.tmp.json"), os.path.join(out_dir, "manifest.json"))
+    print(f"Wrote {len(vectors)} x {manifest['dim']} {dtype.name} vectors to {out_dir}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped embedding store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Convert output_embeddings_*.json into a store directory")
+    build.add_argument("--out", default=DEFAULT_STORE_DIR)
+    build.add_argument("--source", default=DEFAULT_SOURCE_GLOB)
+    build.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_store(args.out, args.source, args.dtype)
+
+
+if __name__ == "__main__":
+    main()
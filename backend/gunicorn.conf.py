@@ -0,0 +1,32 @@
+"""Gunicorn settings for running several workers that share one preloaded catalog.
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py asgi:asgi_app
+
+The app is imported once in the master (preload_app). With a catalog snapshot
+(python catalog_snapshot.py build), every semester is decoded there before the
+workers fork, and gc.freeze() keeps those objects out of later collections so the
+workers' copy-on-write pages stay shared instead of being touched and copied.
+"""
+import gc
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+# Views run on ASGI_THREADS threads per worker (see asgi.py)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120  # surprise recommendations can wait on the chat model
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any worker forks
+    schedule = sys.modules.get("schedule")
+    if schedule is not None and schedule.catalog_snapshot:
+        from catalog_snapshot import preload
+
+        count = preload(schedule.catalog, schedule.schedule_index)
+        server.log.info(f"Preloaded {count} catalog semesters before forking workers")
+    gc.collect()
+    gc.freeze()
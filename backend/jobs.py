@@ -0,0 +1,318 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import LRUTTLCache
+
+# =====================================================
+# Background jobs for slow (LLM-backed) requests
+# =====================================================
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already queued or running."""
+
+
+class Job:
+    """One background unit of work, as seen by the process running it.
+
+    `result` is a (body, http_status) pair once finished.
+    """
+
+    __slots__ = ("id", "owner", "status", "result", "created_at", "started_at", "finished_at", "_done")
+
+    def __init__(self, owner=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = "queued"  # queued -> running -> done | error
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def as_dict(self):
+        info = {"job_id": self.id, "status": self.status, "created_at": self.created_at}
+        if self.finished:
+            body, http_status = self.result
+            info.update({"result": body, "http_status": http_status, "finished_at": self.finished_at})
+        return info
+
+
+def job_finished(info):
+    return info.get("status") in ("done", "error")
+
+
+# --- Job state stores: where status and results live between polls ---
+
+class MemoryJobStore:
+    """Job records in this process only (fine for a single worker)."""
+
+    def __init__(self, ttl=600, maxsize=256):
+        self._records = LRUTTLCache(maxsize=maxsize, ttl=ttl)
+
+    def put(self, job_id, record):
+        self._records.set(job_id, record)
+
+    def get(self, job_id):
+        return self._records.get(job_id)
+
+    def stats(self):
+        return {"backend": "memory", "tracked": len(self._records)}
+
+
+class SQLiteJobStore:
+    """Job records in a SQLite file (WAL mode), readable by every worker process on the host.
+
+    Records expire `ttl` seconds after their last write; expired rows are deleted
+    every PRUNE_EVERY writes.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, ttl=600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "create table if not exists jobs ("
+                "job_id text primary key, record text not null, expires real not null)"
+            )
+            conn.execute("create index if not exists jobs_expires on jobs (expires)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads (or forks): one per thread per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put(self, job_id, record):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "insert into jobs (job_id, record, expires) values (?, ?, ?) "
+            "on conflict (job_id) do update set record = excluded.record, expires = excluded.expires",
+            (job_id, json.dumps(record), now + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("delete from jobs where expires < ?", (now,))
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "select record from jobs where job_id = ? and expires >= ?", (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stats(self):
+        tracked = self._connect().execute("select count(*) from jobs where expires >= ?", (time.time(),)).fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "tracked": tracked}
+
+
+class RedisJobStore:
+    """Job records in any Redis-protocol server, shared across workers and hosts.
+
+    Uses only SET (with EX) and GET. Pass `client` to inject one; otherwise `url`
+    is opened with the optional `redis` package.
+    """
+
+    def __init__(self, url=None, client=None, ttl=600, prefix="job:"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def put(self, job_id, record):
+        self.client.set(f"{self.prefix}{job_id}", json.dumps(record), ex=int(self.ttl))
+
+    def get(self, job_id):
+        raw = self.client.get(f"{self.prefix}{job_id}")
+        return json.loads(raw) if raw else None
+
+    def stats(self):
+        return {"backend": "redis", "prefix": self.prefix}
+
+
+def create_job_store(backend="sqlite", ttl=600, maxsize=256, sqlite_path=None, redis_url=None):
+    if backend == "memory":
+        return MemoryJobStore(ttl=ttl, maxsize=maxsize)
+    if backend == "redis":
+        return RedisJobStore(redis_url or "redis://localhost:6379/0", ttl=ttl)
+    return SQLiteJobStore(sqlite_path or "./data/jobs.sqlite3", ttl=ttl)
+
+
+class JobQueue:
+    """Bounded thread pool whose job status and results are written to a job store.
+
+    Jobs run in the process that accepted them, but with a shared store (sqlite or
+    redis) any worker can answer a poll or stream for them. `store` may be a
+    zero-argument factory instead, called on first use, so a process that never
+    queues or polls a job never opens one.
+    """
+
+    POLL_INTERVAL = 0.5  # seconds between store reads while waiting on another worker's job
+
+    def __init__(self, max_workers=4, max_pending=64, ttl=600, name="jobs", store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.name = name
+        if store is None:
+            store = MemoryJobStore(ttl=ttl, maxsize=max(max_pending * 4, 256))
+        self._store = None if callable(store) else store
+        self._store_factory = store if callable(store) else None
+        self._store_lock = threading.Lock()
+        self._running = {}  # job_id -> Job, for jobs this process is running
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.store_errors = 0
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = self._store_factory()
+        return self._store
+
+    def _pool(self):
+        # Created on first submit, so no threads exist before a pre-forking server forks
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _save(self, job):
+        try:
+            self.store.put(job.id, {"owner": job.owner, **job.as_dict()})
+        except Exception as e:
+            # The local Job still completes; only pollers on other workers miss the update
+            self.store_errors += 1
+            print(f"Could not save job {job.id}: {e}")
+
+    def submit(self, fn, *args, owner=None, **kwargs):
+        """Queue fn(*args, **kwargs), which must return (body, http_status). Raises QueueFull."""
+        job = Job(owner)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending} {self.name} already pending")
+            self._pending += 1
+            self.submitted += 1
+            self._running[job.id] = job
+        self._save(job)
+        self._pool().submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.result = ({"error": "Internal server error", "details": str(e)}, 500)
+            job.status = "error"
+            self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+            self._save(job)
+            with self._lock:
+                self._pending -= 1
+                self._running.pop(job.id, None)
+
+    def get(self, job_id, owner=None):
+        """The job's status dict (with result once finished), or None if unknown, expired, or someone else's."""
+        job = self._running.get(job_id)
+        if job is not None:
+            record = {"owner": job.owner, **job.as_dict()}
+        else:
+            record = self.store.get(job_id)
+        if record is None or (owner is not None and record.get("owner") != owner):
+            return None
+        return {key: value for key, value in record.items() if key != "owner"}
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (True) or `timeout` passes (False), wherever it runs."""
+        job = self._running.get(job_id)
+        if job is not None:
+            return job.wait(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = self.store.get(job_id)
+            if record is None or job_finished(record):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL if deadline is None else
+                       max(0.0, min(self.POLL_INTERVAL, deadline - time.monotonic())))
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "store_errors": self.store_errors,
+            "store": self._store.stats() if self._store is not None else None,
+        }
+
+
+class ConcurrencyLimit:
+    """Caps concurrent calls to an upstream (e.g. the chat model) independently of web workers."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waited = 0
+        self.timeouts = 0
+
+    def acquire(self, timeout=None):
+        if self._slots.acquire(blocking=False):
+            acquired = True
+        else:
+            with self._lock:
+                self.waited += 1
+            acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            if acquired:
+                self.active += 1
+            else:
+                self.timeouts += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {"limit": self.limit, "active": self.active, "waited": self.waited, "timeouts": self.timeouts}
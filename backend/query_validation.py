@@ -1,9 +1,233 @@
 
 from flask import Flask, request, jsonify
 from functools import wraps
+import os
+import sqlite3
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 
+# =====================================================
+# Rate limiting: sliding-window counters with pluggable stores
+# =====================================================
+#
+# Each client keeps O(1) state: the current fixed window's count and the previous
+# window's. The sliding estimate is previous * (1 - elapsed fraction) + current, so
+# a burst at a window boundary can't double the limit the way a plain fixed window
+# allows. Stores differ only in where that state lives.
+
+def sliding_estimate(previous, current, elapsed, window):
+    return previous * (1 - elapsed / window) + current
+
+
+def retry_after(previous, current, elapsed, window, limit):
+    """Seconds until one more request would fit under `limit`."""
+    if current >= limit or previous == 0:
+        return window - elapsed
+    # previous * (1 - t / window) + current < limit  =>  t > window * (1 - (limit - current) / previous)
+    return max(0.0, window * (1 - (limit - current) / previous) - elapsed)
+
+
+class MemoryRateLimitStore:
+    """Per-process counters in an LRU dict: at most `max_keys` clients, idle ones evicted first."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # key -> (window_id, current, previous)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, key, limit, window, now):
+        window_id, elapsed = divmod(now, window)
+        with self._lock:
+            state = self._counters.get(key)
+            if state is None:
+                current = previous = 0
+            elif state[0] == window_id:
+                _, current, previous = state
+            elif state[0] == window_id - 1:
+                current, previous = 0, state[1]
+            else:
+                current = previous = 0
+
+            allowed = sliding_estimate(previous, current, elapsed, window) < limit
+            if allowed:
+                current += 1
+            self._counters[key] = (window_id, current, previous)
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+                self.evictions += 1
+        return allowed, 0.0 if allowed else retry_after(previous, current, elapsed, window, limit)
+
+    def stats(self):
+        return {"backend": "memory", "keys": len(self._counters), "max_keys": self.max_keys,
+                "evictions": self.evictions}
+
+
+class SQLiteRateLimitStore:
+    """Counters in a SQLite file (WAL mode), shared by every worker process on the host.
+
+    Each hit is one short IMMEDIATE transaction. Rows idle for two windows are
+    deleted, and the table is trimmed to `max_keys` least-recently-seen clients.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, max_keys=100000):
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._hits = 0
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute(
+                "create table if not exists rate_limits ("
+                "key text primary key, window_id integer not null, current integer not null, "
+                "previous integer not null, touched real not null)"
+            )
+            conn.execute("create index if not exists rate_limits_touched on rate_limits (touched)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads (or forks): one per thread per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, limit, window, now):
+        window_id, elapsed = divmod(now, window)
+        window_id = int(window_id)
+        conn = self._connect()
+        conn.execute("begin immediate")
+        try:
+            row = conn.execute("select window_id, current, previous from rate_limits where key = ?", (key,)).fetchone()
+            if row is None:
+                current = previous = 0
+            elif row[0] == window_id:
+                _, current, previous = row
+            elif row[0] == window_id - 1:
+                current, previous = 0, row[1]
+            else:
+                current = previous = 0
+
+            allowed = sliding_estimate(previous, current, elapsed, window) < limit
+            if allowed:
+                current += 1
+            conn.execute(
+                "insert into rate_limits (key, window_id, current, previous, touched) values (?, ?, ?, ?, ?) "
+                "on conflict (key) do update set window_id = excluded.window_id, current = excluded.current, "
+                "previous = excluded.previous, touched = excluded.touched",
+                (key, window_id, current, previous, now),
+            )
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+
+        self._hits += 1
+        if self._hits % self.PRUNE_EVERY == 0:
+            self.prune(now - 2 * window)
+        return allowed, 0.0 if allowed else retry_after(previous, current, elapsed, window, limit)
+
+    def prune(self, idle_before):
+        conn = self._connect()
+        removed = conn.execute("delete from rate_limits where touched < ?", (idle_before,)).rowcount
+        removed += conn.execute(
+            "delete from rate_limits where key in (select key from rate_limits order by touched desc limit -1 offset ?)",
+            (self.max_keys,),
+        ).rowcount
+        self.evictions += removed
+
+    def stats(self):
+        keys = self._connect().execute("select count(*) from rate_limits").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "keys": keys, "max_keys": self.max_keys,
+                "evictions": self.evictions}
+
+
+class RedisRateLimitStore:
+    """Counters in any Redis-protocol server, shared across workers and hosts.
+
+    Uses only INCR/DECR/GET/EXPIRE, so a local stand-in (e.g. fakeredis, or a
+    KeyDB/Valkey container) can replace Redis. Keys expire after two windows,
+    which bounds memory without any eviction pass. Pass `client` to inject one;
+    otherwise `url` is opened with the optional `redis` package.
+    """
+
+    def __init__(self, url=None, client=None, prefix="rl:"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, limit, window, now):
+        window_id, elapsed = divmod(now, window)
+        window_id = int(window_id)
+        current_key = f"{self.prefix}{key}:{window_id}"
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(2 * window) + 1)
+        pipe.get(f"{self.prefix}{key}:{window_id - 1}")
+        current, _, previous = pipe.execute()
+        previous = int(previous or 0)
+
+        # Count first, then give the slot back if it didn't fit: no read-modify-write race
+        allowed = sliding_estimate(previous, current - 1, elapsed, window) < limit
+        if not allowed:
+            self.client.decr(current_key)
+            current -= 1
+        return allowed, 0.0 if allowed else retry_after(previous, current, elapsed, window, limit)
+
+    def stats(self):
+        return {"backend": "redis", "prefix": self.prefix}
+
+
+def create_rate_limit_store(backend="memory", max_keys=10000, sqlite_path=None, redis_url=None):
+    if backend == "sqlite":
+        return SQLiteRateLimitStore(sqlite_path or "./data/rate_limits.sqlite3", max_keys=max_keys)
+    if backend == "redis":
+        return RedisRateLimitStore(redis_url or "redis://localhost:6379/0")
+    return MemoryRateLimitStore(max_keys=max_keys)
+
+
+class RateLimiter:
+    """`limit` requests per `window` seconds per key, on top of a counter store."""
+
+    def __init__(self, limit, window=60, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store or MemoryRateLimitStore()
+        self.allowed = 0
+        self.denied = 0
+        self.errors = 0
+
+    def check(self, key):
+        """(allowed, retry_after_seconds). Fails open if the shared store is unreachable."""
+        try:
+            allowed, wait = self.store.hit(key, self.limit, self.window, time.time())
+        except Exception as e:
+            self.errors += 1
+            print(f"Rate limit store error ({type(self.store).__name__}): {e}")
+            return True, 0.0
+        if allowed:
+            self.allowed += 1
+        else:
+            self.denied += 1
+        return allowed, wait
+
+    def stats(self):
+        stats = {"limit": self.limit, "window": self.window, "allowed": self.allowed,
+                 "denied": self.denied, "errors": self.errors}
+        stats.update(self.store.stats())
+        return stats
+
+
 # =====================================================
 # Simple, Focused Validation Class
 # =====================================================
@@ -11,13 +235,13 @@ from datetime import datetime
 class QueryValidator:
     """Simple validation focused on actual risks for embeddings API."""
     
-    def __init__(self):
+    def __init__(self, rate_limiter=None):
         self.MAX_QUERY_LENGTH = 500     # API cost protection
         self.MIN_QUERY_LENGTH = 1       # Prevent empty queries
         
-        # Simple rate limiting (in production, use Redis)
-        self.request_counts = {}
+        # Per-client rate limiting; pass a RateLimiter with a sqlite/redis store to share it across workers
         self.MAX_REQUESTS_PER_MINUTE = 10
+        self.rate_limiter = rate_limiter or RateLimiter(self.MAX_REQUESTS_PER_MINUTE, window=60)
     
     def validate(self, query: str) -> tuple[bool, str]:
         """Validate query and return (is_valid, error_message)."""
@@ -41,25 +265,11 @@ class QueryValidator:
         return True, "Valid query"
     
     def check_rate_limit(self, client_ip: str) -> tuple[bool, str]:
-        """Simple rate limiting check."""
-        current_time = time.time()
-        
-        # Initialize or clean old requests
-        if client_ip not in self.request_counts:
-            self.request_counts[client_ip] = []
-        
-        # Remove requests older than 1 minute
-        self.request_counts[client_ip] = [
-            req_time for req_time in self.request_counts[client_ip]
-            if current_time - req_time < 60
-        ]
-        
-        # Check if under limit
-        if len(self.request_counts[client_ip]) >= self.MAX_REQUESTS_PER_MINUTE:
-            return False, f"Rate limit exceeded. Max {self.MAX_REQUESTS_PER_MINUTE} requests per minute"
-        
-        # Add current request
-        self.request_counts[client_ip].append(current_time)
+        """Sliding-window rate limiting check."""
+        allowed, wait = self.rate_limiter.check(client_ip)
+        if not allowed:
+            return False, (f"Rate limit exceeded. Max {self.rate_limiter.limit} requests per "
+                           f"{self.rate_limiter.window:g} seconds; retry in {wait:.0f}s")
         return True, "Within rate limits"
 
 # Create global validator instance
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, url_for
 from flask_mail import Mail, Message
 import base64
 from datetime import datetime
@@ -8,7 +8,7 @@ from flask_cors import CORS
 import requests
 from dotenv import load_dotenv
 from config import PORT
-from transcript_scrape import extract_courses_from_transcript
+from transcript_scrape import TranscriptParseLimit, extract_courses_from_transcript, extract_courses_limited
 import openai
 import numpy as np
 from qdrant_client import QdrantClient
@@ -20,7 +20,22 @@ from datetime import datetime
 from supabase import create_client, Client
 import threading
 import time
-from query_validation import QueryValidator
+from query_validation import QueryValidator, RateLimiter, create_rate_limit_store
+from schedule_index import build_schedule_index
+from catalog_index import SEMESTER_COLUMNS, CatalogIndex
+from course_store import CoordStore, CourseStore, StringTable, release_free_heap
+from catalog_snapshot import load_snapshot, preload as preload_snapshot
+from transcript_import import enrich_transcript
+from caching import DiskBackedCache, EmbeddingCache, LRUTTLCache, VersionedCache, normalize_query
+from search_backends import create_search_backend
+from async_runtime import AsyncRuntime
+from supabase_rest import SupabaseREST
+from user_context import UserContextCache, create_version_store, build_user_context
+from surprise_index import load_department_centroids
+from jobs import ConcurrencyLimit, JobQueue, QueueFull, create_job_store
+from write_behind import WriteBehindQueue
+import atexit
+import hashlib
 import jwt
 import glob
 
@@ -31,8 +46,21 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Per-IP limit on /semantic_course_search (0 = off). Use the sqlite or redis store so
+# the limit holds across workers instead of per process.
+SEARCH_RATE_LIMIT_PER_MINUTE = int(os.getenv("SEARCH_RATE_LIMIT_PER_MINUTE", 0))
+
 # Create global validator instance
-validator = QueryValidator()
+validator = QueryValidator(RateLimiter(
+    SEARCH_RATE_LIMIT_PER_MINUTE or 10,
+    window=60,
+    store=create_rate_limit_store(
+        os.getenv("RATE_LIMIT_BACKEND", "memory"),
+        max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", 10000)),
+        sqlite_path=os.getenv("RATE_LIMIT_SQLITE_PATH"),
+        redis_url=os.getenv("RATE_LIMIT_REDIS_URL"),
+    ),
+))
 
 # Supabase Client for Storage
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
@@ -48,11 +76,6 @@ except Exception as e:
     print(f"Failed to connect to Qdrant: {e}")
     qdrant = None
 
-SUPABASE_TABLE_URL = f"{SUPABASE_URL}/rest/v1/user_courses"  # Example table path
-SUPABASE_TABLE_URL_EXTRA=f"{SUPABASE_URL}/rest/v1/user_courses_test"
-SUPABASE_FEEDBACK_TABLE_URL=f"{SUPABASE_URL}/rest/v1/questions"
-SUPABASE_NOTES_TABLE_URL=f"{SUPABASE_URL}/rest/v1/user_notes"
-SUPABASE_SURPRISE_TABLE_URL=f"{SUPABASE_URL}/rest/v1/surprise_history"
 
 # --- Azure OpenAI: use TWO clients (different resources) ---
 
@@ -81,6 +104,59 @@ client_embed = openai.AzureOpenAI(
     api_version=AZURE_OPENAI_API_VERSION,
 )
 
+# --- Shared event loop + pooled httpx.AsyncClient for concurrent upstream calls ---
+upstream = AsyncRuntime(timeout=float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", 10)))
+atexit.register(upstream.close)
+
+# --- Supabase REST tables (user_courses, user_courses_test, user_notes, questions, surprise_history) ---
+db = SupabaseREST(
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    upstream,
+    timeout=float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", 10)),
+    max_retries=int(os.getenv("SUPABASE_MAX_RETRIES", 3)),
+)
+
+# --- Write-behind logging: surprise_history and feedback rows are batched off the request path ---
+def assign_insight_indexes(rows):
+    """Number each user's new surprise_history rows after their current max insight_index.
+
+    Returns the rows of users whose lookup failed; the queue retries just those.
+    """
+    users = list(dict.fromkeys(row["user_id"] for row in rows))
+    responses = upstream.gather(*(
+        db.surprise_history.aselect(
+            params={"select": "insight_index", "order": "insight_index.desc", "limit": 1},
+            user_id=user,
+        )
+        for user in users
+    ), return_exceptions=True)
+    next_index = {}
+    for user, resp in zip(users, responses):
+        if isinstance(resp, Exception) or resp.status_code != 200:
+            print(f"Could not read insight_index for {user}: {getattr(resp, 'status_code', resp)}")
+            continue
+        latest = resp.json()
+        next_index[user] = ((latest[0].get("insight_index") or 0) if latest else 0) + 1
+    for row in rows:
+        if row["user_id"] in next_index:
+            row["insight_index"] = next_index[row["user_id"]]
+            next_index[row["user_id"]] += 1
+    return [row for row in rows if row["user_id"] not in next_index]
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 1000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 100))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", 1.0))
+LOG_MAX_ATTEMPTS = int(os.getenv("LOG_MAX_ATTEMPTS", 3))
+surprise_log = WriteBehindQueue(db.surprise_history, max_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                                flush_interval=LOG_FLUSH_SECONDS, prepare_batch=assign_insight_indexes,
+                                max_attempts=LOG_MAX_ATTEMPTS)
+feedback_log = WriteBehindQueue(db.questions, max_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                                flush_interval=LOG_FLUSH_SECONDS, max_attempts=LOG_MAX_ATTEMPTS)
+# Registered after upstream, so these flush before the shared client closes
+atexit.register(surprise_log.close)
+atexit.register(feedback_log.close)
+
 app = Flask(__name__)
 
 # Load allowed origins from environment variables
@@ -116,6 +192,46 @@ print("Using Supabase JWT Secret for HS256 verification")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_REPO = os.getenv("GITHUB_REPO", "SebastienBrown/CourseFinder") # owner/repo
 
+# Verified claims keyed by sha256 of the token, each kept until the token's own `exp`
+# (capped at JWT_CACHE_MAX_TTL). Only tokens that passed full verification are stored.
+JWT_CACHE_MAX_TTL = int(os.getenv("JWT_CACHE_MAX_TTL", 3600))
+jwt_cache = LRUTTLCache(maxsize=int(os.getenv("JWT_CACHE_SIZE", 10000)), ttl=JWT_CACHE_MAX_TTL)
+
+
+def verify_jwt(token):
+    """Verified claims for `token`, from jwt_cache or one HS256 decode. Raises jwt exceptions."""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    cached = jwt_cache.get(digest)
+    if cached is not None:
+        return dict(cached)
+
+    # Tokens are accepted for whatever audience they name, so skip the audience
+    # comparison instead of decoding once unverified just to read `aud`
+    payload = jwt.decode(
+        token,
+        SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],  # Supabase uses HS256, not RS256!
+        options={
+            "verify_exp": True,  # Verify expiration
+            "verify_iat": True,  # Verify issued at
+            "verify_signature": True,
+            "verify_aud": False,
+        }
+    )
+    # ...but still reject a malformed aud claim, as the audience check did
+    audience = payload.get("aud")
+    if audience is not None and not (
+        isinstance(audience, str) or (isinstance(audience, list) and all(isinstance(a, str) for a in audience))
+    ):
+        raise jwt.InvalidAudienceError("Invalid claim format in token")
+
+    expires_at = time.time() + JWT_CACHE_MAX_TTL
+    if "exp" in payload:
+        expires_at = min(expires_at, payload["exp"])
+    jwt_cache.set(digest, payload, expires_at=expires_at)
+    return dict(payload)
+
+
 def jwt_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -127,24 +243,7 @@ def jwt_required(f):
         #print("Token received:", token[:20] + "...")  # Only print first 20 chars for security
 
         try:
-
-            # First, decode without verification to see the audience claim
-            unverified_payload = jwt.decode(token, options={"verify_signature": False})
-            audience = unverified_payload.get("aud")
-            #print(f"Token audience: {audience}")
-
-            # Decode JWT using HS256 algorithm with Supabase JWT secret
-            payload = jwt.decode(
-                token,
-                SUPABASE_JWT_SECRET,
-                algorithms=["HS256"],  # Supabase uses HS256, not RS256!
-                audience=audience,  # Use the audience from the token
-                options={
-                    "verify_exp": True,  # Verify expiration
-                    "verify_iat": True,  # Verify issued at
-                    "verify_signature": True
-                }
-            )
+            payload = verify_jwt(token)
             
             #print("JWT payload verified successfully")
             #print(f"User ID: {payload.get('sub')}")
@@ -171,8 +270,20 @@ def jwt_required(f):
         return f(*args, **kwargs)
     return wrapper
 
+# --- Query embedding cache ---
+embedding_cache = EmbeddingCache(
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", 2048)),
+    ttl=int(os.getenv("EMBEDDING_CACHE_TTL", 7 * 24 * 3600)),
+    path=os.getenv("EMBEDDING_CACHE_PATH"),  # optional .npz file so restarts aren't cold
+)
+atexit.register(embedding_cache.save)
+
 def get_openai_embedding(text):
     """Get embedding from Azure OpenAI using full 1536 dimensions."""
+    cached = embedding_cache.get_vector(AZURE_OPENAI_EMBED_DEPLOYMENT, text)
+    if cached is not None:
+        return cached.reshape(1, -1)
+
     response = client_embed.embeddings.create(
         model=AZURE_OPENAI_EMBED_DEPLOYMENT,
         input=text,
@@ -187,40 +298,120 @@ def get_openai_embedding(text):
     #take out this statement later
     assert embedding.shape[0] == 1536, f"Unexpected embedding dimension: {embedding.shape[0]}"
 
-    return embedding.reshape(1, -1)  
+    embedding = embedding_cache.set_vector(AZURE_OPENAI_EMBED_DEPLOYMENT, text, embedding)
+    return embedding.reshape(1, -1)
 
 
-with open('./data/amherst_courses_all.json') as f:
-    try:
-        amherst_data = json.load(f)
-        if not isinstance(amherst_data, list):
-            raise ValueError("amherst_data must be a list")
-        print(f"Successfully loaded amherst_data with {len(amherst_data)} entries")
-    except json.JSONDecodeError as e:
-        print(f"Error loading amherst_courses_all.json: {e}")
-        amherst_data = []
-    except Exception as e:
-        print(f"Unexpected error loading amherst_courses_all.json: {e}")
-        amherst_data = []
+# Semester columns of user_courses / user_courses_test that the API reads and writes (the
+# frontend's AVAILABLE_SEMESTERS). Later catalog semesters stay read-only until the
+# tables and frontend gain their columns.
+USER_COURSE_COLUMNS = SEMESTER_COLUMNS[:SEMESTER_COLUMNS.index("2425S") + 1]
 
-with open('./data/precomputed_tsne_coords_all_5707402.json') as f:
+
+CATALOG_PATH = './data/amherst_courses_all.json'
+COORDS_PATH = './data/precomputed_tsne_coords_all_5707402.json'
+
+# Prefer the precompiled snapshot (python catalog_snapshot.py build): nothing is parsed at
+# import, each semester is decoded on first use. Without one, load the JSON as before.
+catalog_snapshot = load_snapshot(os.getenv("CATALOG_SNAPSHOT_DIR", "./data/catalog_snapshot"),
+                                 CATALOG_PATH, COORDS_PATH, SEMESTER_COLUMNS)
+if catalog_snapshot:
+    catalog, schedule_index = catalog_snapshot
+    if os.getenv("CATALOG_PRELOAD") == "1":
+        print(f"Preloaded {preload_snapshot(catalog, schedule_index)} catalog semesters")
+else:
+    with open('./data/amherst_courses_all.json') as f:
+        try:
+            amherst_data = json.load(f)
+            if not isinstance(amherst_data, list):
+                raise ValueError("amherst_data must be a list")
+            print(f"Successfully loaded amherst_data with {len(amherst_data)} entries")
+        except json.JSONDecodeError as e:
+            print(f"Error loading amherst_courses_all.json: {e}")
+            amherst_data = []
+        except Exception as e:
+            print(f"Unexpected error loading amherst_courses_all.json: {e}")
+            amherst_data = []
+
+    with open('./data/precomputed_tsne_coords_all_5707402.json') as f:
+        try:
+            coords_data = json.load(f)
+            if not isinstance(coords_data, list):
+                raise ValueError("coords_data must be a list")
+            print(f"Successfully loaded coords_data with {len(coords_data)} entries")
+            # Validate first few entries
+            for i, entry in enumerate(coords_data[:5]):
+                if not isinstance(entry, dict):
+                    print(f"Warning: Entry {i} is not a dictionary: {entry}")
+                if "codes" not in entry:
+                    print(f"Warning: Entry {i} missing 'codes' field: {entry}")
+        except json.JSONDecodeError as e:
+            print(f"Error loading precomputed_tsne_coords_all_5707402.json: {e}")
+            coords_data = []
+        except Exception as e:
+            print(f"Unexpected error loading precomputed_tsne_coords_all_5707402.json: {e}")
+            coords_data = []
+
+    # Keep only compact columnar copies (shared string/code table); the parsed dicts are freed
+    catalog_strings = StringTable()
+    amherst_data = CourseStore(amherst_data, catalog_strings)
+    coords_data = CoordStore(coords_data, catalog_strings)
+
+    # Semester-partitioned lookups so handlers never scan the whole catalog
+    catalog = CatalogIndex(amherst_data, SEMESTER_COLUMNS)
+
+    # Pre-parsed meeting intervals per semester for /conflicted_courses
+    schedule_index = build_schedule_index(amherst_data, coords_data)
+    release_free_heap()
+
+# --- Vector search backend: "qdrant" (remote) or "local" (in-process NumPy) ---
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "qdrant")
+try:
+    search_backend = create_search_backend(
+        SEARCH_BACKEND,
+        qdrant_client=qdrant,
+        embeddings_glob=os.getenv("LOCAL_EMBEDDINGS_GLOB", "./data/gpt_off_the_shelf/output_embeddings_*.json"),
+        semester_order=SEMESTER_COLUMNS,
+        dtype=os.getenv("LOCAL_SEARCH_DTYPE", "float32"),
+        store_path=os.getenv("EMBEDDING_STORE_DIR", "./data/embedding_store"),
+        version_poll_seconds=int(os.getenv("CATALOG_VERSION_POLL_SECONDS", 60)),
+    )
+    print(f"Using {SEARCH_BACKEND} search backend")
+except Exception as e:
+    print(f"Failed to initialize {SEARCH_BACKEND} search backend: {e}")
+    search_backend = None
+
+# Surprises rank with the filtered vector query by default ("vector"). "centroid" opts in to
+# in-process ranking against department centroids, which needs vectors in process: the
+# local backend or the embedding store.
+SURPRISE_RANKING = os.getenv("SURPRISE_RANKING", "vector")
+SURPRISE_NOVELTY_WEIGHT = float(os.getenv("SURPRISE_NOVELTY_WEIGHT", 0.5))
+department_centroids = None
+if SURPRISE_RANKING == "centroid":
     try:
-        coords_data = json.load(f)
-        if not isinstance(coords_data, list):
-            raise ValueError("coords_data must be a list")
-        print(f"Successfully loaded coords_data with {len(coords_data)} entries")
-        # Validate first few entries
-        for i, entry in enumerate(coords_data[:5]):
-            if not isinstance(entry, dict):
-                print(f"Warning: Entry {i} is not a dictionary: {entry}")
-            if "codes" not in entry:
-                print(f"Warning: Entry {i} missing 'codes' field: {entry}")
-    except json.JSONDecodeError as e:
-        print(f"Error loading precomputed_tsne_coords_all_5707402.json: {e}")
-        coords_data = []
+        department_centroids = load_department_centroids(
+            search_backend, store_path=os.getenv("EMBEDDING_STORE_DIR", "./data/embedding_store")
+        )
     except Exception as e:
-        print(f"Unexpected error loading precomputed_tsne_coords_all_5707402.json: {e}")
-        coords_data = []
+        print(f"Failed to build department centroids, using vector search for surprises: {e}")
+
+# Ranked /semantic_course_search results, dropped whenever the catalog version changes
+search_result_cache = VersionedCache(maxsize=int(os.getenv("SEARCH_RESULT_CACHE_SIZE", 1024)))
+
+# Surprise inputs per user (history, departments, notes profile, profile embedding);
+# dropped by the endpoints that write user_courses / user_notes, in every worker via
+# per-user stamps in a shared store
+USER_CONTEXT_CACHE_TTL = int(os.getenv("USER_CONTEXT_CACHE_TTL", 300))
+user_contexts = UserContextCache(
+    maxsize=int(os.getenv("USER_CONTEXT_CACHE_SIZE", 4096)),
+    ttl=USER_CONTEXT_CACHE_TTL,
+    versions=create_version_store(
+        os.getenv("USER_CONTEXT_STORE_BACKEND", "sqlite"),
+        ttl=USER_CONTEXT_CACHE_TTL,
+        sqlite_path=os.getenv("USER_CONTEXT_SQLITE_PATH"),
+        redis_url=os.getenv("USER_CONTEXT_REDIS_URL"),
+    ),
+)
 
 # Sample input: list of course names the student is already taking
 #taken_course_codes = ["ARHA-324","ARHA-357","HIST-428"]
@@ -228,49 +419,37 @@ with open('./data/precomputed_tsne_coords_all_5707402.json') as f:
 # --- Helper functions ---
 def catalog_semesters_in_data():
     """Return SEMESTER_COLUMNS that actually appear in amherst_data, in chronological order."""
-    present = {c.get("semester") for c in amherst_data if c.get("semester")}
-    return [s for s in SEMESTER_COLUMNS if s in present]
+    return catalog.semesters
 
 def latest_semesters_in_catalog(k=1):
-    ordered = catalog_semesters_in_data()
-    return ordered[-k:] if ordered else []
+    return catalog.latest_semesters(k)
 
 
-# Helper to convert time string to (start, end) datetime.time objects
-def parse_time_range(time_str):
-    try:
-        start_str, end_str = time_str.split(" - ")
-        fmt = "%I:%M %p"
-        return (datetime.strptime(start_str, fmt).time(), datetime.strptime(end_str, fmt).time())
-    except Exception:
-        return None
-    
-def extract_schedule(course_codes, current_semester):
-    # Extract scheduled time slots for taken courses in the current semester only
-    taken_schedule = []
-    for course in amherst_data:
-        # Only process courses from the current semester
-        if course.get("semester") != current_semester:
+# Balanced shortlist for reliability and variety in the surprise LLM prompt
+SURPRISE_SHORTLIST_SIZE = 30
+# Candidates fetched when the vector index can't apply the exclusion filters itself
+SURPRISE_FALLBACK_FETCH = 150
+
+def surprise_shortlist(hits, skip_codes, user_departments, size=SURPRISE_SHORTLIST_SIZE):
+    """Payloads of hits not taken/excluded and outside every department the user has explored."""
+    shortlist = []
+    for point in hits:
+        payload = point.payload
+        norm_codes = [str(c).strip().upper() for c in payload.get("course_codes", [])]
+
+        # Skip if taken or excluded
+        if any(c in skip_codes for c in norm_codes):
             continue
-            
-        for code in course.get("course_codes", []):
-            if code in course_codes:
-                times_and_locations = course.get("times_and_locations", {})
-                for section in times_and_locations.values():
-                    for meetings in section.values():
-                        for meeting in meetings:
-                            parsed = parse_time_range(meeting["time"])
-                            if parsed:
-                                taken_schedule.append((meeting["day"], *parsed))
-    return taken_schedule
-
-# Helper to check for time overlap
-def has_conflict(course_times, taken_schedule):
-    for day, start, end in course_times:
-        for t_day, t_start, t_end in taken_schedule:
-            if day == t_day and not (end <= t_start or start >= t_end):
-                return True
-    return False
+
+        # Surprise factor: skip if in a department they've already explored
+        course_depts = {c.split("-")[0] for c in norm_codes if "-" in c}
+        if course_depts & user_departments:
+            continue
+
+        shortlist.append(payload)
+        if len(shortlist) >= size:
+            break
+    return shortlist
 
 
 @app.route("/")
@@ -287,116 +466,24 @@ def conflicted_courses():
     if not current_semester:
         return jsonify({"error": "No semester specified"}), 400
 
-    # Filter amherst_data to only include courses from the current semester
-    semester_courses = [course for course in amherst_data if course.get("semester") == current_semester]
-    print(f"Found {len(semester_courses)} courses in semester {current_semester}")
+    print(f"Found {len(catalog.courses_in(current_semester))} courses in semester {current_semester}")
 
-        # Find the taken courses in the current semester
-    taken_courses_in_semester = set()
-    for course in semester_courses:
-        for code in course.get("course_codes", []):
-            if code in taken_course_codes:
-                taken_courses_in_semester.add(code)
+    semester_schedule = schedule_index.get(current_semester)
+    if semester_schedule is None:
+        return jsonify({"conflicted_courses": []})
 
-    taken_courses_in_semester = list(taken_courses_in_semester)  # Convert back to list if needed
+    # Find the taken courses in the current semester
+    taken_courses_in_semester = [code for code in set(taken_course_codes) if code in semester_schedule.codes]
 
     if not taken_courses_in_semester:
         return jsonify({"conflicted_courses": []})
 
-    taken_schedule = extract_schedule(taken_courses_in_semester, current_semester)
-    conflicted_courses = []
-
-    for entry in coords_data:
-        # Only check courses from the current semester
-        if entry.get("semester") != current_semester:
-            continue
-
-        codes = entry.get("codes", [])
-        if any(code in taken_courses_in_semester for code in codes):
-            continue  # don't include the user's own courses
-
-        course_times = []
-        for course in semester_courses:  # Use filtered semester_courses
-            if any(code in course.get("course_codes", []) for code in codes):
-                times_and_locations = course.get("times_and_locations", {})
-                # Skip if times_and_locations is not a dictionary
-                if not isinstance(times_and_locations, dict):
-                    print(f"Warning: times_and_locations is not a dict for course {course.get('course_codes')} in semester {course.get('semester')}: {times_and_locations}")
-                    continue
-                    
-                try:
-                    for course_section in times_and_locations.values():
-                        if not isinstance(course_section, dict):
-                            print(f"Warning: course_section is not a dict: {course_section}")
-                            continue
-                            
-                        for section_meetings in course_section.values():
-                            if not isinstance(section_meetings, list):
-                                print(f"Warning: section_meetings is not a list: {section_meetings}")
-                                continue
-                                
-                            for meeting in section_meetings:
-                                if isinstance(meeting, dict) and "time" in meeting:
-                                    parsed = parse_time_range(meeting["time"])
-                                    if parsed:
-                                        course_times.append((meeting.get("day", ""), *parsed))
-                except AttributeError as e:
-                    print(f"Error processing times_and_locations for course {course.get('course_codes')}: {e}")
-                    continue
-
-        if not course_times:
-            continue  # no times to compare
-
-        if has_conflict(course_times, taken_schedule):
-            #print("Course",course,"has a conflict with these times ",course_times)
-            conflicted_courses.extend(codes)  # Add all codes for this course
-            #print("Course",codes,"conflicts with ",course_times)
-
-    #print("Taken schedule is ",taken_schedule)
-    #print("Current Semester:", current_semester)
-    #print("Taken courses in semester:", taken_courses_in_semester)
-    #print("Conflicted:", conflicted_courses)  # sample output
+    # Meeting times were parsed once at load time; this is a per-day interval sweep
+    conflicted_courses = semester_schedule.conflicted_codes(taken_courses_in_semester)
 
     return jsonify({"conflicted_courses": conflicted_courses})
 
 
-# List of allowed semester columns
-SEMESTER_COLUMNS = [
-    "0910F",
-    "0910S",
-    "1011F",
-    "1011S",
-    "1112F",
-    "1112S",
-    "1213F",
-    "1213S",
-    "1314F",
-    "1314S",
-    "1415F",
-    "1415S",
-    "1516F",
-    "1516S",
-    "1617F",
-    "1617S",
-    "1718F",
-    "1718S",
-    "1819F",
-    "1819S",
-    "1920F",
-    "1920S",
-    "2021F",
-    "2021J",
-    "2021S",
-    "2122F",
-    "2122J",
-    "2122S",
-    "2223F",
-    "2223S",
-    "2324F",
-    "2324S",
-    "2425F",
-    "2425S"
-]
 
 
 
@@ -410,6 +497,14 @@ def semantic_search():
     useAllSemesters=data.get("allSemesterSearch")
     currentSem=data.get("currentSemester")
 
+    if SEARCH_RATE_LIMIT_PER_MINUTE:
+        # Last hop is the one our proxy appended; earlier entries are client-supplied
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        client_ip = forwarded.split(",")[-1].strip() or request.remote_addr or "unknown"
+        within_limit, error = validator.check_rate_limit(client_ip)
+        if not within_limit:
+            return jsonify({"error": error}), 429
+
     # Check if query is safe to use
     is_valid, error = validator.validate(query)
     
@@ -418,55 +513,60 @@ def semantic_search():
         print("invalid query")
         return jsonify({"error": error}), 400
 
+    if not search_backend:
+        return jsonify({"error": f"Search backend ({SEARCH_BACKEND}) is not available"}), 500
+
+    semester_filter = currentSem if not useAllSemesters and currentSem else None
+
+    # Results only change when the catalog is re-ingested, so serve repeats from cache
+    search_result_cache.check_version(search_backend.catalog_version())
+    cache_key = (normalize_query(query), semester_filter)
+    cached_courses = search_result_cache.get(cache_key)
+    if cached_courses is not None:
+        return jsonify(cached_courses)
+
     query_embedding=get_openai_embedding(query)
-    
-    if not qdrant:
-        return jsonify({"error": "Qdrant is not connected"}), 500
-        
-    query_filter = None
-    if not useAllSemesters and currentSem:
-        query_filter = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="semester",
-                    match=models.MatchValue(value=currentSem)
-                )
-            ]
-        )
-        
-    # get_openai_embedding returns it as shape (1, 1536), so flatten it
-    embedding_list = query_embedding[0].tolist()
-
-    search_result = qdrant.search(
-        collection_name="amherst_courses",
-        query_vector=embedding_list,
-        query_filter=query_filter,
-        limit=100  # Fetch a wide batch for proper deduplication
+
+    # One hit per distinct course title, grouped inside the search backend
+    search_result = search_backend.search_grouped(
+        query_embedding[0],
+        semester=semester_filter,
+        limit=5
     )
-    
-    seen_titles = set()
+
     ranked_courses = []
-    
     for hit in search_result:
         course = hit.payload
         course["similarity"] = hit.score
-        
-        # Deduplicate by course title
-        title = course.get("course_title", "").strip().lower()
-        if title and title not in seen_titles:
-            seen_titles.add(title)
-            ranked_courses.append(course)
-            
-        if len(ranked_courses) >= 5:
-            break
+        ranked_courses.append(course)
 
     # Step 5: Print top 5
     for course in ranked_courses:
         print(f"{course.get('course_codes')} - {course.get('course_title')} (similarity: {course['similarity']:.4f})")
 
+    search_result_cache.set(cache_key, ranked_courses)
     return jsonify(ranked_courses)
 
 
+def upsert_semester_courses(user_id, semester_courses):
+    """Write {semester: [codes]} into the user's user_courses row with one upsert."""
+    # Prepare row for Supabase
+    row_data = {"id": user_id}
+
+    for semester in USER_COURSE_COLUMNS:
+        if semester in semester_courses:
+            courses_list = semester_courses[semester]
+            #if courses_list:  # Only include if non-empty list
+            row_data[semester] = courses_list
+
+    #print("Prepared row data:", row_data)
+
+    # Send upsert to Supabase REST API
+    response = db.user_courses.upsert([row_data])
+    user_contexts.invalidate(user_id)
+    return response
+
+
 @app.route("/submit_courses", methods=["POST"])
 @jwt_required
 def submit_courses(payload=None, user_id=None, user_email=None):
@@ -480,27 +580,7 @@ def submit_courses(payload=None, user_id=None, user_email=None):
     if not user_id or not semester_courses:
         return jsonify({"error": "Missing user_id or semester_courses"}), 400
 
-    # Prepare row for Supabase
-    row_data = {"id": user_id}
-
-    for semester in SEMESTER_COLUMNS:
-        if semester in semester_courses:
-            courses_list = semester_courses[semester]
-            #if courses_list:  # Only include if non-empty list
-            row_data[semester] = courses_list
-
-    #print("Prepared row data:", row_data)
-
-    # Send upsert to Supabase REST API
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates"  # enables upsert
-    }
-
-    # Note — POST to table endpoint, no ?id filter
-    response = requests.post(SUPABASE_TABLE_URL, json=[row_data], headers=headers)
+    response = upsert_semester_courses(user_id, semester_courses)
 
     print("Supabase response:", response.status_code, response.text)
 
@@ -520,20 +600,12 @@ def retrieve_courses(payload=None, user_id=None, user_email=None):
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-
-    # Build GET URL with filter to retrieve row by user id
-    get_url = f"{SUPABASE_TABLE_URL}?id=eq.{user_id}"
-    get_url2 = f"{SUPABASE_TABLE_URL_EXTRA}?id=eq.{user_id}"
-    
     try:
-        response = requests.get(get_url, headers=headers)
-        response2 = requests.get(get_url2, headers=headers)
+        # Both tables are independent, so fetch them concurrently
+        response, response2 = upstream.gather(
+            db.user_courses.aselect(id=user_id),
+            db.user_courses_test.aselect(id=user_id),
+        )
 
         if response.status_code == 200 and response2.status_code == 200:
 
@@ -550,7 +622,7 @@ def retrieve_courses(payload=None, user_id=None, user_email=None):
                 # Create a list of courses with their semester information
                 courses_with_semesters = []
                 for entry in combined_data:
-                    for semester in SEMESTER_COLUMNS:
+                    for semester in USER_COURSE_COLUMNS:
                         if semester in entry and entry[semester] is not None:
                             for course in entry[semester]:
                                 courses_with_semesters.append({
@@ -570,24 +642,118 @@ def retrieve_courses(payload=None, user_id=None, user_email=None):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/transcript_parsing", methods=["POST"])
-def transcript_parsing():
+# Processes per upload for page-parallel parsing (0/1 = parse in the request thread).
+# Only used when TRANSCRIPT_PARSE_CPU_SECONDS=0; limited parses run single-process in a sandbox child.
+TRANSCRIPT_PARSE_WORKERS = int(os.getenv("TRANSCRIPT_PARSE_WORKERS", 0))
+TRANSCRIPT_PARSE_CPU_SECONDS = int(os.getenv("TRANSCRIPT_PARSE_CPU_SECONDS", 20))
+TRANSCRIPT_PARSE_WALL_SECONDS = float(os.getenv("TRANSCRIPT_PARSE_WALL_SECONDS", 30))
+TRANSCRIPT_PARSE_MEMORY_MB = int(os.getenv("TRANSCRIPT_PARSE_MEMORY_MB", 1024))
+TRANSCRIPT_MAX_BYTES = int(os.getenv("TRANSCRIPT_MAX_BYTES", 10 * 1024 * 1024))
+# Scanned pages (no text layer) are OCR'd with tesseract, this many pages at a time
+TRANSCRIPT_OCR = os.getenv("TRANSCRIPT_OCR", "1") == "1"
+TRANSCRIPT_OCR_WORKERS = int(os.getenv("TRANSCRIPT_OCR_WORKERS", 4))
+
+# Parsed results keyed by sha256 of the upload. Only the parsed courses (or the
+# rejection) are kept, never the PDF itself.
+transcript_cache = DiskBackedCache(
+    maxsize=int(os.getenv("TRANSCRIPT_CACHE_SIZE", 512)),
+    ttl=int(os.getenv("TRANSCRIPT_CACHE_TTL", 24 * 3600)),
+    directory=os.getenv("TRANSCRIPT_CACHE_DIR"),
+)
+
+
+def parse_transcript_bytes(pdf_bytes):
+    """(body, status, cacheable) for one uploaded transcript, parsed under the configured limits.
+
+    `cacheable` is True for results that would come out the same on another attempt:
+    a successful parse, or a CPU/memory limit rejection (not a wall-clock timeout).
+    """
+    timings = []
+    try:
+        if TRANSCRIPT_PARSE_CPU_SECONDS > 0:
+            result = extract_courses_limited(
+                pdf_bytes,
+                cpu_seconds=TRANSCRIPT_PARSE_CPU_SECONDS,
+                wall_seconds=TRANSCRIPT_PARSE_WALL_SECONDS,
+                memory_mb=TRANSCRIPT_PARSE_MEMORY_MB,
+                ocr=TRANSCRIPT_OCR,
+                ocr_workers=TRANSCRIPT_OCR_WORKERS,
+                timings=timings,
+            )
+        else:
+            result = extract_courses_from_transcript(pdf_bytes, workers=TRANSCRIPT_PARSE_WORKERS, ocr=TRANSCRIPT_OCR,
+                                                     ocr_workers=TRANSCRIPT_OCR_WORKERS, timings=timings)
+        ocr_pages = [t for t in timings if t["source"] == "ocr"]
+        print(f"Parsed transcript: {len(timings)} page(s), {len(ocr_pages)} OCR'd; per page: {timings}")
+        return result, 200, True
+    except TranscriptParseLimit as e:
+        print("Transcript parse hit its limit:", str(e))
+        return {"error": "Transcript could not be processed within the time limit"}, 422, not e.retryable
+    except Exception as e:
+        print("Error:", str(e))
+        return {"error": str(e)}, 500, False
+
+
+def read_transcript_upload():
+    """(body, status) for the uploaded "transcript" file, served from transcript_cache when possible."""
     if "transcript" not in request.files:
-        return jsonify({"error": "No file part in request"}), 400
+        return {"error": "No file part in request"}, 400
 
     pdf_file = request.files["transcript"]
     
     if pdf_file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
+        return {"error": "No selected file"}, 400
+
+    pdf_bytes = pdf_file.read(TRANSCRIPT_MAX_BYTES + 1)
+    if len(pdf_bytes) > TRANSCRIPT_MAX_BYTES:
+        return {"error": f"Transcript larger than {TRANSCRIPT_MAX_BYTES // (1024 * 1024)} MB"}, 413
+
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    cached = transcript_cache.get(digest)
+    if cached is not None:
+        body, status = cached
+        return body, status
+
+    body, status, cacheable = parse_transcript_bytes(pdf_bytes)
+    # Cache CPU/memory rejections too, so re-uploading a pathological file doesn't burn
+    # another budget; a wall-clock timeout may just mean the host was busy
+    if cacheable:
+        transcript_cache.set(digest, [body, status])
+    return body, status
+
+
+@app.route("/transcript_parsing", methods=["POST"])
+def transcript_parsing():
+    body, status = read_transcript_upload()
+    return jsonify(body), status
 
-    try:
-        # Pass the file-like object directly
-        result = extract_courses_from_transcript(pdf_file)
-        print(result)
-        return jsonify(result), 200
-    except Exception as e:
-        print("Error:", str(e))
-        return jsonify({"error": str(e)}), 500
+
+@app.route("/transcript_import", methods=["POST"])
+@jwt_required
+def transcript_import(payload=None, user_id=None, user_email=None):
+    """Parse a transcript, resolve every code against the catalog, and optionally save it.
+
+    Multipart upload with a "transcript" file; pass persist=1 (form field or query)
+    to upsert the matched courses into the user's history in the same request.
+    """
+    user_id = payload["sub"]  # trusted Supabase user ID
+    body, status = read_transcript_upload()
+    if status != 200:
+        return jsonify(body), status
+
+    result = enrich_transcript(body, catalog, USER_COURSE_COLUMNS)
+    result["persisted"] = False
+
+    persist = (request.form.get("persist") or request.args.get("persist") or "").lower() in ("1", "true", "yes")
+    if persist and result["semester_courses"]:
+        response = upsert_semester_courses(user_id, result["semester_courses"])
+        if response.status_code not in [200, 201, 204]:
+            print("Supabase error:", response.status_code, response.text)
+            return jsonify({"error": "Failed to write to Supabase", "details": response.text, **result}), 500
+        result["persisted"] = True
+
+    print(f"Transcript import for {user_id}: {result['counts']}, persisted={result['persisted']}")
+    return jsonify(result), 200
 
 # --- Accept Terms endpoint ---
 @app.route("/accept-terms", methods=["POST"])
@@ -599,20 +765,12 @@ def accept_terms(payload=None, user_id=None, user_email=None):
         # Extract user_id from JWT payload (trusted)
         user_id = payload["sub"]
 
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "resolution=merge-duplicates"  # This makes it an upsert
-        }
-
-        upsert_url =  SUPABASE_TABLE_URL
         upsert_payload = {
             "id": user_id,
             "terms_accepted": True
         }
 
-        response = requests.post(upsert_url, headers=headers, json=[upsert_payload])
+        response = db.user_courses.upsert([upsert_payload])
         print(response)
 
         if response.status_code not in [200, 201]:
@@ -636,20 +794,7 @@ def check_terms(payload=None, user_id=None, user_email=None):
         # Extract user_id from JWT payload (trusted)
         user_id = payload["sub"]
 
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "resolution=merge-duplicates"  # This makes it an upsert
-        }
-
-        # Add query parameter to filter by user_id
-        url = f"{SUPABASE_TABLE_URL}?id=eq.{user_id}"
-        payload = {
-            "id": user_id
-        }
-
-        response = requests.get(url, headers=headers)
+        response = db.user_courses.select(id=user_id)
         print(response)
 
         if response.status_code not in [200, 201]:
@@ -681,25 +826,19 @@ def submit_feedback(payload=None, user_id=None, user_email=None):
         TYPE=data.get("TYPE")
         content=data.get("content")
 
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Add query parameter to filter by user_id
-        url = SUPABASE_FEEDBACK_TABLE_URL
         payload = {
             "user_id": user_id,
             "type": TYPE,
             "contents":content, 
         }
 
-        response = requests.post(url, headers=headers, json=payload)
-        print(response)
+        # Queued for a batched insert; if the queue is backed up, write inline instead of dropping
+        if not feedback_log.enqueue(payload):
+            response = db.questions.insert(payload)
+            print(response)
 
-        if not response.ok:
-            return jsonify({"error": response.text}), 500
+            if not response.is_success:
+                return jsonify({"error": response.text}), 500
 
         # No response.json() needed if body is empty
         return jsonify({"message": "Submission saved"}), 201
@@ -709,237 +848,186 @@ def submit_feedback(payload=None, user_id=None, user_email=None):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/add_course", methods=["POST"])
-@jwt_required
-def add_course(payload=None, user_id=None, user_email=None):
-    data = request.json
-
-    user_id = payload["sub"]  # trusted Supabase user ID
-    new_course = data.get("course_to_add")
-    course_semester=data.get("semester")
-    print(new_course)
-    print(course_semester)
-
-    if not user_id or not new_course:
-        return jsonify({"error": "Missing user_id or semester_courses"}), 400
-
-    # First, fetch the existing row (if any)
-    fetch_url = f"{SUPABASE_TABLE_URL_EXTRA}?id=eq.{user_id}"
-
-    # Send upsert to Supabase REST API
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    fetch_response = requests.get(fetch_url, headers=headers)
+# --- Course list edits: one atomic RPC per request (backend/sql/apply_course_ops.sql) ---
+MAX_COURSE_OPS = int(os.getenv("MAX_COURSE_OPS", 200))
+
+def parse_course_ops(raw_ops):
+    """Validate [{"op": "add"|"remove", "semester", "course"}] from a request. Returns (ops, error)."""
+    if not isinstance(raw_ops, list) or not raw_ops:
+        return None, "ops must be a non-empty list"
+    if len(raw_ops) > MAX_COURSE_OPS:
+        return None, f"At most {MAX_COURSE_OPS} ops per request"
+    ops = []
+    for raw in raw_ops:
+        if not isinstance(raw, dict):
+            return None, "Each op must be an object"
+        op, semester, course = raw.get("op"), raw.get("semester"), raw.get("course")
+        if op not in ("add", "remove"):
+            return None, f"Unknown op: {op}"
+        if semester not in USER_COURSE_COLUMNS:
+            return None, f"Unknown semester: {semester}"
+        if not isinstance(course, str) or not course.strip():
+            return None, "Each op needs a course code"
+        ops.append({"op": op, "semester": semester, "course": course})
+    return ops, None
+
+# When the RPC is missing (SQL not applied yet), skip it until this time
+course_ops_rpc_retry_at = 0.0
+course_ops_rpc_lock = threading.Lock()
+
+def apply_course_ops(user_id, ops):
+    """Apply ops to the user's user_courses_test row in order. Returns (row or None, error text or None)."""
+    global course_ops_rpc_retry_at
+    with course_ops_rpc_lock:
+        use_rpc = time.time() >= course_ops_rpc_retry_at
+    if use_rpc:
+        response = db.rpc["apply_course_ops"].call(p_user_id=user_id, p_ops=ops)
+        if response.status_code != 404:
+            user_contexts.invalidate(user_id)
+            if response.status_code != 200:
+                return None, response.text
+            return (response.json() if response.content else None), None
+        print("apply_course_ops RPC not found; apply backend/sql/apply_course_ops.sql. Using read-modify-write.")
+        with course_ops_rpc_lock:
+            course_ops_rpc_retry_at = max(course_ops_rpc_retry_at, time.time() + 300)
+    return apply_course_ops_legacy(user_id, ops)
+
+def apply_course_ops_legacy(user_id, ops):
+    """Read-modify-write fallback (two round trips, not atomic) used until the RPC is deployed."""
+    fetch_response = db.user_courses_test.select(id=user_id)
     if fetch_response.status_code != 200:
-        return jsonify({"error": "Failed to fetch user row", "details": fetch_response.text}), 500
-
+        return None, fetch_response.text
     existing_rows = fetch_response.json()
-    print("existing rows are ",existing_rows)
-
-    if not existing_rows:
-        # Row does not exist, create a blank one with just the ID
-        row_data = {"id": user_id, course_semester: [new_course]}
-        insert_response = requests.post(
-            SUPABASE_TABLE_URL_EXTRA,
-            json=[row_data],
-            headers={**headers, "Prefer": "resolution=merge-duplicates"}
-        )
-        if insert_response.status_code not in [200, 201, 204]:
-            return jsonify({"error": "Failed to create new row", "details": insert_response.text}), 500
+    row = existing_rows[0] if existing_rows else None
+    if row is None and not any(op["op"] == "add" for op in ops):
+        return None, None  # nothing to remove from
+
+    changed = {}
+    for op in ops:
+        semester = op["semester"]
+        if semester not in changed:
+            changed[semester] = list((row or {}).get(semester) or [])
+        current_courses = changed[semester]
+        if op["op"] == "add" and op["course"] not in current_courses:
+            current_courses.append(op["course"])
+        elif op["op"] == "remove" and op["course"] in current_courses:
+            current_courses.remove(op["course"])
+
+    if row is None:
+        response = db.user_courses_test.upsert([{"id": user_id, **changed}])
     else:
-        # Row exists → append the course to the matching semester column
-        existing_row = existing_rows[0]
-        current_courses = existing_row.get(course_semester, []) or []
-        if new_course not in current_courses:
-            current_courses.append(new_course)
-        print("current courses are now ",current_courses)
-
-        update_data = {course_semester: current_courses}
-        update_url = f"{SUPABASE_TABLE_URL_EXTRA}?id=eq.{user_id}"
-        update_response = requests.patch(update_url, json=update_data, headers=headers)
-        print("succesful response")
+        response = db.user_courses_test.update(changed, id=user_id)
+    user_contexts.invalidate(user_id)
+    if response.status_code not in [200, 201, 204]:
+        return None, response.text
+    return {**(row or {"id": user_id}), **changed}, None
 
-        if update_response.status_code not in [200, 201, 204]:
-            return jsonify({"error": "Failed to update existing row", "details": update_response.text}), 500
 
-    return jsonify({"status": "success"}), 200
+@app.route("/add_course", methods=["POST"])
+@jwt_required
+def add_course(payload=None, user_id=None, user_email=None):
+    return single_course_op("add", payload)
 
 
 @app.route("/remove_course", methods=["POST"])
 @jwt_required
 def remove_course(payload=None, user_id=None, user_email=None):
+    return single_course_op("remove", payload)
+
+
+def single_course_op(op, payload):
     data = request.json
 
     user_id = payload["sub"]  # trusted Supabase user ID
-    new_course = data.get("course_to_add")
-    course_semester=data.get("semester")
-    print(new_course)
-    print(course_semester)
+    course = data.get("course_to_add")
+    course_semester = data.get("semester")
 
-    if not user_id or not new_course:
+    if not user_id or not course:
         return jsonify({"error": "Missing user_id or semester_courses"}), 400
 
-    # First, fetch the existing row (if any)
-    fetch_url = f"{SUPABASE_TABLE_URL_EXTRA}?id=eq.{user_id}"
+    ops, error = parse_course_ops([{"op": op, "semester": course_semester, "course": course}])
+    if error:
+        return jsonify({"error": error}), 400
 
-    # Send upsert to Supabase REST API
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+    _, error = apply_course_ops(user_id, ops)
+    if error:
+        return jsonify({"error": "Failed to update courses", "details": error}), 500
 
-    fetch_response = requests.get(fetch_url, headers=headers)
-    if fetch_response.status_code != 200:
-        return jsonify({"error": "Failed to fetch user row", "details": fetch_response.text}), 500
+    return jsonify({"status": "success"}), 200
 
-    existing_rows = fetch_response.json()
 
-    # Row exists → append the course to the matching semester column
-    existing_row = existing_rows[0]
-    current_courses = existing_row.get(course_semester, []) or []
-    if new_course in current_courses:
-        current_courses.remove(new_course)
+@app.route("/course_ops", methods=["POST"])
+@jwt_required
+def course_ops(payload=None, user_id=None, user_email=None):
+    """Apply many adds/removes in one atomic call: {"ops": [{"op", "semester", "course"}, ...]}."""
+    user_id = payload["sub"]
+    data = request.get_json(silent=True) or {}
 
-    update_data = {course_semester: current_courses}
-    update_url = f"{SUPABASE_TABLE_URL_EXTRA}?id=eq.{user_id}"
-    update_response = requests.patch(update_url, json=update_data, headers=headers)
+    ops, error = parse_course_ops(data.get("ops"))
+    if error:
+        return jsonify({"error": error}), 400
 
-    if update_response.status_code not in [200, 201, 204]:
-        return jsonify({"error": "Failed to update existing row", "details": update_response.text}), 500
+    row, error = apply_course_ops(user_id, ops)
+    if error:
+        return jsonify({"error": "Failed to update courses", "details": error}), 500
 
-    return jsonify({"status": "success"}), 200
+    courses = {sem: row[sem] for sem in USER_COURSE_COLUMNS if row and row.get(sem)}
+    return jsonify({"status": "success", "semester_courses": courses}), 200
     
     
-@app.route("/surprise_recommendation", methods=["GET", "POST"])
-@jwt_required
-def surprise_recommendation(payload=None, user_id=None, user_email=None):
-    """Recommend ONE course from the latest semester only, with a surprising but meaningful connection to the user's history."""
-    try:
-        user_id = payload["sub"]
-
-        body = request.get_json(silent=True) or {}
-        client_exclude = body.get("exclude_codes", [])
-        exclude_codes = {str(c).strip().upper() for c in client_exclude if isinstance(c, str)}
-
-        # --- 1. Fetch user context from Supabase ---
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
-        
-        # Course history
-        resp = requests.get(f"{SUPABASE_TABLE_URL}?id=eq.{user_id}", headers=headers)
-        if resp.status_code != 200:
-            return jsonify({"error": "Could not retrieve course history"}), 500
-        user_data = resp.json()
-
-        user_courses = []
-        user_departments = set()
-        if user_data:
-            row = user_data[0]
-            for sem in SEMESTER_COLUMNS:
-                if sem in row and row[sem]:
-                    for code in row[sem]:
-                        code_norm = str(code).strip().upper()
-                        user_courses.append(code_norm)
-                        if "-" in code_norm:
-                            user_departments.add(code_norm.split("-")[0])
-
-        # User interest notes
-        user_note_profile = ""
-        notes_resp = requests.get(f"{SUPABASE_URL}/rest/v1/user_notes?id=eq.{user_id}", headers=headers)
-        if notes_resp.status_code == 200:
-            notes_data = notes_resp.json()
-            if notes_data and "predefined_responses" in notes_data[0]:
-                q1 = "Are there particular skills or knowledge you would like to gain this semester? If so, what are they?"
-                user_note_profile = notes_data[0]["predefined_responses"].get(q1, "").strip()
-
-        if not user_courses and not user_note_profile:
-            return jsonify({"error": "No course history or interest notes found. Please add courses or fill out your 'Academic Notes' first."}), 400
+# --- Surprise LLM step: shared by the inline path and background jobs ---
+SURPRISE_DEFAULT_MODE = os.getenv("SURPRISE_DEFAULT_MODE", "sync")  # sync | job | stream
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 30))
+# Concurrent chat-model calls per process, independent of web workers/threads
+llm_slots = ConcurrencyLimit(int(os.getenv("LLM_MAX_CONCURRENCY", 4)))
+# Job status/results go to a store every worker can read, so a poll may land on any worker.
+# It is opened on the first job or poll (?mode=job|stream), never in sync-only deployments.
+SURPRISE_JOB_TTL = int(os.getenv("SURPRISE_JOB_TTL", 600))
+surprise_jobs = JobQueue(
+    max_workers=int(os.getenv("SURPRISE_JOB_WORKERS", 4)),
+    max_pending=int(os.getenv("SURPRISE_JOB_MAX_PENDING", 64)),
+    ttl=SURPRISE_JOB_TTL,
+    name="surprise-job",
+    store=lambda: create_job_store(
+        os.getenv("JOB_STORE_BACKEND", "sqlite"),
+        ttl=SURPRISE_JOB_TTL,
+        sqlite_path=os.getenv("JOB_STORE_SQLITE_PATH", "./data/jobs.sqlite3"),
+        redis_url=os.getenv("JOB_STORE_REDIS_URL"),
+    ),
+)
+# Parsed (index, connection) picks keyed by a hash of the user and the full prompt (profile + shortlist)
+llm_selection_cache = LRUTTLCache(
+    maxsize=int(os.getenv("LLM_SELECTION_CACHE_SIZE", 2048)),
+    ttl=int(os.getenv("LLM_SELECTION_CACHE_TTL", 3600)),
+)
+CHAT_URL = (
+    f"{(AZURE_CHATOPENAI_ENDPOINT or '').rstrip('/')}/openai/deployments/{AZURE_CHATOPENAI_DEPLOYMENT}"
+    f"/chat/completions?api-version={CHATOPENAI_API_VERSION}"
+)
 
-        # --- 2. Build User Profile and Get Embedding ---
-        # We build a descriptive text summary of who the student is
-        profile_parts = []
-        if user_note_profile:
-            profile_parts.append(f"Student's stated interests: {user_note_profile}")
-        
-        # Add a few course titles from history to give context (to avoid massive profile text)
-        if user_courses:
-            # We used to iterate amherst_data for this, but to save memory we can just 
-            # query Qdrant by ID or just use the codes. 
-            # For simplicity in 'surprise', we'll just use the codes for now, or fetch titles if we want better results.
-            profile_parts.append(f"Student has previously taken these courses: {', '.join(user_courses[:30])}")
-
-        profile_text = "\n".join(profile_parts)
-        
-        # Generate the query vector
-        try:
-            profile_vector = get_openai_embedding(profile_text).flatten().tolist()
-        except Exception as e:
-            print(f"Embedding error in surprise: {e}")
-            return jsonify({"error": "Failed to generate user interest profile"}), 500
 
-        # --- 3. Query Qdrant for semantic candidates in the latest semester ---
-        present_terms = {c.get("semester") for c in amherst_data if c.get("semester")}
-        latest_semester = next((s for s in reversed(SEMESTER_COLUMNS) if s in present_terms), None)
-        if not latest_semester:
-            return jsonify({"error": "No semesters available in catalog"}), 500
+def post_chat_completion(prompt):
+    """POST to the chat deployment over the shared keep-alive pool (no per-call TLS handshake)."""
+    return upstream.run(upstream.client.post(CHAT_URL, json={
+        "messages": [
+            {"role": "system", "content": "You are a helpful academic advisor who finds surprising interdisciplinary connections between courses. Always respond with valid JSON only."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_completion_tokens": 2000,
+        "response_format": {"type": "json_object"},
+    }, headers={"api-key": AZURE_CHATOPENAI_API_KEY, "Content-Type": "application/json"}, timeout=120))
 
-        # We fetch top 150 from latest semester to provide enough room for post-filtering "surprises"
-        search_result = qdrant.search(
-            collection_name="amherst_courses",
-            query_vector=profile_vector,
-            query_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="semester",
-                        match=models.MatchValue(value=latest_semester)
-                    )
-                ]
-            ),
-            limit=150
-        )
 
-        # --- 4. Post-filter for "Surprise" elements in candidate pool ---
-        shortlist = []
-        for point in search_result:
-            payload = point.payload
-            course_codes = payload.get("course_codes", [])
-            norm_codes = [str(c).strip().upper() for c in course_codes]
-            
-            # Skip if taken or excluded
-            if any(c in user_courses for c in norm_codes): continue
-            if any(c in exclude_codes for c in norm_codes): continue
-            
-            # Surprise factor: department check
-            course_depts = {c.split("-")[0] for c in norm_codes if "-" in c}
-            if course_depts & user_departments:
-                continue # Skip if in a department they've already explored
-            
-            shortlist.append(payload)
-            if len(shortlist) >= 30: # Balanced shortlist for reliability and variety
-                break
-
-        if not shortlist:
-            return jsonify({
-                "error": f"No unseen surprising courses found in {latest_semester} that match your profile. Try adding more courses or interests!"
-            }), 400
-
-        # --- 5. Final LLM Selection (Reverting to original prompt/logic) ---
-        user_courses_str = ", ".join(user_courses[:40])
-        
-        notes_context = ""
-        if user_note_profile:
-            notes_context = f"\nThe student has also expressed these academic interests: \"{user_note_profile}\""
+def complete_surprise(user_id, shortlist, user_courses, user_note_profile, latest_semester):
+    """Pick one shortlisted course with the chat model and log it. Returns (body, http_status)."""
+    # --- 5. Final LLM Selection (Reverting to original prompt/logic) ---
+    user_courses_str = ", ".join(user_courses[:40])
+    
+    notes_context = ""
+    if user_note_profile:
+        notes_context = f"\nThe student has also expressed these academic interests: \"{user_note_profile}\""
 
-        prompt = f"""
+    prompt = f"""
 You are a course recommendation system.
 A student has taken these courses: {user_courses_str if user_courses else "None (First-year student)"}
 {notes_context}
@@ -951,13 +1039,13 @@ Explain the connection briefly and concretely, referencing their notes or past c
 Candidate courses (select ONE):
 """.strip()
 
-        for i, course in enumerate(shortlist, start=1):
-            codes = "/".join(course.get("course_codes", []))
-            title = course.get("course_title", "") or ""
-            description = (course.get("description", "") or "")[:300]
-            prompt += f"\n{i}. {codes} - {title}: {description}"
+    for i, course in enumerate(shortlist, start=1):
+        codes = "/".join(course.get("course_codes", []))
+        title = course.get("course_title", "") or ""
+        description = (course.get("description", "") or "")[:300]
+        prompt += f"\n{i}. {codes} - {title}: {description}"
 
-        prompt += """
+    prompt += """
         
 Respond with ONLY this JSON:
 {
@@ -966,73 +1054,215 @@ Respond with ONLY this JSON:
 }
 """.rstrip()
 
+    # Same user, history, notes and shortlist -> same prompt -> reuse their earlier pick
+    selection_key = hashlib.sha256(
+        f"{AZURE_CHATOPENAI_DEPLOYMENT}\n{user_id}\n{prompt}".encode("utf-8")
+    ).hexdigest()
+    selection = llm_selection_cache.get(selection_key)
+    if selection is not None:
+        rec_idx, surprise_connection = selection
+    else:
         # --- call chat model via direct HTTP (SDK was returning empty for gpt-5-mini) ---
-        import httpx
-        chat_url = f"{AZURE_CHATOPENAI_ENDPOINT.rstrip('/')}/openai/deployments/{AZURE_CHATOPENAI_DEPLOYMENT}/chat/completions?api-version={CHATOPENAI_API_VERSION}"
-        chat_resp = httpx.post(chat_url, json={
-            "messages": [
-                {"role": "system", "content": "You are a helpful academic advisor who finds surprising interdisciplinary connections between courses. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt},
-            ],
-            "max_completion_tokens": 2000,
-            "response_format": {"type": "json_object"},
-        }, headers={"api-key": AZURE_CHATOPENAI_API_KEY, "Content-Type": "application/json"}, timeout=120)
-        
+        if not llm_slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            return {"error": "Recommendation service is busy, please retry shortly"}, 503
+        try:
+            chat_resp = post_chat_completion(prompt)
+        finally:
+            llm_slots.release()
+
         if chat_resp.status_code != 200:
             import sys
             print(f"Chat API error {chat_resp.status_code}: {chat_resp.text[:1000]}", file=sys.stderr, flush=True)
             raise Exception(f"Chat API returned {chat_resp.status_code}: {chat_resp.text[:500]}")
-            
+
         llm_json = chat_resp.json()["choices"][0]["message"].get("content", "{}")
         print(f"DEBUG: LLM Response content: {llm_json!r}")
-        
+
         try:
-            import json
             llm_data = json.loads(llm_json)
             rec_idx = int(llm_data.get("recommended_course_index", 1)) - 1
             if rec_idx < 0 or rec_idx >= len(shortlist): rec_idx = 0
             surprise_connection = llm_data.get("surprise_connection", "This course offers a new perspective outside your usual fields.")
+            # Only well-formed answers are cached; fallbacks retry the model next time
+            llm_selection_cache.set(selection_key, (rec_idx, surprise_connection))
         except Exception as json_err:
             print(f"Error parsing LLM response: {json_err}. Fallback to first course.")
             rec_idx = 0
             surprise_connection = "This course connects to your interests in an interdisciplinary way."
-        
-        recommended_course = shortlist[rec_idx]
-        
-        recommendation = {
-            "course_codes": recommended_course.get("course_codes", []),
-            "course_title": recommended_course.get("course_title", ""),
-            "description": recommended_course.get("description", ""),
-            "department": recommended_course.get("department", ""),
-            "semester": latest_semester,
-            "surprise_connection": surprise_connection
-        }
+    
+    recommended_course = shortlist[rec_idx]
+    
+    recommendation = {
+        "course_codes": recommended_course.get("course_codes", []),
+        "course_title": recommended_course.get("course_title", ""),
+        "description": recommended_course.get("description", ""),
+        "department": recommended_course.get("department", ""),
+        "semester": latest_semester,
+        "surprise_connection": surprise_connection
+    }
 
-        # --- 6. Log to Supabase surprise_history ---
-        try:
-            # Get next index
-            idx_resp = requests.get(f"{SUPABASE_SURPRISE_TABLE_URL}?user_id=eq.{user_id}&select=insight_index&order=insight_index.desc&limit=1", headers=headers)
-            new_index = (idx_resp.json()[0].get("insight_index", 0) + 1) if idx_resp.status_code == 200 and idx_resp.json() else 1
-            
-            log_payload = {
-                "user_id": user_id,
-                "course_codes": recommendation["course_codes"],
-                "course_title": recommendation["course_title"],
-                "semester": recommendation["semester"],
-                "surprise_connection": recommendation["surprise_connection"],
-                "insight_index": new_index
-            }
-            requests.post(SUPABASE_SURPRISE_TABLE_URL, headers=headers, json=log_payload)
-        except Exception as log_err:
-            print(f"Error logging surprise: {log_err}")
+    # --- 6. Log to Supabase surprise_history (write-behind; the writer assigns insight_index) ---
+    log_payload = {
+        "user_id": user_id,
+        "course_codes": recommendation["course_codes"],
+        "course_title": recommendation["course_title"],
+        "semester": recommendation["semester"],
+        "surprise_connection": recommendation["surprise_connection"],
+    }
+    if not surprise_log.enqueue(log_payload):
+        print("Error logging surprise: surprise_history queue is full, row dropped")
+
+    return recommendation, 200
+
+
+def sse_job_events(job_id, owner, heartbeat=15):
+    """Server-sent events for one job: "queued", keep-alive comments, then "result"."""
+    yield f"event: queued\ndata: {json.dumps({'job_id': job_id})}\n\n"
+    while not surprise_jobs.wait(job_id, heartbeat):
+        yield ": keep-alive\n\n"
+    info = surprise_jobs.get(job_id, owner=owner) or {"job_id": job_id, "status": "expired"}
+    yield f"event: result\ndata: {json.dumps(info)}\n\n"
+
+
+@app.route("/surprise_recommendation", methods=["GET", "POST"])
+@jwt_required
+def surprise_recommendation(payload=None, user_id=None, user_email=None):
+    """Recommend ONE course from the latest semester only, with a surprising but meaningful connection to the user's history."""
+    try:
+        user_id = payload["sub"]
+
+        body = request.get_json(silent=True) or {}
+        client_exclude = body.get("exclude_codes", [])
+        exclude_codes = {str(c).strip().upper() for c in client_exclude if isinstance(c, str)}
+
+        # --- 1. Fetch user context from Supabase (cached until the user writes) ---
+        context = user_contexts.get(user_id)
+        fetched = context is None
+        if fetched:
+            ticket = user_contexts.begin(user_id)
+            # Course history and interest notes, fetched concurrently
+            resp, notes_resp = upstream.gather(
+                db.user_courses.aselect(id=user_id),
+                db.user_notes.aselect(id=user_id),
+            )
+            if resp.status_code != 200:
+                return jsonify({"error": "Could not retrieve course history"}), 500
+            user_data = resp.json()
+            notes_data = notes_resp.json() if notes_resp.status_code == 200 else []
+            context = build_user_context(
+                user_data[0] if user_data else None,
+                notes_data[0] if notes_data else None,
+                USER_COURSE_COLUMNS,
+            )
+
+        user_courses = context.courses
+        user_departments = context.departments
+        user_note_profile = context.note_profile
 
-        return jsonify(recommendation), 200
+        if context.is_empty:
+            if fetched:
+                user_contexts.set_if_current(user_id, ticket, context)
+            return jsonify({"error": "No course history or interest notes found. Please add courses or fill out your 'Academic Notes' first."}), 400
+
+        # --- 2. Embed the user profile (history + stated interests) ---
+        if context.profile_vector is None:
+            try:
+                context.profile_vector = get_openai_embedding(context.profile_text).flatten().tolist()
+            except Exception as e:
+                print(f"Embedding error in surprise: {e}")
+                return jsonify({"error": "Failed to generate user interest profile"}), 500
+        profile_vector = context.profile_vector
+        if fetched:
+            user_contexts.set_if_current(user_id, ticket, context)
+
+        # --- 3. Query the vector index for semantic candidates in the latest semester ---
+        latest_semester = next(iter(catalog.latest_semesters(1)), None)
+        if not latest_semester:
+            return jsonify({"error": "No semesters available in catalog"}), 500
+
+        if not search_backend:
+            return jsonify({"error": f"Search backend ({SEARCH_BACKEND}) is not available"}), 500
+
+        skip_codes = set(user_courses) | exclude_codes
+        if department_centroids is not None and latest_semester in department_centroids:
+            # In-process: close to their interests, far from the departments they know
+            search_result = department_centroids.rank(
+                profile_vector,
+                latest_semester,
+                user_departments=user_departments,
+                skip_codes=skip_codes,
+                limit=SURPRISE_SHORTLIST_SIZE,
+                novelty_weight=SURPRISE_NOVELTY_WEIGHT,
+            )
+        else:
+            # Taken/excluded codes and explored departments are filtered inside the vector
+            # query, so only about a shortlist's worth of candidates needs to come back
+            search_result = search_backend.search(
+                profile_vector,
+                semester=latest_semester,
+                limit=SURPRISE_SHORTLIST_SIZE,
+                exclude_codes=skip_codes,
+                exclude_departments=user_departments,
+            )
+
+        # --- 4. Post-filter for "Surprise" elements in candidate pool ---
+        shortlist = surprise_shortlist(search_result, skip_codes, user_departments)
+        if len(shortlist) < len(search_result):
+            # Filters weren't applied (collection ingested before the departments payload): over-fetch
+            search_result = search_backend.search(profile_vector, semester=latest_semester, limit=SURPRISE_FALLBACK_FETCH)
+            shortlist = surprise_shortlist(search_result, skip_codes, user_departments)
+
+        if not shortlist:
+            return jsonify({
+                "error": f"No unseen surprising courses found in {latest_semester} that match your profile. Try adding more courses or interests!"
+            }), 400
+
+        args = (user_id, shortlist, user_courses, user_note_profile, latest_semester)
+        mode = request.args.get("mode") or body.get("mode") or SURPRISE_DEFAULT_MODE
+        if mode in ("job", "stream"):
+            # Hand the LLM call to the background pool so this worker is free immediately
+            try:
+                job = surprise_jobs.submit(complete_surprise, *args, owner=user_id)
+            except QueueFull:
+                return jsonify({"error": "Too many recommendations in progress, please retry shortly"}), 503, {"Retry-After": "5"}
+            if mode == "stream":
+                return Response(sse_job_events(job.id, user_id), mimetype="text/event-stream",
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            return jsonify({
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": url_for("surprise_job_status", job_id=job.id),
+                "stream_url": url_for("surprise_job_stream", job_id=job.id),
+            }), 202
+
+        result, status = complete_surprise(*args)
+        return jsonify(result), status
 
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
+@app.route("/surprise_recommendation/jobs/<job_id>", methods=["GET"])
+@jwt_required
+def surprise_job_status(job_id, payload=None, user_id=None, user_email=None):
+    """Status of a queued surprise; includes the recommendation (or error) once finished."""
+    info = surprise_jobs.get(job_id, owner=payload["sub"])
+    if info is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(info), 200
+
+
+@app.route("/surprise_recommendation/jobs/<job_id>/stream", methods=["GET"])
+@jwt_required
+def surprise_job_stream(job_id, payload=None, user_id=None, user_email=None):
+    """Server-sent events that deliver a queued surprise's result as soon as it is ready."""
+    if surprise_jobs.get(job_id, owner=payload["sub"]) is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return Response(sse_job_events(job_id, payload["sub"]), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/save_user_info", methods=["POST"])
 @jwt_required
 def save_user_info(payload=None, user_id=None, user_email=None):
@@ -1054,21 +1284,13 @@ def save_user_info(payload=None, user_id=None, user_email=None):
         else:  # May
             formatted_class_year = str(class_year)
         
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "resolution=merge-duplicates"
-        }
-        
-        upsert_url = SUPABASE_TABLE_URL
         upsert_payload = {
             "id": user_id,
             "class_year": formatted_class_year,
             "major": majors
         }
         
-        response = requests.post(upsert_url, headers=headers, json=[upsert_payload])
+        response = db.user_courses.upsert([upsert_payload])
         
         if response.status_code not in [200, 201]:
             print("Supabase error:", response.text)
@@ -1088,14 +1310,7 @@ def check_user_info(payload=None, user_id=None, user_email=None):
     try:
         user_id = payload["sub"]
         
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        url = f"{SUPABASE_TABLE_URL}?id=eq.{user_id}"
-        response = requests.get(url, headers=headers)
+        response = db.user_courses.select(id=user_id)
         
         if response.status_code not in [200, 201]:
             print("Supabase error:", response.text)
@@ -1130,14 +1345,7 @@ def check_user_info(payload=None, user_id=None, user_email=None):
 def get_user_notes(payload=None, user_id=None, user_email=None):
     try:
         user_id = payload["sub"]
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        url = f"{SUPABASE_NOTES_TABLE_URL}?id=eq.{user_id}"
-        response = requests.get(url, headers=headers)
+        response = db.user_notes.select(id=user_id)
         
         if response.status_code == 200:
             data = response.json()
@@ -1158,13 +1366,6 @@ def save_user_notes(payload=None, user_id=None, user_email=None):
         user_id = payload["sub"]
         data = request.get_json()
         
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "resolution=merge-duplicates"
-        }
-        
         upsert_payload = {
             "id": user_id,
             "predefined_responses": data.get("predefined_responses", {}),
@@ -1173,7 +1374,8 @@ def save_user_notes(payload=None, user_id=None, user_email=None):
             "updated_at": datetime.now().isoformat()
         }
         
-        response = requests.post(SUPABASE_NOTES_TABLE_URL, headers=headers, json=[upsert_payload])
+        response = db.user_notes.upsert([upsert_payload])
+        user_contexts.invalidate(user_id)
         
         if response.status_code in [200, 201, 204]:
             return jsonify({"status": "success"}), 200
@@ -1275,6 +1477,25 @@ def health_check():
         "timestamp": datetime.now().isoformat(),
         "service": "course-finder-backend"
     })
+
+
+@app.route('/metrics')
+def metrics():
+    """In-process cache and latency counters for this worker."""
+    return jsonify({
+        "embedding_cache": embedding_cache.stats(),
+        "search_result_cache": search_result_cache.stats(),
+        "supabase": db.stats(),
+        "user_contexts": user_contexts.stats(),
+        "surprise_jobs": surprise_jobs.stats(),
+        "llm_slots": llm_slots.stats(),
+        "llm_selection_cache": llm_selection_cache.stats(),
+        "surprise_log": surprise_log.stats(),
+        "feedback_log": feedback_log.stats(),
+        "transcript_cache": transcript_cache.stats(),
+        "rate_limit": validator.rate_limiter.stats(),
+        "jwt_cache": jwt_cache.stats(),
+    })
     
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+from bisect import bisect_left
+from collections.abc import Mapping
+from datetime import datetime
+from functools import lru_cache
+
+# =====================================================
+# Precomputed meeting-time index for conflict checks
+# =====================================================
+
+TIME_FORMAT = "%I:%M %p"
+
+
+@lru_cache(maxsize=4096)
+def parse_minutes_range(time_str):
+    """Parse "10:00 AM - 11:20 AM" into (start_minute, end_minute), or None if malformed.
+
+    Accepts exactly what the old parser (benchmark_conflicts.parse_time_range) accepts;
+    the catalog reuses a small set of time strings, so each one is only run through
+    strptime once.
+    """
+    try:
+        start_str, end_str = time_str.split(" - ")
+        start = datetime.strptime(start_str, TIME_FORMAT)
+        end = datetime.strptime(end_str, TIME_FORMAT)
+    except Exception:
+        return None
+    return (start.hour * 60 + start.minute, end.hour * 60 + end.minute)
+
+
+def iter_meeting_intervals(course):
+    """Yield (day, start_minute, end_minute) for every parseable meeting of a catalog course."""
+    times_and_locations = course.get("times_and_locations", {})
+    if not isinstance(times_and_locations, dict):
+        return
+    for course_section in times_and_locations.values():
+        if not isinstance(course_section, dict):
+            continue
+        for section_meetings in course_section.values():
+            if not isinstance(section_meetings, list):
+                continue
+            for meeting in section_meetings:
+                if isinstance(meeting, dict) and isinstance(meeting.get("time"), str):
+                    parsed = parse_minutes_range(meeting["time"])
+                    if parsed:
+                        yield (meeting.get("day", ""), *parsed)
+
+
+class BusySchedule:
+    """Per-day sorted, non-overlapping intervals for a set of taken courses."""
+
+    def __init__(self, intervals):
+        by_day = {}
+        for day, start, end in intervals:
+            by_day.setdefault(day, []).append((start, end))
+
+        self.starts = {}
+        self.ends = {}
+        for day, day_intervals in by_day.items():
+            merged = []
+            for start, end in sorted(day_intervals):
+                # Only merge strictly overlapping intervals so back-to-back
+                # meetings keep the same "touching is not a conflict" semantics.
+                if merged and start < merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[day] = [s for s, _ in merged]
+            self.ends[day] = [e for _, e in merged]
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def conflicts_with(self, intervals):
+        """True if any (day, start, end) interval overlaps a busy interval on the same day."""
+        for day, start, end in intervals:
+            starts = self.starts.get(day)
+            if not starts:
+                continue
+            # Intervals are disjoint and sorted, so the last one starting before
+            # `end` also has the largest end among all candidates.
+            i = bisect_left(starts, end) - 1
+            if i >= 0 and self.ends[day][i] > start:
+                return True
+        return False
+
+
+class SemesterSchedule:
+    """Meeting intervals for one semester, keyed by course code."""
+
+    def __init__(self, semester):
+        self.semester = semester
+        self.course_count = 0
+        self.codes = set()
+        self.meetings = {}  # code -> tuple of (day, start_minute, end_minute)
+        self.entries = []   # coords entries (list of codes) in map order
+
+    def add_course(self, course):
+        self.course_count += 1
+        intervals = tuple(iter_meeting_intervals(course))
+        for code in course.get("course_codes", []):
+            self.codes.add(code)
+            if intervals:
+                self.meetings[code] = self.meetings.get(code, ()) + intervals
+
+    def intervals_for(self, codes):
+        intervals = []
+        for code in codes:
+            intervals.extend(self.meetings.get(code, ()))
+        return intervals
+
+    def busy_schedule(self, codes):
+        return BusySchedule(self.intervals_for(codes))
+
+    def conflicted_codes(self, taken_codes):
+        """Codes of map entries that overlap the taken courses, in map order."""
+        taken = set(taken_codes)
+        busy = self.busy_schedule(taken)
+        conflicted = []
+        if not busy:
+            return conflicted
+
+        for codes in self.entries:
+            if any(code in taken for code in codes):
+                continue  # don't include the user's own courses
+            course_times = self.intervals_for(codes)
+            if course_times and busy.conflicts_with(course_times):
+                conflicted.extend(codes)
+        return conflicted
+
+
+def build_schedule_index(courses, coords):
+    """Build {semester: SemesterSchedule} from catalog courses and t-SNE coordinate entries.
+
+    Takes the parsed JSON lists or their CourseStore / CoordStore equivalents.
+    """
+    index = {}
+    for course in courses:
+        semester = course.get("semester")
+        if not semester:
+            continue
+        if semester not in index:
+            index[semester] = SemesterSchedule(semester)
+        index[semester].add_course(course)
+
+    for entry in coords:
+        if not isinstance(entry, Mapping):
+            continue
+        semester = entry.get("semester")
+        if semester not in index:
+            index[semester] = SemesterSchedule(semester)
+        index[semester].entries.append(entry.get("codes", []))
+
+    return index
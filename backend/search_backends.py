@@ -0,0 +1,337 @@
+import glob
+import json
+import os
+import re
+import time
+import uuid
+
+import numpy as np
+
+# =====================================================
+# Pluggable vector search over the course catalog
+# =====================================================
+
+COLLECTION_NAME = "amherst_courses"
+# Tiny side collection holding the catalog version stamp written by upload_to_qdrant.py
+META_COLLECTION_NAME = "amherst_courses_meta"
+META_POINT_ID = 1
+EMBEDDING_FILE_PATTERN = re.compile(r"output_embeddings_(\w+)\.json$")
+
+# Bookkeeping fields written at ingest that should not leak into API responses
+INTERNAL_PAYLOAD_FIELDS = ["content_hash", "title_key", "departments"]
+
+# Over-fetch used when a backend cannot group server-side
+LEGACY_GROUP_FETCH = 100
+
+
+def title_key(course):
+    """Normalized title used to collapse cross-listings and repeat offerings into one result."""
+    return (course.get("course_title") or "").strip().lower()
+
+
+def course_departments(course):
+    """Department prefixes of every listing, e.g. ["COSC", "MATH"] for COSC-211/MATH-211."""
+    return sorted({
+        code.split("-")[0] for code in (str(c).strip().upper() for c in course.get("course_codes") or []) if "-" in code
+    })
+
+
+def course_point_id(course, semester):
+    """Deterministic point ID shared by Qdrant ingestion and the local engine."""
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{course.get('course_title', '')}_{semester}"))
+
+
+class SearchHit:
+    """One scored course, shaped like Qdrant's ScoredPoint (id, score, payload)."""
+
+    __slots__ = ("id", "score", "payload")
+
+    def __init__(self, id, score, payload):
+        self.id = id
+        self.score = score
+        self.payload = payload
+
+
+class SearchBackend:
+    """Interface: nearest courses to a query vector, optionally within one semester."""
+
+    name = "base"
+
+    def search(self, vector, semester=None, limit=10, exclude_codes=None, exclude_departments=None):
+        """Top `limit` hits, skipping any course listed under an excluded code or department."""
+        raise NotImplementedError
+
+    def search_grouped(self, vector, semester=None, limit=5):
+        """Best hit for each of the top `limit` distinct course titles (empty titles skipped).
+
+        Default: over-fetch and deduplicate client-side. Backends override this to
+        group inside the search itself.
+        """
+        seen_titles = set()
+        hits = []
+        for hit in self.search(vector, semester=semester, limit=LEGACY_GROUP_FETCH):
+            title = title_key(hit.payload)
+            if title and title not in seen_titles:
+                seen_titles.add(title)
+                hits.append(hit)
+                if len(hits) >= limit:
+                    break
+        return hits
+
+    def catalog_version(self):
+        """Opaque stamp that changes whenever the indexed catalog changes."""
+        raise NotImplementedError
+
+
+class QdrantSearchBackend(SearchBackend):
+    """Remote search against the Qdrant collection built by upload_to_qdrant.py."""
+
+    name = "qdrant"
+
+    def __init__(self, client, collection_name=COLLECTION_NAME, version_poll_seconds=60):
+        self.client = client
+        self.collection_name = collection_name
+        self.version_poll_seconds = version_poll_seconds
+        self._version = None
+        self._version_checked_at = 0.0
+
+    def catalog_version(self):
+        # Polled rather than read per request so cache hits stay free of network calls
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at >= self.version_poll_seconds:
+            self._version_checked_at = now
+            try:
+                points = self.client.retrieve(META_COLLECTION_NAME, ids=[META_POINT_ID], with_payload=True)
+                self._version = points[0].payload.get("version") if points else "unversioned"
+            except Exception as e:
+                print(f"Could not read catalog version: {e}")
+                self._version = self._version or "unversioned"
+        return self._version
+
+    def _semester_filter(self, semester):
+        from qdrant_client.http import models
+
+        if not semester:
+            return None
+        return models.Filter(
+            must=[models.FieldCondition(key="semester", match=models.MatchValue(value=semester))]
+        )
+
+    def _exclusion_filter(self, semester, exclude_codes, exclude_departments):
+        """Semester filter plus must_not on the indexed course_codes / departments payloads."""
+        from qdrant_client.http import models
+
+        must_not = []
+        if exclude_codes:
+            must_not.append(models.FieldCondition(key="course_codes", match=models.MatchAny(any=sorted(exclude_codes))))
+        if exclude_departments:
+            must_not.append(models.FieldCondition(key="departments", match=models.MatchAny(any=sorted(exclude_departments))))
+        query_filter = self._semester_filter(semester)
+        if must_not:
+            query_filter = query_filter or models.Filter()
+            query_filter.must_not = must_not
+        return query_filter
+
+    def search(self, vector, semester=None, limit=10, exclude_codes=None, exclude_departments=None):
+        from qdrant_client.http import models
+
+        query_filter = self._exclusion_filter(semester, exclude_codes, exclude_departments)
+        points = self.client.search(
+            collection_name=self.collection_name,
+            query_vector=np.asarray(vector, dtype=np.float32).reshape(-1).tolist(),
+            query_filter=query_filter,
+            limit=limit,
+            with_payload=models.PayloadSelectorExclude(exclude=INTERNAL_PAYLOAD_FIELDS),
+        )
+        return [SearchHit(p.id, p.score, p.payload) for p in points]
+
+    def search_grouped(self, vector, semester=None, limit=5):
+        from qdrant_client.http import models
+
+        query_filter = self._semester_filter(semester) or models.Filter()
+        query_filter.must_not = [models.FieldCondition(key="title_key", match=models.MatchValue(value=""))]
+
+        result = self.client.search_groups(
+            collection_name=self.collection_name,
+            query_vector=np.asarray(vector, dtype=np.float32).reshape(-1).tolist(),
+            group_by="title_key",
+            query_filter=query_filter,
+            limit=limit,
+            group_size=1,
+            with_payload=models.PayloadSelectorExclude(exclude=INTERNAL_PAYLOAD_FIELDS),
+        )
+        if not result.groups:
+            # Collection ingested before title_key existed: fall back to client-side dedup
+            return super().search_grouped(vector, semester=semester, limit=limit)
+        return [SearchHit(g.hits[0].id, g.hits[0].score, g.hits[0].payload) for g in result.groups]
+
+
+class LocalSearchBackend(SearchBackend):
+    """In-process cosine search over a contiguous, row-normalized embedding matrix.
+
+    Rows are grouped by semester so a semester filter is a slice, not a mask.
+    """
+
+    name = "local"
+
+    def __init__(self, matrix, payloads, ids, semester_ranges, version=None):
+        self.matrix = matrix                    # (n, d), rows L2-normalized
+        self.payloads = payloads                # row -> payload dict (no embedding)
+        self.ids = ids                          # row -> point id
+        self.semester_ranges = semester_ranges  # semester -> (start, stop)
+        self.version = version or f"local-{len(payloads)}-{int(time.time())}"
+
+        # Integer title group per row (-1 = no title) so grouping never touches dicts
+        groups = {}
+        self.title_groups = np.array(
+            [groups.setdefault(key, len(groups)) if key else -1 for key in map(title_key, payloads)],
+            dtype=np.int32,
+        )
+
+        # Inverted lists for exclusion filters: code / department -> rows
+        self.rows_by_code = {}
+        self.rows_by_department = {}
+        for row, payload in enumerate(payloads):
+            for code in payload.get("course_codes") or []:
+                self.rows_by_code.setdefault(str(code).strip().upper(), []).append(row)
+            for department in course_departments(payload):
+                self.rows_by_department.setdefault(department, []).append(row)
+
+    @classmethod
+    def from_embedding_files(cls, pattern, semester_order=None, dtype=np.float32):
+        """Load output_embeddings_<semester>.json files (same inputs as upload_to_qdrant.py)."""
+        files = {}
+        for path in glob.glob(pattern):
+            match = EMBEDDING_FILE_PATTERN.search(os.path.basename(path))
+            if match:
+                files[match.group(1)] = path
+
+        order = [s for s in (semester_order or []) if s in files]
+        order += sorted(s for s in files if s not in order)
+
+        vectors, payloads, ids, semester_ranges = [], [], [], {}
+        for sem in order:
+            with open(files[sem], "r", encoding="utf-8") as f:
+                file_data = json.load(f)
+
+            start = len(payloads)
+            for course in file_data:
+                embedding = course.pop("embedding", None)
+                if embedding is None:
+                    continue
+                course["semester"] = sem
+                vectors.append(np.asarray(embedding, dtype=np.float32))
+                payloads.append(course)
+                ids.append(course_point_id(course, sem))
+            if len(payloads) > start:
+                semester_ranges[sem] = (start, len(payloads))
+
+        if vectors:
+            matrix = np.vstack(vectors)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        print(f"Loaded {len(payloads)} course vectors for local search across {len(semester_ranges)} semesters")
+        return cls(np.ascontiguousarray(matrix, dtype=dtype), payloads, ids, semester_ranges)
+
+    @classmethod
+    def from_store(cls, store):
+        """Search directly over an EmbeddingStore's memory-mapped matrix (rows already normalized)."""
+        print(f"Mapped {len(store)} course vectors ({store.vectors.dtype}) from {store.path}")
+        return cls(store.vectors, store.payloads, store.ids, store.semester_ranges, version=store.version)
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def catalog_version(self):
+        # The matrix is loaded once per process, so the version is fixed until restart
+        return self.version
+
+    def _scores(self, vector, start, stop):
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        rows = self.matrix[start:stop]
+        return (rows @ query.astype(rows.dtype, copy=False)).astype(np.float32, copy=False)
+
+    def _range(self, semester):
+        if semester:
+            return self.semester_ranges.get(semester, (0, 0))
+        return (0, len(self.payloads))
+
+    def _excluded_rows(self, start, stop, exclude_codes, exclude_departments):
+        """Row offsets within [start, stop) matching any excluded code or department."""
+        rows = []
+        for code in exclude_codes or ():
+            rows.extend(self.rows_by_code.get(code, ()))
+        for department in exclude_departments or ():
+            rows.extend(self.rows_by_department.get(department, ()))
+        rows = np.asarray(rows, dtype=np.int64)
+        return rows[(rows >= start) & (rows < stop)] - start
+
+    def search(self, vector, semester=None, limit=10, exclude_codes=None, exclude_departments=None):
+        start, stop = self._range(semester)
+        if stop <= start or limit <= 0:
+            return []
+
+        scores = self._scores(vector, start, stop)
+        excluded = self._excluded_rows(start, stop, exclude_codes, exclude_departments)
+        if excluded.size:
+            scores[excluded] = -np.inf
+        k = min(limit, scores.shape[0] - np.unique(excluded).size)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            SearchHit(self.ids[start + i], float(scores[i]), dict(self.payloads[start + i]))
+            for i in top
+        ]
+
+    def search_grouped(self, vector, semester=None, limit=5):
+        start, stop = self._range(semester)
+        if stop <= start or limit <= 0:
+            return []
+
+        scores = self._scores(vector, start, stop)
+        groups = self.title_groups[start:stop]
+        n = scores.shape[0]
+        k = min(n, limit * 4)
+        while True:
+            # Take the top-k rows, keep the first row per title; widen k only if too few titles
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            top = top[groups[top] >= 0]
+            _, first = np.unique(groups[top], return_index=True)
+            if len(first) >= limit or k >= n:
+                break
+            k = min(n, k * 4)
+
+        best = top[np.sort(first)[:limit]]
+        return [
+            SearchHit(self.ids[start + i], float(scores[i]), dict(self.payloads[start + i]))
+            for i in best
+        ]
+
+
+def create_search_backend(kind, qdrant_client=None, embeddings_glob=None, semester_order=None, dtype="float32",
+                          store_path=None, version_poll_seconds=60):
+    """Build the backend named by SEARCH_BACKEND ("qdrant" or "local").
+
+    The local backend prefers the memory-mapped store at `store_path` and falls
+    back to parsing the JSON exports matched by `embeddings_glob`.
+    """
+    kind = (kind or "qdrant").lower()
+    if kind == "local":
+        from embedding_store import EmbeddingStore
+
+        if store_path and EmbeddingStore.exists(store_path):
+            return LocalSearchBackend.from_store(EmbeddingStore(store_path))
+        return LocalSearchBackend.from_embedding_files(embeddings_glob, semester_order, dtype=np.dtype(dtype))
+    if kind == "qdrant":
+        if qdrant_client is None:
+            return None
+        return QdrantSearchBackend(qdrant_client, version_poll_seconds=version_poll_seconds)
+    raise ValueError(f"Unknown SEARCH_BACKEND: {kind}")
@@ -0,0 +1,90 @@
+-- Atomic add/remove of course codes in user_courses_test's per-semester arrays.
+--
+-- The backend calls this once per click (or once per batch) instead of reading the
+-- whole row and PATCHing it back, so concurrent clicks can't overwrite each other.
+--
+-- Apply in the Supabase SQL editor (or psql), then reload PostgREST's schema cache:
+--     notify pgrst, 'reload schema';
+-- It is exposed as POST /rest/v1/rpc/apply_course_ops with body
+--     {"p_user_id": "<uuid>", "p_ops": [{"op": "add", "semester": "2425S", "course": "COSC-111"}, ...]}
+-- and returns the user's row after all ops (null if there is no row).
+--
+-- Semester columns may be text[] or jsonb arrays; each op uses the column's actual type.
+-- Ops apply in order inside one transaction with the row locked: all succeed or none do.
+
+create or replace function public.apply_course_ops(p_user_id uuid, p_ops jsonb)
+returns jsonb
+language plpgsql
+set search_path = public
+as $$
+declare
+    op jsonb;
+    kind text;
+    sem text;
+    course text;
+    col_type text;
+    row_json jsonb;
+begin
+    if jsonb_typeof(p_ops) is distinct from 'array' then
+        raise exception 'p_ops must be a JSON array' using errcode = '22023';
+    end if;
+
+    -- Create the row only when something will be added (removing from a missing row is a no-op)
+    if exists (select 1 from jsonb_array_elements(p_ops) e where e->>'op' = 'add') then
+        insert into user_courses_test (id) values (p_user_id) on conflict (id) do nothing;
+    end if;
+
+    -- Serialize concurrent calls for the same user
+    perform 1 from user_courses_test where id = p_user_id for update;
+
+    for op in select value from jsonb_array_elements(p_ops) loop
+        kind := op->>'op';
+        sem := op->>'semester';
+        course := op->>'course';
+        if kind is null or kind not in ('add', 'remove') or course is null or course = '' then
+            raise exception 'invalid op: %', op using errcode = '22023';
+        end if;
+
+        -- Only existing array columns are accepted (this also guards the dynamic SQL below)
+        select format_type(a.atttypid, a.atttypmod) into col_type
+        from pg_attribute a
+        where a.attrelid = 'public.user_courses_test'::regclass
+          and a.attname = sem and a.attnum > 0 and not a.attisdropped;
+        if col_type is null or col_type not in ('text[]', 'character varying[]', 'jsonb') then
+            raise exception 'unknown semester column: %', sem using errcode = '22023';
+        end if;
+
+        if col_type = 'jsonb' then
+            if kind = 'add' then
+                execute format(
+                    'update user_courses_test set %1$I = case when coalesce(%1$I, ''[]''::jsonb) @> jsonb_build_array($1) '
+                    'then %1$I else coalesce(%1$I, ''[]''::jsonb) || jsonb_build_array($1) end where id = $2', sem)
+                using course, p_user_id;
+            else
+                execute format(
+                    'update user_courses_test set %1$I = (select coalesce(jsonb_agg(e), ''[]''::jsonb) '
+                    'from jsonb_array_elements(%1$I) e where e <> to_jsonb($1::text)) '
+                    'where id = $2 and %1$I is not null', sem)
+                using course, p_user_id;
+            end if;
+        else
+            if kind = 'add' then
+                execute format(
+                    'update user_courses_test set %1$I = case when $1 = any(%1$I) '
+                    'then %1$I else array_append(coalesce(%1$I, ''{}''), $1) end where id = $2', sem)
+                using course, p_user_id;
+            else
+                execute format('update user_courses_test set %1$I = array_remove(%1$I, $1) where id = $2', sem)
+                using course, p_user_id;
+            end if;
+        end if;
+    end loop;
+
+    select to_jsonb(t) into row_json from user_courses_test t where t.id = p_user_id;
+    return row_json;
+end;
+$$;
+
+-- The backend verifies the user's JWT and passes p_user_id, so only the server role may call this
+revoke all on function public.apply_course_ops(uuid, jsonb) from public, anon, authenticated;
+grant execute on function public.apply_course_ops(uuid, jsonb) to service_role;
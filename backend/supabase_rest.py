@@ -0,0 +1,173 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+# =====================================================
+# Supabase REST (PostgREST) data-access layer
+# =====================================================
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TableStats:
+    """Per-table call counters and latency, in milliseconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms, ok, retries):
+        with self.lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.retries += retries
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class SupabaseTable:
+    """One PostgREST table. Async methods return the httpx.Response; plain ones block on it.
+
+    Filters are keyword arguments compared with eq, e.g. select(id=user_id); pass
+    `params` for anything else (order, limit, select, other operators).
+    """
+
+    def __init__(self, rest, name):
+        self.rest = rest
+        self.name = name
+        self.url = f"{rest.base_url}/rest/v1/{name}"
+        self.stats = TableStats()
+
+    @staticmethod
+    def _filters(filters, params=None):
+        query = {column: f"eq.{value}" for column, value in filters.items()}
+        query.update(params or {})
+        return query
+
+    async def aselect(self, params=None, timeout=None, **filters):
+        return await self.rest.request(self, "GET", params=self._filters(filters, params), timeout=timeout)
+
+    async def aupsert(self, rows, timeout=None):
+        """Insert-or-merge rows on the primary key (Prefer: resolution=merge-duplicates)."""
+        return await self.rest.request(self, "POST", json=rows, timeout=timeout,
+                                       headers={"Prefer": "resolution=merge-duplicates"})
+
+    async def ainsert(self, rows, timeout=None):
+        # Not idempotent: only retried when the request provably never reached PostgREST
+        return await self.rest.request(self, "POST", json=rows, timeout=timeout, idempotent=False)
+
+    async def aupdate(self, data, timeout=None, **filters):
+        return await self.rest.request(self, "PATCH", params=self._filters(filters), json=data, timeout=timeout)
+
+    def select(self, params=None, timeout=None, **filters):
+        return self.rest.runtime.run(self.aselect(params=params, timeout=timeout, **filters))
+
+    def upsert(self, rows, timeout=None):
+        return self.rest.runtime.run(self.aupsert(rows, timeout=timeout))
+
+    def insert(self, rows, timeout=None):
+        return self.rest.runtime.run(self.ainsert(rows, timeout=timeout))
+
+    def update(self, data, timeout=None, **filters):
+        return self.rest.runtime.run(self.aupdate(data, timeout=timeout, **filters))
+
+
+class SupabaseFunction(SupabaseTable):
+    """A Postgres function exposed by PostgREST at /rest/v1/rpc/<name>."""
+
+    def __init__(self, rest, name, idempotent=False):
+        super().__init__(rest, f"rpc/{name}")
+        self.idempotent = idempotent
+
+    async def acall(self, timeout=None, **args):
+        return await self.rest.request(self, "POST", json=args, timeout=timeout, idempotent=self.idempotent)
+
+    def call(self, timeout=None, **args):
+        return self.rest.runtime.run(self.acall(timeout=timeout, **args))
+
+
+class SupabaseREST:
+    """Tables the backend touches, sharing one pooled keep-alive client from an AsyncRuntime."""
+
+    TABLES = ("user_courses", "user_courses_test", "user_notes", "questions", "surprise_history")
+    # RPC name -> safe to retry after an ambiguous failure (see backend/sql/).
+    # apply_course_ops is not: replaying an add/remove batch that already committed can
+    # undo a newer edit from the same user that landed in between.
+    FUNCTIONS = {"apply_course_ops": False}
+
+    def __init__(self, base_url, api_key, runtime, timeout=10.0, max_retries=3, backoff=0.2, max_backoff=2.0):
+        self.base_url = (base_url or "").rstrip("/")
+        self.runtime = runtime
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = {
+            "apikey": api_key or "",
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        for name in self.TABLES:
+            setattr(self, name, SupabaseTable(self, name))
+        self.rpc = {name: SupabaseFunction(self, name, idempotent) for name, idempotent in self.FUNCTIONS.items()}
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter so retrying workers don't stampede together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def request(self, table, method, params=None, json=None, headers=None, timeout=None, idempotent=True):
+        client = self.runtime.client
+        start = time.perf_counter()
+        attempt = 0
+        response = None
+        try:
+            while True:
+                response = None
+                try:
+                    response = await client.request(
+                        method, table.url, params=params, json=json,
+                        headers={**self.headers, **(headers or {})},
+                        timeout=timeout or self.timeout,
+                    )
+                    retryable = response.status_code in RETRY_STATUSES and (idempotent or response.status_code == 429)
+                    if not retryable or attempt >= self.max_retries:
+                        return response
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                    if attempt >= self.max_retries:
+                        raise
+                except httpx.TransportError:
+                    if not idempotent or attempt >= self.max_retries:
+                        raise
+                await asyncio.sleep(self._delay(attempt, response))
+                attempt += 1
+        finally:
+            ok = response is not None and response.status_code < 400
+            table.stats.record((time.perf_counter() - start) * 1000, ok, attempt)
+
+    def stats(self):
+        stats = {name: getattr(self, name).stats.as_dict() for name in self.TABLES}
+        stats.update({f"rpc/{name}": fn.stats.as_dict() for name, fn in self.rpc.items()})
+        return stats
@@ -0,0 +1,151 @@
+import numpy as np
+
+from search_backends import LocalSearchBackend, SearchHit, course_departments
+
+# =====================================================
+# Department centroids for in-process surprise ranking
+# =====================================================
+
+class SemesterDepartments:
+    """One semester's rows, their department membership and the department centroid matrix."""
+
+    __slots__ = ("start", "stop", "departments", "member", "centroids", "rows_by_code", "rows")
+
+    def __init__(self, start, stop, departments, member, centroids, rows_by_code):
+        self.start = start
+        self.stop = stop
+        self.departments = departments    # column -> global department index
+        self.member = member              # (n_rows, n_departments) bool
+        self.centroids = centroids        # (n_departments, d) float32, rows L2-normalized
+        self.rows_by_code = rows_by_code  # normalized code -> row offsets
+        self.rows = None                  # float32 copy of the course rows, made on first use
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class DepartmentCentroids:
+    """Per-semester department centroid matrices over the row-normalized course vectors.
+
+    `rank()` scores every course in a semester against a profile vector in one pass:
+
+        score = cos(course, profile) - novelty_weight * familiarity(course)
+
+    where familiarity is how close the course's department centroid sits to the
+    nearest department the student has taken (all-semester centroids). Courses
+    that are taken, excluded, or inside an explored department are dropped.
+    """
+
+    def __init__(self, matrix, payloads, ids, semester_ranges):
+        self.matrix = matrix
+        self.payloads = payloads
+        self.ids = ids
+
+        row_departments = [course_departments(p) for p in payloads]
+        self.departments = sorted({d for depts in row_departments for d in depts})
+        self.department_index = {d: i for i, d in enumerate(self.departments)}
+
+        dim = matrix.shape[1] if matrix.ndim == 2 else 0
+        totals = np.zeros((len(self.departments), dim), dtype=np.float64)
+        self.semesters = {}
+        for semester, (start, stop) in semester_ranges.items():
+            columns = sorted({self.department_index[d] for depts in row_departments[start:stop] for d in depts})
+            column_of = {dept: col for col, dept in enumerate(columns)}
+            member = np.zeros((stop - start, len(columns)), dtype=bool)
+            rows_by_code = {}
+            for offset, row in enumerate(range(start, stop)):
+                for d in row_departments[row]:
+                    member[offset, column_of[self.department_index[d]]] = True
+                for code in payloads[row].get("course_codes") or []:
+                    rows_by_code.setdefault(str(code).strip().upper(), []).append(offset)
+
+            # Sum of member rows per department, one matmul per semester
+            sums = member.T.astype(np.float32) @ np.asarray(matrix[start:stop], dtype=np.float32)
+            totals[columns] += sums
+            self.semesters[semester] = SemesterDepartments(
+                start, stop, np.asarray(columns, dtype=np.int64), member, _normalize_rows(sums), rows_by_code
+            )
+
+        # Student-side centroids pool every semester, so a department not offered this term still counts
+        self.global_centroids = _normalize_rows(totals)
+        print(f"Built department centroids: {len(self.departments)} departments across {len(self.semesters)} semesters")
+
+    @classmethod
+    def from_backend(cls, backend):
+        """Reuse the matrix the local search engine already holds (no extra copy)."""
+        return cls(backend.matrix, backend.payloads, backend.ids, backend.semester_ranges)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.vectors, store.payloads, store.ids, store.semester_ranges)
+
+    def __contains__(self, semester):
+        return semester in self.semesters
+
+    def _rows(self, sem):
+        if sem.rows is None:
+            sem.rows = np.ascontiguousarray(self.matrix[sem.start:sem.stop], dtype=np.float32)
+        return sem.rows
+
+    def department_familiarity(self, semester, user_departments):
+        """(n_departments,) max cosine between each department this semester and any taken department."""
+        sem = self.semesters[semester]
+        taken = [self.department_index[d] for d in user_departments if d in self.department_index]
+        if not taken:
+            return np.zeros(len(sem.departments), dtype=np.float32)
+        return (sem.centroids @ self.global_centroids[taken].T).max(axis=1)
+
+    def rank(self, vector, semester, user_departments=(), skip_codes=(), limit=30, novelty_weight=0.5):
+        """Top `limit` eligible courses in `semester` as SearchHits, best score first."""
+        sem = self.semesters.get(semester)
+        if sem is None or limit <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        interest = self._rows(sem) @ query
+
+        familiarity = self.department_familiarity(semester, user_departments)
+        if sem.member.shape[1]:
+            # A cross-listed course is as familiar as its most familiar listing
+            course_familiarity = np.where(sem.member, familiarity, -1.0).max(axis=1).clip(min=0.0)
+        else:
+            course_familiarity = np.zeros(len(interest), dtype=np.float32)
+        scores = interest - novelty_weight * course_familiarity
+
+        eligible = np.ones(len(scores), dtype=bool)
+        explored = np.isin(sem.departments, [self.department_index.get(d, -1) for d in user_departments])
+        if explored.any():
+            eligible &= ~sem.member[:, explored].any(axis=1)
+        for code in skip_codes:
+            eligible[sem.rows_by_code.get(code, [])] = False
+
+        candidates = np.flatnonzero(eligible)
+        k = min(limit, len(candidates))
+        if k == 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            SearchHit(self.ids[sem.start + i], float(scores[i]), dict(self.payloads[sem.start + i]))
+            for i in top
+        ]
+
+
+def load_department_centroids(search_backend=None, store_path=None):
+    """Centroids over vectors already in process: the local engine's matrix or the mapped store.
+
+    Returns None when neither is available (remote-only deployments keep the filtered vector query).
+    """
+    if isinstance(search_backend, LocalSearchBackend):
+        return DepartmentCentroids.from_backend(search_backend)
+
+    from embedding_store import EmbeddingStore
+
+    if store_path and EmbeddingStore.exists(store_path):
+        return DepartmentCentroids.from_store(EmbeddingStore(store_path))
+    return None
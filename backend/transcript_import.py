@@ -0,0 +1,74 @@
+# =====================================================
+# Resolve parsed transcript codes against the catalog
+# =====================================================
+
+def course_record(code, semester, course):
+    return {
+        "code": code,
+        "semester": semester,
+        "course_title": course.get("course_title", ""),
+        "course_codes": course.get("course_codes", []),
+        "department": course.get("department", ""),
+    }
+
+
+def enrich_transcript(parsed, catalog, semester_columns):
+    """Resolve {semester: {"courses": [codes]}} from extract_courses_from_transcript in one pass.
+
+    Every code becomes a record with a `status`:
+    - "matched": listed in that semester's catalog (`cross_listed` set when the
+      course has several codes; `duplicate_of` when an earlier code on the
+      transcript already resolved to the same course)
+    - "unknown": not offered that semester (`offered_in` lists semesters that do have it)
+    - "unknown_semester": the semester isn't a stored column
+
+    `semester_courses` holds the matched, de-duplicated codes per semester, in the
+    shape /submit_courses takes.
+    """
+    known_semesters = set(semester_columns)
+    semesters = {}
+    semester_courses = {}
+    flags = {"unknown": [], "cross_listed": [], "duplicates": [], "unknown_semesters": []}
+
+    for semester, entry in parsed.items():
+        records = []
+        if semester not in known_semesters:
+            flags["unknown_semesters"].append(semester)
+            records = [{"code": code, "semester": semester, "status": "unknown_semester"}
+                       for code in entry.get("courses", [])]
+            semesters[semester] = records
+            continue
+
+        keep = []
+        resolved = {}  # id(course) -> first code that resolved to it
+        for code in entry.get("courses", []):
+            course = catalog.get(semester, code)
+            if course is None:
+                record = {"code": code, "semester": semester, "status": "unknown",
+                          "offered_in": catalog.semesters_for(code)}
+                flags["unknown"].append({"code": code, "semester": semester})
+                records.append(record)
+                continue
+
+            record = course_record(code, semester, course)
+            record["status"] = "matched"
+            record["cross_listed"] = len(record["course_codes"]) > 1
+            if record["cross_listed"]:
+                flags["cross_listed"].append({"code": code, "semester": semester, "course_codes": record["course_codes"]})
+            first = resolved.setdefault(id(course), code)
+            if first != code:
+                record["duplicate_of"] = first
+                flags["duplicates"].append({"code": code, "semester": semester, "duplicate_of": first})
+            elif code not in keep:
+                keep.append(code)
+            records.append(record)
+
+        semesters[semester] = records
+        if keep:
+            semester_courses[semester] = keep
+
+    counts = {
+        "codes": sum(len(records) for records in semesters.values()),
+        "matched": sum(r["status"] == "matched" for records in semesters.values() for r in records),
+    }
+    return {"semesters": semesters, "semester_courses": semester_courses, "flags": flags, "counts": counts}
@@ -1,123 +1,339 @@
-import pdfplumber
-import re
+import io
 import logging
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import signal
+import string
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pdfplumber
+from pdfplumber.utils import cluster_objects
 
 # === Configure Logging ===
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def extract_courses_from_transcript(pdf_file_obj):
-    logger.info("Starting course extraction from transcript")
+# Mapping semester names to codes
+SEMESTER_CODE_MAP = {
+    "Fall 2020": "2021F",
+    "January 2021": "2021J",
+    "Spring 2021": "2021S",
+    "Fall 2021": "2122F",
+    "January 2022": "2122J",
+    "Spring 2022": "2122S",
+    "Fall 2022": "2223F",
+    "Spring 2023": "2223S",
+    "Fall 2023": "2324F",
+    "Spring 2024": "2324S",
+    "Fall 2024": "2425F",
+    "Spring 2025": "2425S",
+    "Fall 2025": "2526F",
+    "Spring 2026": "2526S",
+}
+
+SEMESTER_PATTERN = re.compile(r"(Spring|Fall|Summer|Winter|January)\s+\d{4}", re.IGNORECASE)
+COURSE_CODE_PATTERN = re.compile(r"\b([A-Z]{4}\s?\d{3}[A-Z]*)\b")
+# Lowercase letters are dropped before matching codes (so "Math 111" can't match)
+STRIP_LOWERCASE = str.maketrans("", "", string.ascii_lowercase)
+
+# Same line-merging tolerance (points) pdfplumber uses by default
+LINE_TOLERANCE = 3
+
+# Page-parallel parsing only pays off past a few pages
+PARALLEL_MIN_PAGES = 4
+
+OCR_DPI = 300
+OCR_PAGE_TIMEOUT = 60
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_forkserver_lock = threading.Lock()
+_forkserver_ready = False
+
+
+class TranscriptParseLimit(Exception):
+    """Raised by extract_courses_limited when a parse exceeds its CPU, wall-clock, or memory budget.
+
+    `retryable` is True when the same file might parse on another attempt (the wall
+    clock ran out on a busy host, or something outside the limits killed the child).
+    """
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def words_to_lines(words):
+    lines = []
+    current_line_y = None
+    current_line_words = []
+
+    for word in words:
+        if current_line_y is None or abs(word['top'] - current_line_y) > LINE_TOLERANCE:
+            if current_line_words:
+                lines.append(" ".join(w['text'] for w in current_line_words))
+            current_line_words = [word]
+            current_line_y = word['top']
+        else:
+            current_line_words.append(word)
 
-    # Mapping semester names to codes
-    semester_code_map = {
-        "Fall 2020": "2021F",
-        "January 2021": "2021J",
-        "Spring 2021": "2021S",
-        "Fall 2021": "2122F",
-        "January 2022": "2122J",
-        "Spring 2022": "2122S",
-        "Fall 2022": "2223F",
-        "Spring 2023": "2223S",
-        "Fall 2023": "2324F",
-        "Spring 2024": "2324S",
-        "Fall 2024": "2425F",
-        "Spring 2025": "2425S",
-        "Fall 2025": "2526F",
-        "Spring 2026": "2526S",
+    if current_line_words:
+        lines.append(" ".join(w['text'] for w in current_line_words))
+    return lines
+
+
+def column_order(words):
+    """Order one column's words the way extract_words on a crop of that column would."""
+    ordered = []
+    for cluster in cluster_objects(words, lambda w: w['doctop'], LINE_TOLERANCE):
+        ordered.extend(sorted(cluster, key=lambda w: w['x0']))
+    return ordered
+
+
+def _partial_word(chars):
+    return {
+        'text': "".join(c['text'] for c in chars),
+        'x0': min(c['x0'] for c in chars),
+        'top': min(c['top'] for c in chars),
+        'doctop': min(c['doctop'] for c in chars),
     }
 
-    semester_pattern = re.compile(r"(Spring|Fall|Summer|Winter|January)\s+\d{4}", re.IGNORECASE)
-    course_code_pattern = re.compile(r"\b([A-Z]{4}\s?\d{3}[A-Z]*)\b")
+
+def split_columns(words, mid_x):
+    """(left_lines, right_lines) from one page's words, split at `mid_x`."""
+    left_words, right_words = [], []
+    for word in words:
+        if word['x1'] <= mid_x:
+            left_words.append(word)
+        elif word['x0'] >= mid_x:
+            right_words.append(word)
+        elif 'chars' in word:
+            # Rare: a word across the midline. Split it by character, as cropping each half did
+            # (characters that themselves straddle the midline belong to neither half).
+            left_chars = [c for c in word['chars'] if c['x1'] <= mid_x]
+            right_chars = [c for c in word['chars'] if c['x0'] >= mid_x]
+            if left_chars:
+                left_words.append(_partial_word(left_chars))
+            if right_chars:
+                right_words.append(_partial_word(right_chars))
+        elif word['x0'] + word['x1'] <= 2 * mid_x:
+            # OCR words have no characters: go by the word's centre
+            left_words.append(word)
+        else:
+            right_words.append(word)
+    return words_to_lines(column_order(left_words)), words_to_lines(column_order(right_words))
+
+
+def page_columns(page):
+    """((left_lines, right_lines), has_text_layer) for one page from a single word pass.
+
+    Words never contain whitespace, so a page without a single word has no visible
+    characters at all (a scan); any text is kept as-is. Interpreting the page (the
+    chars extract_words reads) dominates the cost; this saves only a second word pass.
+    """
+    words = page.extract_words(return_chars=True)
+    return split_columns(words, page.width / 2), bool(words)
+
+
+# =====================================================
+# OCR fallback for scanned pages (tesseract, run as subprocesses)
+# =====================================================
+
+def ocr_available():
+    return shutil.which("tesseract") is not None
+
+
+def tesseract_words(image_bytes, dpi, timeout):
+    """Word boxes from `tesseract stdin stdout tsv`, converted from pixels to PDF points."""
+    proc = subprocess.run(
+        ["tesseract", "stdin", "stdout", "--dpi", str(dpi), "-l", "eng", "tsv"],
+        input=image_bytes, capture_output=True, timeout=timeout, check=True,
+        # Pages already run in parallel; tesseract's own OpenMP threads would oversubscribe the CPUs
+        env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+    )
+    scale = 72 / dpi
+    words = []
+    for row in proc.stdout.decode("utf-8", "replace").splitlines()[1:]:
+        fields = row.split("\t")
+        # level page block par line word left top width height conf text
+        if len(fields) < 12 or fields[0] != "5" or not fields[11].strip() or float(fields[10]) < 0:
+            continue
+        left, top, width, height = (int(v) for v in fields[6:10])
+        words.append({
+            'text': fields[11].strip(),
+            'x0': left * scale,
+            'x1': (left + width) * scale,
+            'top': top * scale,
+            'doctop': top * scale,
+        })
+    return words
+
+
+def _ocr_page(page_num, image_bytes, width, dpi, timeout, render_ms):
+    start = time.perf_counter()
+    columns = split_columns(tesseract_words(image_bytes, dpi, timeout), width / 2)
+    timing = {"page": page_num, "source": "ocr", "render_ms": round(render_ms, 1),
+              "ocr_ms": round((time.perf_counter() - start) * 1000, 1)}
+    return columns, timing
+
+
+def ocr_pages(pdf_bytes, page_indexes, workers=4, dpi=OCR_DPI, timeout=OCR_PAGE_TIMEOUT):
+    """{page_index: ((left_lines, right_lines), timing)} for the given pages, OCR'd in parallel.
+
+    Pages are rendered one at a time (pdfium isn't thread-safe) and each image is
+    handed to its own tesseract process as soon as it's ready, up to `workers` at once.
+    """
+    import pypdfium2 as pdfium
+
+    results = {}
+    document = pdfium.PdfDocument(pdf_bytes)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as pool:
+            futures = {}
+            for index in page_indexes:
+                start = time.perf_counter()
+                page = document[index]
+                image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+                buffer = io.BytesIO()
+                image.save(buffer, format="PPM")  # uncompressed: no PNG encode/decode round trip
+                render_ms = (time.perf_counter() - start) * 1000
+                futures[index] = pool.submit(_ocr_page, index + 1, buffer.getvalue(), page.get_width(),
+                                             dpi, timeout, render_ms)
+                page.close()
+            for index, future in futures.items():
+                try:
+                    results[index] = future.result()
+                except (subprocess.SubprocessError, OSError) as e:
+                    logger.warning(f"OCR failed on page {index + 1}: {e}")
+                    results[index] = (([], []), {"page": index + 1, "source": "ocr", "error": str(e)})
+    finally:
+        document.close()
+    return results
+
+
+def _timed_page_columns(page):
+    """(columns, has_text_layer, ms) for one page."""
+    start = time.perf_counter()
+    columns, has_text = page_columns(page)
+    return columns, has_text, (time.perf_counter() - start) * 1000
+
+
+def _parse_page_range(pdf_bytes, start, stop):
+    """Process-pool worker: reopen the PDF and return _timed_page_columns() for pages [start, stop)."""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [_timed_page_columns(pdf.pages[i]) for i in range(start, stop)]
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: the web process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _read_bytes(pdf_file_obj):
+    if isinstance(pdf_file_obj, (bytes, bytearray)):
+        return bytes(pdf_file_obj)
+    if isinstance(pdf_file_obj, (str, os.PathLike)):
+        with open(pdf_file_obj, "rb") as f:
+            return f.read()
+    return pdf_file_obj.read()
+
+
+def transcript_columns(pdf_file_obj, workers=0, ocr=True, ocr_workers=4, timings=None):
+    """[(left_lines, right_lines)] per page, optionally parsed in a pool of `workers` processes.
+
+    Pages without a single visible character are OCR'd (when `ocr` is set and tesseract
+    is installed); pages with any text never are, and without OCR every page keeps its
+    text-layer columns. One timing dict per page is appended to `timings`.
+    """
+    data = _read_bytes(pdf_file_obj)
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+        logger.info(f"Opened PDF with {page_count} pages")
+        if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+            parsed = [_timed_page_columns(page) for page in pdf.pages]
+        else:
+            parsed = None
+
+    if parsed is None:
+        pool = _get_pool(workers)
+        chunk = -(-page_count // workers)
+        futures = [pool.submit(_parse_page_range, data, first, min(first + chunk, page_count))
+                   for first in range(0, page_count, chunk)]
+        parsed = [page for future in futures for page in future.result()]
+
+    columns = [page for page, _, _ in parsed]
+    page_timings = [{"page": i + 1, "source": "text", "ms": round(ms, 1)} for i, (_, _, ms) in enumerate(parsed)]
+    scanned = [i for i, (_, has_text, _) in enumerate(parsed) if not has_text]
+    if scanned:
+        if ocr and ocr_available():
+            logger.info(f"OCR'ing {len(scanned)} page(s) without a text layer: {[i + 1 for i in scanned]}")
+            for index, (page, timing) in ocr_pages(data, scanned, workers=ocr_workers).items():
+                columns[index] = page
+                page_timings[index] = timing
+        else:
+            logger.warning(f"{len(scanned)} page(s) have no text layer and OCR is disabled or not installed")
+
+    for timing in page_timings:
+        if timing["source"] == "ocr":
+            logger.info(f"Page {timing['page']}: OCR render {timing.get('render_ms')} ms, "
+                        f"tesseract {timing.get('ocr_ms')} ms")
+    if timings is not None:
+        timings.extend(page_timings)
+    return columns
+
+
+def extract_courses_from_transcript(pdf_file_obj, workers=0, ocr=True, ocr_workers=4, timings=None):
+    logger.info("Starting course extraction from transcript")
 
     semesters = {}
+    pages = transcript_columns(pdf_file_obj, workers, ocr=ocr, ocr_workers=ocr_workers, timings=timings)
 
-    with pdfplumber.open(pdf_file_obj) as pdf:
-        logger.info(f"Opened PDF with {len(pdf.pages)} pages")
-
-        for page_num, page in enumerate(pdf.pages, start=1):
-            width = page.width
-            height = page.height
-            mid_x = width / 2
-
-            logger.info(f"Processing page {page_num}/{len(pdf.pages)} with size {width}x{height}")
-
-            # Define left and right column bounding boxes
-            left_bbox = (0, 0, mid_x, height)
-            right_bbox = (mid_x, 0, width, height)
-
-            # Extract words from left column
-            left_words = page.within_bbox(left_bbox).extract_words()
-            # Extract words from right column
-            right_words = page.within_bbox(right_bbox).extract_words()
-
-            def words_to_lines(words):
-                lines = []
-                current_line_y = None
-                current_line_words = []
-
-                for word in words:
-                    if current_line_y is None or abs(word['top'] - current_line_y) > 3:
-                        if current_line_words:
-                            line_text = " ".join(w['text'] for w in current_line_words)
-                            lines.append(line_text)
-                        current_line_words = [word]
-                        current_line_y = word['top']
-                    else:
-                        current_line_words.append(word)
-
-                if current_line_words:
-                    line_text = " ".join(w['text'] for w in current_line_words)
-                    lines.append(line_text)
-                return lines
-
-            left_lines = words_to_lines(left_words)
-            right_lines = words_to_lines(right_words)
-
-            # Process both columns independently
-            for col_lines, col_name in [(left_lines, "left"), (right_lines, "right")]:
-                logger.debug(f"Processing {len(col_lines)} lines from {col_name} column on page {page_num}")
-
-                current_semester = None
-                collecting = False
-
-                for line_num, line in enumerate(col_lines):
-                    line_clean = line.strip()
-
-                    # Print each line with info about page and column
-                    print(f"[Page {page_num}][{col_name} column][Line {line_num+1}]: {line_clean}")
-
-                    if "accreditation" in line_clean.lower():
-                        logger.info(f"Found 'accreditation' at line {line_num} in {col_name} column. Stopping parse.")
-                        break
-
-                    sem_match = semester_pattern.search(line_clean)
-                    if sem_match:
-                        current_semester = sem_match.group(0)
-                        if current_semester not in semesters:
-                            semesters[current_semester] = []
-                            logger.debug(f"Detected new semester: {current_semester}")
-                        collecting = True
-                        continue
+    for page_num, (left_lines, right_lines) in enumerate(pages, start=1):
+        # Process both columns independently
+        for col_lines, col_name in ((left_lines, "left"), (right_lines, "right")):
+            current_semester = None
+            collecting = False
+
+            for line_num, line in enumerate(col_lines):
+                line_clean = line.strip()
 
-                    if collecting:
-                        if line_clean.lower().startswith("attempted"):
-                            collecting = False
-                            logger.debug(f"Stopping collection for semester: {current_semester}")
-                            continue
+                if "accreditation" in line_clean.lower():
+                    logger.info(f"Found 'accreditation' at line {line_num} in {col_name} column of page {page_num}. Stopping parse.")
+                    break
 
-                        # Remove all lowercase letters before running regex
-                        line_clean_no_lower = re.sub(r'[a-z]', '', line_clean)
-                        codes = course_code_pattern.findall(line_clean_no_lower)
-                        if current_semester and codes:
-                            normalized_codes = [code.strip().replace(" ", "-") for code in codes]
-                            semesters[current_semester].extend(normalized_codes)
-                            logger.debug(f"Added courses for {current_semester} from {col_name} column: {normalized_codes}")
+                sem_match = SEMESTER_PATTERN.search(line_clean)
+                if sem_match:
+                    current_semester = sem_match.group(0)
+                    if current_semester not in semesters:
+                        semesters[current_semester] = []
+                    collecting = True
+                    continue
+
+                if collecting:
+                    if line_clean.lower().startswith("attempted"):
+                        collecting = False
+                        continue
+
+                    codes = COURSE_CODE_PATTERN.findall(line_clean.translate(STRIP_LOWERCASE))
+                    if current_semester and codes:
+                        semesters[current_semester].extend(code.strip().replace(" ", "-") for code in codes)
 
     logger.info("Translating semester names to codes")
     final_output = {}
     for sem, codes in semesters.items():
-        semester_code = semester_code_map.get(sem)
+        semester_code = SEMESTER_CODE_MAP.get(sem)
         if semester_code:
             final_output[semester_code] = {"courses": codes}
             logger.info(f"{sem} → {semester_code}: {len(codes)} course(s)")
@@ -126,3 +342,93 @@ def extract_courses_from_transcript(pdf_file_obj):
 
     logger.info("Course extraction complete")
     return final_output
+
+
+def _limited_worker(conn, pdf_bytes, cpu_seconds, memory_mb, options):
+    """Child-process entry point: apply rlimits, parse, send ("ok", (result, timings)) or ("error", message)."""
+    try:
+        os.setpgid(0, 0)
+        if cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL a second later if it's ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        timings = []
+        result = extract_courses_from_transcript(pdf_bytes, timings=timings, **options)
+        conn.send(("ok", (result, timings)))
+    except MemoryError:
+        conn.send(("limit", f"exceeded {memory_mb} MB"))
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+def _limited_context():
+    global _forkserver_ready
+    ctx = multiprocessing.get_context("forkserver")
+    with _forkserver_lock:
+        if not _forkserver_ready:
+            # The fork server imports pdfplumber once; each parse then forks from it cheaply
+            ctx.set_forkserver_preload([__name__])
+            _forkserver_ready = True
+    return ctx
+
+
+def _raise_for_exit(exitcode):
+    """Raise for a child that exited without replying, by how it died."""
+    if exitcode == -signal.SIGXCPU:
+        raise TranscriptParseLimit(f"parse exceeded its CPU limit (exit code {exitcode})")
+    if exitcode == -signal.SIGKILL:
+        # The RLIMIT_CPU hard limit, or the OOM killer reacting to load on the whole host
+        raise TranscriptParseLimit(f"parse process killed (exit code {exitcode})", retryable=True)
+    # Any other exit is a crash in the parser itself, and would repeat
+    raise ValueError(f"parse process crashed (exit code {exitcode})")
+
+
+def extract_courses_limited(pdf_bytes, cpu_seconds=20, wall_seconds=30, memory_mb=1024, ocr=True, ocr_workers=4,
+                            timings=None):
+    """extract_courses_from_transcript in a throwaway child process with hard resource limits.
+
+    The child gets RLIMIT_CPU / RLIMIT_AS and is killed after `wall_seconds`, so a
+    hostile or enormous PDF costs at most one process, never the web worker.
+    OCR subprocesses inherit the same limits.
+    Raises TranscriptParseLimit when a limit is hit (retryable for wall-clock timeouts
+    and SIGKILL); other parse errors, including a crashed child, are raised as ValueError.
+    """
+    ctx = _limited_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    options = {"ocr": ocr, "ocr_workers": ocr_workers}
+    process = ctx.Process(target=_limited_worker, args=(child_conn, pdf_bytes, cpu_seconds, memory_mb, options),
+                          daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        if not parent_conn.poll(wall_seconds) and process.is_alive():
+            # Wall time depends on host load, so the same file may finish next time
+            raise TranscriptParseLimit(f"parse exceeded {wall_seconds}s", retryable=True)
+        try:
+            status, payload = parent_conn.recv()
+        except EOFError:
+            process.join(1)
+            _raise_for_exit(process.exitcode)
+    finally:
+        parent_conn.close()
+        try:
+            # The child leads its own process group, so this also stops any tesseract it started
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        # killpg misses a child that hasn't called setpgid yet
+        process.kill()
+        process.join(1)
+
+    if status == "ok":
+        result, child_timings = payload
+        if timings is not None:
+            timings.extend(child_timings)
+        return result
+    if status == "limit":
+        raise TranscriptParseLimit(payload)
+    raise ValueError(payload)
@@ -1,9 +1,32 @@
+"""Upload course embeddings to Qdrant.
+
+Modes:
+    incremental (default)  upsert into the live collection, skipping points whose
+                           content hash has not changed since the last run and deleting
+                           points of re-read semesters that are no longer in the source
+    rebuild                build a fresh shadow collection, then atomically point the
+                           "amherst_courses" alias at it (no empty-collection window)
+
+Examples:
+    python upload_to_qdrant.py                          # refresh everything that changed
+    python upload_to_qdrant.py --semesters 2526F 2526S  # ingest just the new semesters
+    python upload_to_qdrant.py --mode rebuild --workers 8
+"""
 import os
 import json
+import time
+import hashlib
 import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from dotenv import load_dotenv
+from catalog_index import SEMESTER_COLUMNS
+from embedding_store import EmbeddingStore
+from search_backends import course_departments, course_point_id, title_key, META_COLLECTION_NAME, META_POINT_ID
 
 load_dotenv()
 
@@ -12,91 +35,337 @@ load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 
-print(f"Connecting to Qdrant at {QDRANT_URL}")
-client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-
+# Name the app searches; after the first rebuild this is an alias to a timestamped collection
 COLLECTION_NAME = "amherst_courses"
 
-# 1. Recreate Collection
-print("Recreating Collection (this will delete old data)...")
-client.recreate_collection(
-    collection_name=COLLECTION_NAME,
-    vectors_config=models.VectorParams(
-        size=1536, 
-        distance=models.Distance.COSINE
-    )
-)
-print("Collection created.")
-
-# List of semesters mapped in the app
-SEMESTER_COLUMNS = [
-    "0910F", "0910S", "1011F", "1011S", "1112F", "1112S",
-    "1213F", "1213S", "1314F", "1314S", "1415F", "1415S",
-    "1516F", "1516S", "1617F", "1617S", "1718F", "1718S",
-    "1819F", "1819S", "1920F", "1920S", "2021F", "2021J",
-    "2021S", "2122F", "2122J", "2122S", "2223F", "2223S",
-    "2324F", "2324S", "2425F", "2425S", "2526F", "2526S"
-]
-
 UPLOAD_BATCH_SIZE = 100
 
-for sem in SEMESTER_COLUMNS:
+# Prefer the binary store (python embedding_store.py build) over re-parsing the JSON exports
+STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "./data/embedding_store")
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = f.read(chunk_size)
+        while "[" not in buf:
+            more = f.read(chunk_size)
+            if not more or buf.strip():
+                raise ValueError(f"{path} does not contain a JSON array")
+            buf = more
+        pos = buf.index("[") + 1
+
+        while True:
+            # Skip separators, refilling the buffer as needed
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf):
+                    break
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError(f"Unexpected end of file in {path}")
+                buf, pos = more, 0
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Element spans the buffer end: grow geometrically so large objects stay linear
+                buf = buf[pos:]
+                more = f.read(max(chunk_size, len(buf)))
+                if not more:
+                    raise
+                buf, pos = buf + more, 0
+                continue
+
+            yield obj
+            pos = end
+
+
+def iter_semester_points(sem, store=None):
+    """Yield (point_id, payload, vector) for one semester from the store or the JSON export."""
+    for point_id, payload, vector in _iter_semester_courses(sem, store):
+        # Normalized title for server-side grouping in /semantic_course_search
+        payload["title_key"] = title_key(payload)
+        # Department prefixes so surprise queries can exclude explored departments server-side
+        payload["departments"] = course_departments(payload)
+        yield point_id, payload, vector
+
+
+def _iter_semester_courses(sem, store=None):
+    if store:
+        for point_id, payload, vector in store.iter_semester(sem):
+            yield point_id, payload, vector.astype(np.float32).tolist()
+        return
+
     file_path = f"data/gpt_off_the_shelf/output_embeddings_{sem}.json"
     if not os.path.exists(file_path):
-        continue
-    
-    print(f"Processing semester {sem}...")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        file_data = json.load(f)
-        
-    points = []
-    
-    for course in file_data:
+        return
+
+    for course in iter_json_array(file_path):
         if "embedding" not in course or course["embedding"] is None:
             continue
-            
+
         # Extract fields to store as payload
         embedding_vector = course.pop("embedding")
-        
+
         # Explicitly tag the semester in the payload if it isn't already
         course["semester"] = sem
-            
+
         # Give a consistent deterministic UUID based on title and semester
-        course_uid_string = f"{course.get('course_title', '')}_{sem}"
-        point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, course_uid_string))
-        
-        points.append(
-            models.PointStruct(
-                id=point_id,
-                vector=embedding_vector,
-                payload=course
-            )
+        yield course_point_id(course, sem), course, embedding_vector
+
+
+def content_hash(payload, vector):
+    """Stable digest of a point's payload and vector, stored as payload["content_hash"]."""
+    h = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(np.asarray(vector, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def resolve_collection(client, name):
+    """Real collection behind `name` (an alias or a collection), or None if neither exists."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name if client.collection_exists(name) else None
+
+
+def create_collection(client, name):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(
+            size=1536,
+            distance=models.Distance.COSINE
         )
-        
-        # Batch insert to not overwhelm Qdrant
-        if len(points) >= UPLOAD_BATCH_SIZE:
-            client.upsert(
-                collection_name=COLLECTION_NAME,
-                points=points
-            )
-            points = []
-            
-    # Insert any remaining points for this semester
-    if len(points) > 0:
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
+    )
+
+
+def create_payload_indexes(client, collection):
+    # Create a payload index on the 'semester' field to drastically speed up single-semester searches
+    client.create_payload_index(
+        collection_name=collection,
+        field_name="semester",
+        field_schema=models.PayloadSchemaType.KEYWORD,
+    )
+    # Grouping key for search_groups (one hit per distinct course title)
+    client.create_payload_index(
+        collection_name=collection,
+        field_name="title_key",
+        field_schema=models.PayloadSchemaType.KEYWORD,
+    )
+    # must_not targets for /surprise_recommendation (taken codes, explored departments)
+    for field_name in ("course_codes", "departments"):
+        client.create_payload_index(
+            collection_name=collection,
+            field_name=field_name,
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+
+
+def existing_hashes(client, collection):
+    """{semester: {point_id: content_hash}} for every point already in `collection`."""
+    hashes = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash", "semester"],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            hashes.setdefault(payload.get("semester"), {})[str(record.id)] = payload.get("content_hash")
+        if offset is None:
+            return hashes
+
+
+def write_catalog_version(client):
+    """Bump the version stamp the API uses to invalidate its search result cache."""
+    if not client.collection_exists(META_COLLECTION_NAME):
+        client.create_collection(
+            collection_name=META_COLLECTION_NAME,
+            vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT)
         )
-        points = []
-        
-    print(f"Finished {sem}.")
-
-# Create a payload index on the 'semester' field to drastically speed up single-semester searches
-print("Creating payload index for semester filtering...")
-client.create_payload_index(
-    collection_name=COLLECTION_NAME,
-    field_name="semester",
-    field_schema=models.PayloadSchemaType.KEYWORD,
-)
-
-print("✅ Completely finished uploading all data to Qdrant!")
+    version = uuid.uuid4().hex
+    client.upsert(
+        collection_name=META_COLLECTION_NAME,
+        points=[models.PointStruct(
+            id=META_POINT_ID,
+            vector=[0.0],
+            payload={"version": version, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        )]
+    )
+    print(f"Catalog version is now {version}.")
+
+
+class BatchUploader:
+    """Upserts batches on a bounded thread pool, capping how many batches are in flight."""
+
+    def __init__(self, client, collection, workers=4):
+        self.client = client
+        self.collection = collection
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.uploaded = 0
+
+    def _upsert(self, points):
+        try:
+            self.client.upsert(collection_name=self.collection, points=points)
+            with self.lock:
+                self.uploaded += len(points)
+        finally:
+            self.slots.release()
+
+    def submit(self, points):
+        self.slots.acquire()  # backpressure: don't read ahead of the workers
+        self.futures.append(self.executor.submit(self._upsert, points))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()  # re-raise the first upload error, if any
+
+
+def ingest(client, collection, semesters, store=None, known_hashes=None, workers=4):
+    """Stream every semester into `collection`. Returns (uploaded, skipped, deleted, elapsed_seconds).
+
+    `known_hashes` is existing_hashes() of `collection`. For each semester that has
+    source data, points whose hash changed are upserted and points no longer in the
+    source are deleted, so courses dropped from the catalog stop matching searches.
+    """
+    known_hashes = known_hashes or {}
+    uploader = BatchUploader(client, collection, workers=workers)
+    skipped = 0
+    deleted = 0
+    start = time.perf_counter()
+
+    try:
+        for sem in semesters:
+            known = known_hashes.get(sem, {})
+            # One pass: courses sharing a title share a point ID and the last one wins,
+            # so a later occurrence replaces (or cancels) an earlier pending upload.
+            seen = set()
+            pending = {}
+            for point_id, payload, embedding_vector in iter_semester_points(sem, store):
+                seen.add(point_id)
+                digest = content_hash(payload, embedding_vector)
+                if known.get(point_id) == digest:
+                    pending.pop(point_id, None)
+                    continue
+                payload["content_hash"] = digest
+                # float32 while waiting: a list of Python floats is ~5x larger
+                pending[point_id] = (payload, np.asarray(embedding_vector, dtype=np.float32))
+            if not seen:
+                continue
+
+            skipped += len(seen) - len(pending)
+            points = []
+            for point_id, (payload, vector) in pending.items():
+                points.append(models.PointStruct(id=point_id, vector=vector.tolist(), payload=payload))
+                # Batch insert to not overwhelm Qdrant
+                if len(points) >= UPLOAD_BATCH_SIZE:
+                    uploader.submit(points)
+                    points = []
+            if points:
+                uploader.submit(points)
+
+            stale = [point_id for point_id in known if point_id not in seen]
+            if stale:
+                client.delete(collection_name=collection, points_selector=models.PointIdsList(points=stale))
+                deleted += len(stale)
+
+            print(f"{sem}: queued {len(pending)} of {len(seen)} points, deleted {len(stale)} stale.")
+    finally:
+        uploader.close()
+
+    return uploader.uploaded, skipped, deleted, time.perf_counter() - start
+
+
+def swap_alias(client, alias, new_collection, drop_old=True):
+    """Atomically point `alias` at `new_collection`, optionally dropping the previous target."""
+    old_collection = resolve_collection(client, alias)
+    operations = []
+
+    if old_collection == alias:
+        # First rebuild: a real collection still owns the name, so it has to go before
+        # the alias can be created. This is the only swap with a (brief) gap.
+        print(f"Replacing legacy collection '{alias}' with an alias...")
+        client.delete_collection(collection_name=alias)
+        old_collection = None
+    elif old_collection:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=new_collection, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"Alias '{alias}' now points to '{new_collection}'.")
+
+    if drop_old and old_collection and old_collection != new_collection:
+        client.delete_collection(collection_name=old_collection)
+        print(f"Dropped previous collection '{old_collection}'.")
+
+
+def main(client=None):
+    parser = argparse.ArgumentParser(description="Upload course embeddings to Qdrant.")
+    parser.add_argument("--mode", choices=["incremental", "rebuild"], default="incremental")
+    parser.add_argument("--semesters", nargs="+", help="Only ingest these semesters (default: all)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent upsert batches")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the previous collection after a rebuild")
+    args = parser.parse_args()
+
+    if client is None:
+        print(f"Connecting to Qdrant at {QDRANT_URL}")
+        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+    store = EmbeddingStore(STORE_DIR) if EmbeddingStore.exists(STORE_DIR) else None
+    if store:
+        print(f"Reading vectors from embedding store {STORE_DIR}")
+
+    semesters = [s for s in SEMESTER_COLUMNS if not args.semesters or s in args.semesters]
+
+    if args.mode == "rebuild":
+        target = f"{COLLECTION_NAME}_{time.strftime('%Y%m%d%H%M%S')}"
+        while client.collection_exists(target):
+            target += "_1"
+        print(f"Building shadow collection '{target}'...")
+        create_collection(client, target)
+        known_hashes = {}
+    else:
+        target = resolve_collection(client, COLLECTION_NAME)
+        if target is None:
+            print(f"Collection '{COLLECTION_NAME}' not found, creating it.")
+            target = COLLECTION_NAME
+            create_collection(client, target)
+            known_hashes = {}
+        else:
+            known_hashes = existing_hashes(client, target)
+            print(f"Found {sum(map(len, known_hashes.values()))} existing points in '{target}'.")
+
+    uploaded, skipped, deleted, elapsed = ingest(client, target, semesters, store, known_hashes, workers=args.workers)
+
+    print("Creating payload indexes...")
+    create_payload_indexes(client, target)
+
+    if args.mode == "rebuild":
+        swap_alias(client, COLLECTION_NAME, target, drop_old=not args.keep_old)
+
+    if uploaded or deleted or args.mode == "rebuild":
+        write_catalog_version(client)
+
+    rate = uploaded / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Uploaded {uploaded} points, skipped {skipped} unchanged, deleted {deleted} stale "
+          f"in {elapsed:.1f}s ({rate:.0f} points/sec)")
+
+
+if __name__ == "__main__":
+    main()
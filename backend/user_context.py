@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+import time
+
+from caching import LRUTTLCache
+
+# =====================================================
+# Per-user recommendation context (course history + notes)
+# =====================================================
+
+# Notes question whose answer seeds the surprise profile
+INTEREST_QUESTION = "Are there particular skills or knowledge you would like to gain this semester? If so, what are they?"
+
+
+class UserContext:
+    """What /surprise_recommendation needs to know about a student, derived once per fetch."""
+
+    __slots__ = ("courses", "departments", "note_profile", "profile_text", "profile_vector")
+
+    def __init__(self, courses, departments, note_profile, profile_text):
+        self.courses = courses            # normalized codes, chronological
+        self.departments = departments    # frozenset of department prefixes
+        self.note_profile = note_profile
+        self.profile_text = profile_text
+        self.profile_vector = None        # filled in lazily by the caller
+
+    @property
+    def is_empty(self):
+        return not self.courses and not self.note_profile
+
+
+def build_user_context(course_row, notes_row, semester_order):
+    """Normalize a user_courses row and user_notes row (either may be None)."""
+    courses = []
+    departments = set()
+    if course_row:
+        for sem in semester_order:
+            for code in course_row.get(sem) or []:
+                code_norm = str(code).strip().upper()
+                courses.append(code_norm)
+                if "-" in code_norm:
+                    departments.add(code_norm.split("-")[0])
+
+    note_profile = ""
+    if notes_row and "predefined_responses" in notes_row:
+        note_profile = (notes_row["predefined_responses"] or {}).get(INTEREST_QUESTION, "").strip()
+
+    # A descriptive text summary of who the student is, embedded as the search query
+    profile_parts = []
+    if note_profile:
+        profile_parts.append(f"Student's stated interests: {note_profile}")
+    if courses:
+        # A handful of codes gives enough context without a massive profile text
+        profile_parts.append(f"Student has previously taken these courses: {', '.join(courses[:30])}")
+
+    return UserContext(courses, frozenset(departments), note_profile, "\n".join(profile_parts))
+
+
+# =====================================================
+# Per-user write stamps, so every worker sees an invalidation
+# =====================================================
+
+class MemoryVersionStore:
+    """Per-process stamps: invalidation reaches only this worker (fine for a single worker)."""
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self._versions = LRUTTLCache(maxsize=maxsize, ttl=ttl)
+
+    def version(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def stamp(self, user_id):
+        self._versions.set(user_id, time.time_ns())
+
+    def stats(self):
+        return {"backend": "memory"}
+
+
+class SQLiteVersionStore:
+    """Stamps in a SQLite file (WAL mode), shared by every worker process on the host.
+
+    A stamp only has to outlive the cache entries built before it, so rows older
+    than `ttl` are pruned.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._stamps = 0
+        with self._connect() as conn:
+            conn.execute("create table if not exists user_versions (user_id text primary key, version integer not null)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads (or forks): one per thread per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def version(self, user_id):
+        row = self._connect().execute("select version from user_versions where user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def stamp(self, user_id):
+        now = time.time_ns()
+        conn = self._connect()
+        conn.execute(
+            "insert into user_versions (user_id, version) values (?, ?) "
+            "on conflict (user_id) do update set version = excluded.version",
+            (user_id, now),
+        )
+        self._stamps += 1
+        if self._stamps % self.PRUNE_EVERY == 0 and self.ttl:
+            conn.execute("delete from user_versions where version < ?", (now - int(self.ttl * 1e9),))
+
+    def stats(self):
+        rows = self._connect().execute("select count(*) from user_versions").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "users": rows}
+
+
+class RedisVersionStore:
+    """Stamps in any Redis-protocol server (GET/SET with expiry), shared across hosts."""
+
+    def __init__(self, url=None, client=None, ttl=300, prefix="uctx:"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def version(self, user_id):
+        return int(self.client.get(f"{self.prefix}{user_id}") or 0)
+
+    def stamp(self, user_id):
+        self.client.set(f"{self.prefix}{user_id}", time.time_ns(), ex=max(int(self.ttl or 0), 1) + 1)
+
+    def stats(self):
+        return {"backend": "redis", "prefix": self.prefix}
+
+
+def create_version_store(backend="sqlite", ttl=300, maxsize=4096, sqlite_path=None, redis_url=None):
+    if backend == "sqlite":
+        return SQLiteVersionStore(sqlite_path or "./data/user_versions.sqlite3", ttl=ttl)
+    if backend == "redis":
+        return RedisVersionStore(redis_url or "redis://localhost:6379/0", ttl=ttl)
+    return MemoryVersionStore(maxsize=maxsize, ttl=ttl)
+
+
+class UserContextCache(LRUTTLCache):
+    """LRU + TTL cache of UserContext keyed by user id, dropped by the write endpoints.
+
+    Each entry remembers the user's stamp in `versions` when its fetch began;
+    `invalidate()` writes a new stamp, and `get()` discards entries whose stamp
+    moved. With a shared store (sqlite/redis) a write on one worker invalidates
+    every worker; a fetch that raced with a write is never served.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300, versions=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.versions = versions or MemoryVersionStore(maxsize=maxsize, ttl=ttl)
+        self.invalidations = 0
+        self.stale = 0
+
+    def get(self, user_id, default=None):
+        entry = super().get(user_id)
+        if entry is None:
+            return default
+        version, context = entry
+        if version != self.versions.version(user_id):
+            # Written since (maybe by another worker): count it as the miss it is
+            self.pop(user_id)
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            self.stale += 1
+            return default
+        return context
+
+    def begin(self, user_id):
+        """Ticket to pass to set_if_current(): the user's stamp before fetching."""
+        return self.versions.version(user_id)
+
+    def set_if_current(self, user_id, ticket, context):
+        if self.versions.version(user_id) != ticket:
+            return False
+        self.set(user_id, (ticket, context))
+        return True
+
+    def invalidate(self, user_id):
+        self.versions.stamp(user_id)
+        self.pop(user_id)
+        self.invalidations += 1
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"invalidations": self.invalidations, "stale": self.stale, "store": self.versions.stats()})
+        return stats
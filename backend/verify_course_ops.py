@@ -0,0 +1,88 @@
+"""Check apply_course_ops (backend/sql/apply_course_ops.sql) against a real PostgREST.
+
+Point SUPABASE_URL / SUPABASE_KEY at a local PostgREST + Postgres (or a scratch
+Supabase project) where the SQL file has been applied and user_courses_test exists.
+Uses a throwaway user id and deletes its row afterwards.
+
+Usage: python verify_course_ops.py [--semester 2425S] [--concurrency 20]
+"""
+import argparse
+import os
+import uuid
+
+from dotenv import load_dotenv
+
+from async_runtime import AsyncRuntime
+from supabase_rest import SupabaseREST
+
+load_dotenv()
+
+
+def fetch_row(db, user_id):
+    rows = db.user_courses_test.select(id=user_id).json()
+    return rows[0] if rows else None
+
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semester", default="2425S")
+    parser.add_argument("--concurrency", type=int, default=20, help="Parallel single-course adds")
+    args = parser.parse_args()
+
+    runtime = AsyncRuntime()
+    db = SupabaseREST(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"), runtime)
+    rpc = db.rpc["apply_course_ops"]
+    sem = args.semester
+    user_id = str(uuid.uuid4())
+    results = []
+
+    try:
+        # Removing from a missing row is a no-op and must not create one
+        resp = rpc.call(p_user_id=user_id, p_ops=[{"op": "remove", "semester": sem, "course": "TEST-000"}])
+        results.append(check("remove on missing row", resp.status_code == 200 and fetch_row(db, user_id) is None))
+
+        # Concurrent single adds: a read-modify-write would lose some of these
+        codes = [f"TEST-{i:03d}" for i in range(args.concurrency)]
+        responses = runtime.gather(*(
+            rpc.acall(p_user_id=user_id, p_ops=[{"op": "add", "semester": sem, "course": code}]) for code in codes
+        ))
+        row = fetch_row(db, user_id)
+        results.append(check(f"{len(codes)} concurrent adds all kept",
+                             all(r.status_code == 200 for r in responses) and sorted(row.get(sem) or []) == codes))
+
+        # One batched call: duplicate add is ignored, removes apply in order
+        resp = rpc.call(p_user_id=user_id, p_ops=[
+            {"op": "add", "semester": sem, "course": codes[0]},
+            {"op": "remove", "semester": sem, "course": codes[1]},
+            {"op": "remove", "semester": sem, "course": codes[2]},
+            {"op": "add", "semester": sem, "course": "TEST-NEW"},
+        ])
+        expected = [c for c in codes if c not in codes[1:3]]
+        got = (resp.json() or {}).get(sem) or []
+        results.append(check("batched ops", resp.status_code == 200
+                             and sorted(got) == sorted(expected + ["TEST-NEW"]) and len(got) == len(set(got))))
+
+        # A bad op rolls back the whole batch
+        before = fetch_row(db, user_id).get(sem)
+        resp = rpc.call(p_user_id=user_id, p_ops=[
+            {"op": "add", "semester": sem, "course": "TEST-ROLLBACK"},
+            {"op": "add", "semester": "not_a_column", "course": "TEST-000"},
+        ])
+        results.append(check("invalid op rejects the batch",
+                             resp.status_code >= 400 and fetch_row(db, user_id).get(sem) == before))
+    finally:
+        runtime.run(runtime.client.delete(db.user_courses_test.url, params={"id": f"eq.{user_id}"}, headers=db.headers))
+        runtime.close()
+
+    if not all(results):
+        raise SystemExit(1)
+    print("apply_course_ops behaves as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Check that grouped search returns the same top results as the old over-fetch + dedup.
+
+Uses catalog course vectors (plus random blends of them) as queries, so no embedding
+API calls are needed. Runs against the local engine by default; pass --backend qdrant
+to check a re-ingested Qdrant collection (needs QDRANT_URL / QDRANT_API_KEY).
+
+Usage: python verify_grouped_search.py [--backend local|qdrant] [--queries 200]
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+from dotenv import load_dotenv
+
+from catalog_index import SEMESTER_COLUMNS
+from embedding_store import DEFAULT_SOURCE_GLOB, DEFAULT_STORE_DIR
+from search_backends import LocalSearchBackend, SearchBackend, create_search_backend
+
+load_dotenv()
+
+
+def build_queries(local, count, seed=0):
+    rng = random.Random(seed)
+    rows = list(range(len(local)))
+    queries = []
+    for i in range(count):
+        if i % 2 == 0:
+            queries.append(np.asarray(local.matrix[rng.choice(rows)], dtype=np.float32))
+        else:
+            a, b = rng.sample(rows, 2)
+            queries.append(np.asarray(local.matrix[a], dtype=np.float32) + np.asarray(local.matrix[b], dtype=np.float32))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare grouped search against the legacy dedup path.")
+    parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    local = create_search_backend("local", embeddings_glob=DEFAULT_SOURCE_GLOB,
+                                  semester_order=SEMESTER_COLUMNS, store_path=DEFAULT_STORE_DIR)
+    if args.backend == "qdrant":
+        from qdrant_client import QdrantClient
+
+        backend = create_search_backend(
+            "qdrant",
+            qdrant_client=QdrantClient(url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+                                       api_key=os.getenv("QDRANT_API_KEY")),
+        )
+    else:
+        backend = local
+    assert isinstance(local, LocalSearchBackend)
+
+    semesters = [None] + list(local.semester_ranges)
+    mismatches = 0
+    checked = 0
+    for i, query in enumerate(build_queries(local, args.queries)):
+        semester = semesters[i % len(semesters)]
+        legacy = SearchBackend.search_grouped(backend, query, semester=semester, limit=args.limit)
+        grouped = backend.search_grouped(query, semester=semester, limit=args.limit)
+        checked += 1
+
+        legacy_ids = [str(h.id) for h in legacy]
+        grouped_ids = [str(h.id) for h in grouped]
+        # Legacy could come up short when 100 hits held fewer than `limit` titles
+        if grouped_ids[:len(legacy_ids)] != legacy_ids:
+            mismatches += 1
+            print(f"Mismatch (semester={semester}):\n  legacy:  {[h.payload.get('course_title') for h in legacy]}"
+                  f"\n  grouped: {[h.payload.get('course_title') for h in grouped]}")
+
+    print(f"{checked - mismatches}/{checked} queries match on the {args.backend} backend")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import queue
+import threading
+import time
+
+# =====================================================
+# Write-behind logging: batched background inserts
+# =====================================================
+
+class WriteBehindQueue:
+    """Bounded in-process queue of rows drained into one table by a background thread.
+
+    Rows are written as multi-row POSTs of up to `batch_size`, at least every
+    `flush_interval` seconds. `enqueue()` never blocks: it returns False when the
+    queue is full so callers can choose to write inline or drop. `prepare_batch`
+    (optional) can fill server-derived columns on the worker, off the request path;
+    it returns the rows it could not prepare (or None), which are retried later.
+
+    A batch rejected with a 4xx is split in halves until the offending rows are
+    isolated, so one bad row doesn't drop the rest. Rows hit by a 429/5xx are
+    requeued, up to `max_attempts` writes each, with exponential backoff.
+    Call `close()` at shutdown to flush what's left.
+    """
+
+    def __init__(self, table, max_size=1000, batch_size=100, flush_interval=1.0, prepare_batch=None, name=None,
+                 max_attempts=3, retry_backoff=1.0):
+        self.table = table
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prepare_batch = prepare_batch
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.name = name or f"write-behind-{table.name}"
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.high_water = 0
+        self.last_batch_ms = 0.0
+
+    def _ensure_started(self):
+        # Started on first use and again after a fork: threads don't survive fork()
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_size)
+                    self._stop = threading.Event()
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def enqueue(self, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((row, 0))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        self.high_water = max(self.high_water, self._queue.qsize())
+        return True
+
+    def _take_batch(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _requeue(self, items):
+        """Put rows back for another attempt; those out of attempts (or room) count as failed."""
+        for row, attempts in items:
+            if attempts + 1 >= self.max_attempts:
+                self.failed += 1
+                continue
+            try:
+                self._queue.put_nowait((row, attempts + 1))
+                self.retried += 1
+            except queue.Full:
+                self.failed += 1
+
+    def _insert(self, items):
+        """Insert rows, bisecting on 4xx. Returns the items to retry (429/5xx)."""
+        rows = [row for row, _ in items]
+        try:
+            response = self.table.insert(rows)
+        except Exception as e:
+            # The request may have reached PostgREST, so a retry could duplicate rows
+            print(f"{self.name}: insert of {len(rows)} rows failed: {e}")
+            self.failed += len(rows)
+            return []
+        if response.status_code in (200, 201, 204):
+            self.written += len(rows)
+            return []
+        if response.status_code == 429 or response.status_code >= 500:
+            print(f"{self.name}: insert of {len(rows)} rows will be retried: {response.status_code}")
+            return items
+        if len(items) == 1:
+            print(f"{self.name}: row rejected: {response.status_code} {response.text[:300]}")
+            self.failed += 1
+            return []
+        # Some row in here is bad: find it without giving up on the others
+        mid = len(items) // 2
+        return self._insert(items[:mid]) + self._insert(items[mid:])
+
+    def _write(self, items):
+        start = time.perf_counter()
+        retry = []
+        try:
+            if self.prepare_batch:
+                unprepared = self.prepare_batch([row for row, _ in items]) or []
+                if unprepared:
+                    skip = {id(row) for row in unprepared}
+                    retry = [item for item in items if id(item[0]) in skip]
+                    items = [item for item in items if id(item[0]) not in skip]
+            if items:
+                retry += self._insert(items)
+        except Exception as e:
+            print(f"{self.name}: preparing {len(items)} rows failed: {e}")
+            retry = items
+        self.last_batch_ms = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        if retry:
+            self._requeue(retry)
+            # Back off before the next batch; returns at once when closing
+            self._stop.wait(min(self.retry_backoff * 2 ** max(attempts for _, attempts in retry), 30))
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                self._write(batch)
+        # Shutdown: drain whatever is left
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def close(self, timeout=10):
+        """Flush queued rows and stop the worker (registered with atexit)."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self):
+        return {
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }